@@ -0,0 +1,65 @@
+import os, random, sys, time
+
+from flask import Flask
+
+from models import setup_db, db, Question, Category
+
+# ----------------------------------------------------------------------
+# Shared helpers for the benchmark scripts
+# ----------------------------------------------------------------------
+
+CATEGORY_TYPES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+
+WORDS = (
+  'what which who where when how many first largest city country river '
+  'painter author film team ocean planet element king queen war year '
+  'mountain island language famous world cup oscar palace royal novel'
+).split()
+
+# Builds a bare Flask app bound to the given database (a fresh SQLite file
+# by default) so benchmarks can run without a Postgres server.
+def make_app(database_path='sqlite:///' + os.path.join('/tmp', 'trivia_bench.db')):
+  if database_path.startswith('sqlite:///') and os.path.exists(database_path[10:]):
+    os.remove(database_path[10:])
+  app = Flask(__name__)
+  setup_db(app, database_path)
+  return app
+
+# Inserts `count` synthetic questions spread over `categories` categories,
+# the default six first.
+def seed_questions(count, seed=0, batch_size=10000, categories=len(CATEGORY_TYPES)):
+  rng = random.Random(seed)
+  if not Category.query.count():
+    types = CATEGORY_TYPES[:categories] + ['Category %d' % number for number in range(len(CATEGORY_TYPES) + 1, categories + 1)]
+    db.session.execute(Category.__table__.insert(), [{'type': type} for type in types])
+  category_ids = [category.id for category in Category.query.all()]
+
+  rows = []
+  for number in range(count):
+    rows.append({
+      'question': ' '.join(rng.choice(WORDS) for _ in range(8)) + ' #' + str(number) + '?',
+      'answer': ' '.join(rng.choice(WORDS) for _ in range(2)),
+      'category': rng.choice(category_ids),
+      'difficulty': rng.randint(1, 5)
+    })
+    if len(rows) == batch_size:
+      db.session.execute(Question.__table__.insert(), rows)
+      rows = []
+  if rows:
+    db.session.execute(Question.__table__.insert(), rows)
+  db.session.commit()
+
+# Calls `function` `repeat` times and returns the median time in milliseconds.
+def median_ms(function, repeat=50):
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    timings.append((time.perf_counter() - start) * 1000)
+  timings.sort()
+  return timings[len(timings) // 2]
+
+# Prints the columns right-aligned, followed by the optional label.
+def print_row(*columns, label=''):
+  print(''.join(str(column).rjust(16) for column in columns) + ('  ' + label if label else ''))
+  sys.stdout.flush()
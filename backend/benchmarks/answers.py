@@ -0,0 +1,60 @@
+import argparse, os, random, tempfile
+
+from flaskr import create_app
+from flaskr.answers import AnswerKey
+from models import Question
+from benchmarks import seed_questions, median_ms, print_row
+
+# ----------------------------------------------------------------------
+# Answer checking: grading latency of an answer and of a whole round
+#
+#   python -m benchmarks.answers --questions 100000 --round 10 50
+#
+# Reports the median time to grade one answer that is exact, has a typo or
+# is wrong, with the answer key already built, and the median time of a
+# POST /quizzes/answers round when the answer keys are cached (warm) and
+# when they are first loaded from the database (cold).
+# ----------------------------------------------------------------------
+
+ANSWERS = ['Muhammad Ali', 'Apollo 13', 'George Washington Carver', 'The Palace of Versailles', 'Lake Victoria']
+
+def typo(rng, answer):
+  position = rng.randrange(len(answer) - 1)
+  return answer[:position] + answer[position + 1] + answer[position] + answer[position + 2:]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--questions', type=int, default=100000)
+  parser.add_argument('--round', type=int, nargs='+', default=[10, 50])
+  parser.add_argument('--repeat', type=int, default=1000)
+  args = parser.parse_args()
+
+  rng = random.Random(0)
+  print_row('answer', 'exact us', 'typo us', 'wrong us')
+  for answer in ANSWERS:
+    key = AnswerKey(answer)
+    timings = [median_ms(lambda: key.check(submitted), args.repeat) * 1000 for submitted in [answer.lower(), typo(rng, answer), 'Something else']]
+    print_row(*['%.1f' % timing for timing in timings], label=answer)
+
+  with tempfile.TemporaryDirectory() as directory:
+    app = create_app({'DATABASE_URL': 'sqlite:///' + os.path.join(directory, 'trivia_bench.db'), 'RESPONSE_CACHE': None})
+    with app.app_context():
+      seed_questions(args.questions)
+      rows = Question.query.with_entities(Question.id, Question.answer).all()
+    client = app.test_client()
+    reset_caches = app.extensions['reset_caches']
+
+    print_row('round', 'warm ms', 'cold ms')
+    for size in args.round:
+      answers = [{'question_id': question_id, 'answer': typo(rng, answer)} for question_id, answer in rng.sample(rows, size)]
+      def check():
+        client.post('/quizzes/answers', json={'answers': answers})
+
+      def check_cold():
+        reset_caches()
+        check()
+
+      print_row(size, '%.2f' % median_ms(check), '%.2f' % median_ms(check_cold))
+
+if __name__ == '__main__':
+  main()
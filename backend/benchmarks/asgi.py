@@ -0,0 +1,121 @@
+import argparse, asyncio, json, multiprocessing, os, socket, time
+
+from models import db
+from flaskr import create_app
+from benchmarks import seed_questions, print_row
+from benchmarks.harness import percentile
+
+# ----------------------------------------------------------------------
+# Throughput of the WSGI and ASGI apps at high concurrency
+#
+#   python -m benchmarks.asgi --concurrency 10 100 1000 --requests 5000
+#
+# Serves the same seeded database with the threaded werkzeug server and
+# with uvicorn, each in its own process, and drives them from one asyncio
+# load generator holding `concurrency` requests in flight. Every request
+# opens a new connection, so neither server gains from keep-alive.
+# ----------------------------------------------------------------------
+
+ROUTES = [
+  ('GET', '/questions/2', None),
+  ('GET', '/categories/1/questions', None),
+  ('POST', '/search', {'searchTerm': 'river', 'page': 1}),
+  ('POST', '/quizzes', {'category': {'id': 1}, 'previous_questions': []})
+]
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def serve_wsgi(database_url, port):
+  from werkzeug.serving import run_simple
+  from benchmarks.harness import QuietRequestHandler
+  # The async app has no response cache, so the WSGI app runs without one.
+  run_simple('127.0.0.1', port, create_app({'DATABASE_URL': database_url, 'RESPONSE_CACHE': None}),
+    threaded=True, request_handler=QuietRequestHandler)
+
+def serve_asgi(database_url, port):
+  import uvicorn
+  from flaskr.asgi import create_asgi_app
+  uvicorn.run(create_asgi_app({'DATABASE_URL': database_url}), host='127.0.0.1', port=port,
+    log_level='warning', access_log=False, backlog=4096)
+
+def start(target, database_url):
+  port = free_port()
+  process = multiprocessing.Process(target=target, args=(database_url, port), daemon=True)
+  process.start()
+  for _ in range(100):
+    try:
+      socket.create_connection(('127.0.0.1', port)).close()
+      return process, port
+    except OSError:
+      time.sleep(0.1)
+  process.terminate()
+  raise RuntimeError('server did not start')
+
+async def send(port, method, path, body):
+  payload = json.dumps(body).encode('utf-8') if body is not None else b''
+  reader, writer = await asyncio.open_connection('127.0.0.1', port)
+  writer.write((
+    '%s %s HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+    'Content-Type: application/json\r\nContent-Length: %d\r\n\r\n' % (method, path, len(payload))
+  ).encode('latin-1') + payload)
+  await writer.drain()
+  response = await reader.read()
+  writer.close()
+  return int(response.split(b' ', 2)[1])
+
+async def load(port, route, requests, concurrency):
+  timings, errors = [], 0
+  slots = asyncio.Semaphore(concurrency)
+
+  async def one():
+    nonlocal errors
+    async with slots:
+      start = time.perf_counter()
+      try:
+        status = await send(port, *route)
+      except OSError:
+        status = None
+      timings.append(time.perf_counter() - start)
+      errors += status != 200
+
+  started = time.perf_counter()
+  await asyncio.gather(*[one() for _ in range(requests)])
+  return timings, time.perf_counter() - started, errors
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--scale', type=int, default=10000)
+  parser.add_argument('--requests', type=int, default=2000)
+  parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+  parser.add_argument('--database', help='database URL to seed (default: a SQLite file in /tmp)')
+  args = parser.parse_args()
+
+  database_url = args.database or 'sqlite:///' + os.path.join('/tmp', 'trivia_bench_asgi.db')
+  if database_url.startswith('sqlite:///') and os.path.exists(database_url[10:]):
+    os.remove(database_url[10:])
+  app = create_app({'DATABASE_URL': database_url})
+  with app.app_context():
+    seed_questions(args.scale)
+    db.engine.dispose()
+
+  print_row('server', 'concurrency', 'p50 ms', 'p99 ms', 'req/s', 'errors', label='route')
+  for name, target in [('werkzeug', serve_wsgi), ('uvicorn', serve_asgi)]:
+    process, port = start(target, database_url)
+    try:
+      for route in ROUTES:
+        # Warms the in-process indexes before timing.
+        asyncio.run(load(port, route, 20, 1))
+        for concurrency in args.concurrency:
+          timings, elapsed, errors = asyncio.run(load(port, route, args.requests, concurrency))
+          print_row(name, concurrency,
+            '%.2f' % (percentile(timings, 0.50) * 1000), '%.2f' % (percentile(timings, 0.99) * 1000),
+            '%.0f' % (len(timings) / elapsed), errors, label=route[0] + ' ' + route[1])
+    finally:
+      process.terminate()
+      process.join()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,80 @@
+import argparse, random, time
+
+from flaskr.dedup import DedupIndex
+from benchmarks import median_ms, print_row
+
+# ----------------------------------------------------------------------
+# Duplicate detection: check latency and cluster scan of the dedup index
+#
+#   python -m benchmarks.dedup --sizes 10000 100000 1000000
+#
+# Questions are 6 to 14 words drawn from a Zipf-distributed vocabulary, so
+# common words recur like in real questions. One question in --duplicates is
+# followed by a reworded copy (a word dropped, added or its case and
+# punctuation changed). Reports the time to load the index, the median time
+# to check a new question, the time to cluster the whole index, and the
+# share of the reworded copies found in the cluster of their original.
+# ----------------------------------------------------------------------
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ru', 'te', 'san', 'dor', 'vel', 'qui', 'bra', 'nos', 'fen', 'tal', 'gri']
+
+def vocabulary(rng, size=20000):
+  words = set()
+  while len(words) < size:
+    words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+  return sorted(words)
+
+def reword(rng, words):
+  words = list(words)
+  change = rng.randrange(3)
+  if change == 0:
+    del words[rng.randrange(len(words))]
+  elif change == 1:
+    words.insert(rng.randrange(len(words)), 'the')
+  else:
+    words = [word.upper() if rng.random() < 0.3 else word for word in words]
+  return ' '.join(words) + ' ?'
+
+def questions(size, duplicates, seed=0):
+  rng = random.Random(seed)
+  words = vocabulary(rng)
+  weights = [1 / rank for rank in range(1, len(words) + 1)]
+  rows, pairs = [], []
+  while len(rows) < size:
+    question = rng.choices(words, weights, k=rng.randint(6, 14))
+    rows.append((len(rows) + 1, ' '.join(question) + '?'))
+    if len(rows) % duplicates == 0 and len(rows) < size:
+      rows.append((len(rows) + 1, reword(rng, question)))
+      pairs.append((len(rows) - 1, len(rows)))
+  return rows, pairs
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+  parser.add_argument('--duplicates', type=int, default=100)
+  parser.add_argument('--threshold', type=float, default=0.7)
+  parser.add_argument('--repeat', type=int, default=1000)
+  args = parser.parse_args()
+
+  print_row('questions', 'load s', 'check ms', 'cluster s', 'clusters', 'recall')
+  for size in args.sizes:
+    rows, pairs = questions(size, args.duplicates)
+    index = DedupIndex(args.threshold, max_age=None)
+    start = time.perf_counter()
+    index.load_rows(rows)
+    load = time.perf_counter() - start
+
+    rng = random.Random(1)
+    probes = [reword(rng, rows[rng.randrange(len(rows))][1].rstrip('?').split()) for _ in range(args.repeat)]
+    probe = iter(probes * 2)
+    check = median_ms(lambda: index.matches(next(probe)), args.repeat)
+
+    start = time.perf_counter()
+    clusters = index.clusters()
+    cluster = time.perf_counter() - start
+    cluster_of = {question_id: number for number, ids in enumerate(clusters) for question_id in ids}
+    found = sum(1 for first, second in pairs if first in cluster_of and cluster_of.get(first) == cluster_of.get(second))
+    print_row(size, '%.1f' % load, '%.3f' % check, '%.1f' % cluster, len(clusters), '%.3f' % (found / len(pairs) if pairs else 0))
+
+if __name__ == '__main__':
+  main()
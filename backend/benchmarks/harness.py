@@ -0,0 +1,368 @@
+import argparse, datetime, http.client, json, os, platform, random, resource, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from models import db, Question
+from flaskr import create_app
+from benchmarks import make_app, seed_questions, print_row
+
+# ----------------------------------------------------------------------
+# Benchmark harness for every endpoint
+#
+#   python -m benchmarks.harness --scales 1000 100000 --output results.json
+#   python -m benchmarks.harness --compare before.json after.json
+#
+# Seeds a local database with synthetic questions at each scale, then
+# drives every route through the Flask test client (one request at a time)
+# and through a threaded WSGI server (--concurrency clients). Reports
+# latency percentiles, throughput, SQL queries per request and peak RSS,
+# and saves the results as JSON so runs can be compared between commits.
+# The run fails when a route answers with an unexpected status.
+# ----------------------------------------------------------------------
+
+'''
+Scenario
+    one route to benchmark. `request` returns the (method, path, body) of the
+    next request to send, given the harness state. The body is sent as JSON,
+    or as is with another `content_type`. `record` is called with the state
+    and the JSON of each successful response, and routes only available with
+    some settings run against an app created with that `config`.
+'''
+class Scenario:
+
+  def __init__(self, name, request, status=200, content_type='application/json', record=None, config=None):
+    self.name = name
+    self.request = request
+    self.status = status
+    self.content_type = content_type
+    self.record = record
+    self.config = config or {}
+
+def json_body(method, path, body=None):
+  return method, path, body
+
+# The harness state shared by the scenarios: question ids to delete and to
+# restore, quiz sessions to draw from and to end, a job to poll and the
+# random generator.
+class State:
+
+  def __init__(self, seed=0):
+    self.rng = random.Random(seed)
+    self.created_ids = []
+    self.deleted_ids = []
+    self.session_ids = []
+    self.lock = threading.Lock()
+    self.session_id = None
+    self.job_id = None
+    self.max_id = 0
+    self.next_id = 0
+    self.deep_page = 1
+
+  def created(self, question_id):
+    with self.lock:
+      self.created_ids.append(question_id)
+
+  def take_created(self):
+    with self.lock:
+      return self.created_ids.pop() if self.created_ids else self.max_id + 1
+
+  # Returns the next seeded question to delete in bulk, each one once.
+  def take_seeded(self):
+    with self.lock:
+      self.next_id = self.next_id % self.max_id + 1
+      self.deleted_ids.append(self.next_id)
+      return self.next_id
+
+  def take_deleted(self):
+    with self.lock:
+      return self.deleted_ids.pop() if self.deleted_ids else self.max_id + 1
+
+  def started(self, session_id):
+    with self.lock:
+      self.session_ids.append(session_id)
+
+  def take_session(self):
+    with self.lock:
+      return self.session_ids.pop() if self.session_ids else 'missing'
+
+def new_question(state):
+  return json_body('POST', '/questions', {
+    'question': 'Benchmark question %d?' % state.rng.randrange(10 ** 9),
+    'answer': 'Benchmark answer',
+    'category': state.rng.randint(1, 6),
+    'difficulty': state.rng.randint(1, 5)
+  })
+
+def import_lines(state, path='/jobs/import', count=1):
+  return json_body('POST', path, ''.join(json.dumps({
+    'question': 'Imported benchmark question %d?' % state.rng.randrange(10 ** 9),
+    'answer': 'Benchmark answer',
+    'category': state.rng.randint(1, 6),
+    'difficulty': state.rng.randint(1, 5)
+  }) + '\n' for _ in range(count)))
+
+# Soft deletes, so the deleted questions can be restored by the next route.
+SOFT_DELETE = {'SOFT_DELETE': True}
+
+SCENARIOS = [
+  Scenario('GET /categories', lambda state: json_body('GET', '/categories')),
+  Scenario('GET /categories/stats', lambda state: json_body('GET', '/categories/stats')),
+  Scenario('GET /questions', lambda state: json_body('GET', '/questions')),
+  Scenario('GET /questions/<deep page>', lambda state: json_body('GET', '/questions/%d' % state.deep_page)),
+  Scenario('GET /questions?after_id', lambda state: json_body('GET', '/questions?after_id=%d' % state.rng.randrange(state.max_id - 20))),
+  Scenario('GET /categories/<id>/questions', lambda state: json_body('GET', '/categories/%d/questions' % state.rng.randint(1, 6))),
+  Scenario('GET /v2/categories', lambda state: json_body('GET', '/v2/categories')),
+  Scenario('GET /v2/questions?after', lambda state: json_body('GET', '/v2/questions?after=%d&limit=20' % state.rng.randrange(state.max_id - 20))),
+  Scenario('GET /v2/questions?category&difficulty&fields', lambda state: json_body('GET', '/v2/questions?after=%d&category=%d&difficulty=%d&fields=id,question' % (
+    state.rng.randrange(state.max_id), state.rng.randint(1, 6), state.rng.randint(1, 5)))),
+  Scenario('POST /search', lambda state: json_body('POST', '/search', {'searchTerm': state.rng.choice(['royal palace', 'oscar film', 'island', 'wor']), 'page': 1})),
+  Scenario('POST /quizzes', lambda state: json_body('POST', '/quizzes', {'category': state.rng.randint(0, 6), 'previous_questions': [state.rng.randrange(state.max_id) for _ in range(5)]})),
+  Scenario('POST /quizzes/rounds', lambda state: json_body('POST', '/quizzes/rounds', {'category': state.rng.randint(0, 6), 'count': 5})),
+  Scenario('POST /quizzes/answers', lambda state: json_body('POST', '/quizzes/answers', {'question_id': state.rng.randint(1, state.max_id), 'answer': 'Benchmark answer'})),
+  Scenario('POST /quizzes/answers <round>', lambda state: json_body('POST', '/quizzes/answers', {'answers': [
+    {'question_id': state.rng.randint(1, state.max_id), 'answer': 'Benchmark answer'} for _ in range(5)]})),
+  Scenario('POST /quizzes/sessions', lambda state: json_body('POST', '/quizzes/sessions', {'category': state.rng.randint(1, 6)}),
+    record=lambda state, data: state.started(data['session_id'])),
+  Scenario('POST /quizzes/sessions/<id>/next', lambda state: json_body('POST', '/quizzes/sessions/%s/next' % state.session_id)),
+  Scenario('DELETE /quizzes/sessions/<id>', lambda state: json_body('DELETE', '/quizzes/sessions/%s' % state.take_session())),
+  Scenario('POST /questions', new_question, record=lambda state, data: state.created(data['question']['id'])),
+  Scenario('DELETE /questions/<id>', lambda state: json_body('DELETE', '/questions/%d' % state.take_created())),
+  Scenario('POST /questions/delete', lambda state: json_body('POST', '/questions/delete', {'ids': [state.take_seeded()]}), config=SOFT_DELETE),
+  Scenario('POST /questions/restore', lambda state: json_body('POST', '/questions/restore', {'ids': [state.take_deleted()]}), config=SOFT_DELETE),
+  Scenario('POST /questions/import', lambda state: import_lines(state, '/questions/import', 10), content_type='application/x-ndjson'),
+  Scenario('GET /questions/duplicates', lambda state: json_body('GET', '/questions/duplicates')),
+  Scenario('POST /jobs', lambda state: json_body('POST', '/jobs', {'kind': 'category-stats'}), status=202),
+  Scenario('POST /jobs/import', import_lines, status=202, content_type='application/x-ndjson'),
+  Scenario('GET /jobs/<id>', lambda state: json_body('GET', '/jobs/%d' % state.job_id)),
+  Scenario('GET /questions/export', lambda state: json_body('GET', '/questions/export')),
+  Scenario('GET /metrics', lambda state: json_body('GET', '/metrics'), config={'METRICS_ENABLED': True}),
+]
+
+# Counts the SQL statements sent by the app.
+class QueryCounter:
+
+  def __init__(self, engine):
+    self.count = 0
+    self.lock = threading.Lock()
+    event.listen(engine, 'before_cursor_execute', self.executed)
+
+  def executed(self, *args):
+    with self.lock:
+      self.count += 1
+
+def percentile(timings, fraction):
+  timings = sorted(timings)
+  return timings[min(len(timings) - 1, int(round(fraction * len(timings) + 0.5)) - 1)]
+
+def summarize(scenario, mode, scale, timings, elapsed, queries, errors):
+  return {
+    'route': scenario.name,
+    'mode': mode,
+    'scale': scale,
+    'requests': len(timings),
+    'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+    'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+    'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+    'throughput_rps': round(len(timings) / elapsed, 1),
+    'queries_per_request': round(queries / len(timings), 2),
+    'errors': errors
+  }
+
+# Sends requests one at a time through the test client.
+def run_test_client(app, scenario, state, counter, requests):
+  client = app.test_client()
+  timings, errors = [], 0
+  queries = counter.count
+  started = time.perf_counter()
+  for _ in range(requests):
+    method, path, body = scenario.request(state)
+    start = time.perf_counter()
+    if scenario.content_type == 'application/json':
+      response = client.open(path, method=method, json=body)
+    else:
+      response = client.open(path, method=method, data=body, content_type=scenario.content_type)
+    response.get_data()
+    timings.append(time.perf_counter() - start)
+    if response.status_code != scenario.status:
+      errors += 1
+    elif scenario.record:
+      scenario.record(state, response.get_json())
+  return timings, time.perf_counter() - started, counter.count - queries, errors
+
+# Sends requests from `concurrency` client threads to a threaded WSGI server.
+def run_server(address, scenario, state, counter, requests, concurrency):
+  host, port = address
+  local = threading.local()
+
+  def send(_):
+    if not hasattr(local, 'connection'):
+      local.connection = http.client.HTTPConnection(host, port)
+    method, path, body = scenario.request(state)
+    headers = {'Content-Type': scenario.content_type} if body is not None else {}
+    if body is not None and scenario.content_type == 'application/json':
+      body = json.dumps(body)
+    start = time.perf_counter()
+    local.connection.request(method, path, body=body, headers=headers)
+    response = local.connection.getresponse()
+    data = response.read()
+    elapsed = time.perf_counter() - start
+    if response.status == scenario.status and scenario.record:
+      scenario.record(state, json.loads(data))
+    return elapsed, response.status != scenario.status
+
+  queries = counter.count
+  started = time.perf_counter()
+  with ThreadPoolExecutor(concurrency) as executor:
+    results = list(executor.map(send, range(requests)))
+  return [elapsed for elapsed, _ in results], time.perf_counter() - started, \
+    counter.count - queries, sum(error for _, error in results)
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+  def log_request(self, *args, **kwargs):
+    pass
+
+def prepare(app, client, state):
+  with app.app_context():
+    state.max_id = db.session.query(db.func.max(Question.id)).scalar()
+    state.deep_page = max(1, Question.query.count() // 10 - 1)
+  response = client.post('/quizzes/sessions', json={'category': 0})
+  state.session_id = response.get_json()['session_id']
+  response = client.post('/jobs', json={'kind': 'category-stats'})
+  state.job_id = response.get_json()['job']['id']
+
+# The apps of a scale, one per config of its scenarios, all on the seeded
+# database, with the SQL statements they send counted and, when serving,
+# their threaded WSGI servers.
+class Apps:
+
+  def __init__(self, database_url):
+    self.database_url = database_url
+    self.apps = {}
+    self.servers = {}
+
+  # Returns the app and the query counter of a config.
+  def get(self, config):
+    key = tuple(sorted(config.items()))
+    if key not in self.apps:
+      app = create_app({**config, 'DATABASE_URL': self.database_url})
+      with app.app_context():
+        self.apps[key] = app, QueryCounter(db.engine)
+    return self.apps[key]
+
+  # Returns the address of the server of a config, started on first use.
+  def serve(self, config):
+    key = tuple(sorted(config.items()))
+    if key not in self.servers:
+      server = make_server('127.0.0.1', 0, self.get(config)[0], threaded=True, request_handler=QuietRequestHandler)
+      threading.Thread(target=server.serve_forever, daemon=True).start()
+      self.servers[key] = server
+    return self.servers[key].server_address
+
+  def shutdown(self):
+    for server in self.servers.values():
+      server.shutdown()
+
+def requests_for(args, scenario):
+  return args.requests if scenario.name != 'GET /questions/export' else max(1, args.requests // 50)
+
+# Seeds the database before creating the apps, so the indexes they load in
+# the background hold the seeded questions.
+def run_scale(args, scale):
+  database_url = args.database or 'sqlite:///' + os.path.join(args.workdir, 'trivia_bench_%d.db' % scale)
+  seeder = make_app(database_url)
+  with seeder.app_context():
+    seed_questions(scale, categories=args.categories)
+  apps = Apps(database_url)
+  app, _ = apps.get({})
+
+  state = State()
+  prepare(app, app.test_client(), state)
+  results = []
+  scenarios = [scenario for scenario in SCENARIOS if not args.routes or scenario.name in args.routes]
+  for scenario in scenarios:
+    app, counter = apps.get(scenario.config)
+    timings, elapsed, queries, errors = run_test_client(app, scenario, state, counter, requests_for(args, scenario))
+    results.append(summarize(scenario, 'test_client', scale, timings, elapsed, queries, errors))
+    print_result(results[-1])
+
+  if args.concurrency:
+    try:
+      for scenario in scenarios:
+        _, counter = apps.get(scenario.config)
+        timings, elapsed, queries, errors = run_server(apps.serve(scenario.config), scenario, state, counter, requests_for(args, scenario), args.concurrency)
+        results.append(summarize(scenario, 'wsgi_x%d' % args.concurrency, scale, timings, elapsed, queries, errors))
+        print_result(results[-1])
+    finally:
+      apps.shutdown()
+  return results
+
+def print_result(result):
+  print_row(result['scale'], result['mode'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+    result['throughput_rps'], result['queries_per_request'], result['errors'], label=result['route'])
+
+def git_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+# Prints the change in p50 latency and throughput between two result files.
+def compare(before_path, after_path):
+  with open(before_path) as before_file, open(after_path) as after_file:
+    before, after = json.load(before_file), json.load(after_file)
+  previous = {(result['route'], result['mode'], result['scale']): result for result in before['results']}
+  print_row('scale', 'mode', 'p50 before', 'p50 after', 'p50 change', 'rps change', label='route')
+  for result in after['results']:
+    old = previous.get((result['route'], result['mode'], result['scale']))
+    if not old:
+      continue
+    print_row(result['scale'], result['mode'], old['p50_ms'], result['p50_ms'],
+      '%+.1f%%' % ((result['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0),
+      '%+.1f%%' % ((result['throughput_rps'] / old['throughput_rps'] - 1) * 100 if old['throughput_rps'] else 0),
+      label=result['route'])
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--scales', type=int, nargs='+', default=[1000, 100000])
+  parser.add_argument('--categories', type=int, default=6)
+  parser.add_argument('--requests', type=int, default=200)
+  parser.add_argument('--concurrency', type=int, default=8, help='client threads against the WSGI server, 0 to skip it')
+  parser.add_argument('--routes', nargs='*', help='only run these routes, e.g. "POST /quizzes"')
+  parser.add_argument('--database', help='database URL to seed (default: a SQLite file per scale in --workdir)')
+  parser.add_argument('--workdir', default='/tmp')
+  parser.add_argument('--output', help='save the results as JSON to this file')
+  parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+  args = parser.parse_args()
+
+  if args.compare:
+    compare(*args.compare)
+    return
+
+  print_row('scale', 'mode', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries/req', 'errors', label='route')
+  results = []
+  for scale in args.scales:
+    results.extend(run_scale(args, scale))
+
+  report = {
+    'commit': git_commit(),
+    'date': datetime.datetime.utcnow().isoformat() + 'Z',
+    'python': platform.python_version(),
+    'database': args.database or 'sqlite',
+    'categories': args.categories,
+    'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'results': results
+  }
+  print('peak RSS: %d kB' % report['peak_rss_kb'])
+  if args.output:
+    with open(args.output, 'w') as output:
+      json.dump(report, output, indent=2)
+
+  failed = sorted({'%s (%s, %d)' % (result['route'], result['mode'], result['scale']) for result in results if result['errors']})
+  if failed:
+    sys.exit('Unexpected statuses from: ' + ', '.join(failed))
+
+if __name__ == '__main__':
+  main()
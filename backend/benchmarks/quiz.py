@@ -0,0 +1,48 @@
+import argparse, random
+
+from models import db, Question
+from flaskr.quiz import QuizIndex
+from benchmarks import make_app, seed_questions, median_ms, print_row
+
+# ----------------------------------------------------------------------
+# Per-turn latency of quiz question selection
+#
+#   python -m benchmarks.quiz --sizes 1000 10000 100000
+#
+# Compares the former selection path (load every eligible question, then
+# random.choice) with the quiz index (pick an id, then load one row) at a
+# growing number of questions. Five questions have already been asked.
+# ----------------------------------------------------------------------
+
+def load_all_then_choose(category_id, previous_questions):
+  questions = Question.query.filter_by(category=category_id) \
+    .filter(Question.id.notin_(previous_questions)).all()
+  return random.choice(questions).format()
+
+def pick_from_index(quiz_index, category_id, previous_questions):
+  question_id = quiz_index.pick(category_id, previous_questions)
+  return Question.query.get(question_id).format()
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  print_row('questions', 'load all ms', 'index ms')
+  for size in args.sizes:
+    app = make_app()
+    with app.app_context():
+      seed_questions(size)
+      quiz_index = QuizIndex()
+      quiz_index.load()
+      category_id = 1
+      previous_questions = quiz_index.bucket(category_id).ids[:5]
+
+      baseline = median_ms(lambda: load_all_then_choose(category_id, previous_questions), args.repeat)
+      indexed = median_ms(lambda: pick_from_index(quiz_index, category_id, previous_questions), args.repeat)
+      print_row(size, '%.3f' % baseline, '%.3f' % indexed)
+      db.session.remove()
+
+if __name__ == '__main__':
+  main()
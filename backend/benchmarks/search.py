@@ -0,0 +1,57 @@
+import argparse
+
+from models import db, Question
+from flaskr.search import SearchIndex
+from benchmarks import make_app, seed_questions, median_ms, print_row
+
+# ----------------------------------------------------------------------
+# Search latency: ILIKE scan versus the in-process search index
+#
+#   python -m benchmarks.search --sizes 10000 100000 1000000
+#
+# Both paths return the first page (10 questions) of the hits for each
+# search term, like POST /search with a page number.
+# ----------------------------------------------------------------------
+
+SEARCH_TERMS = ['royal palace', 'oscar', 'riv', 'zzz']
+
+# Loads questions by id, in the order of the ids given, in chunks that keep
+# the IN lists short.
+def load_questions(question_ids, chunk_size=500):
+  questions = {}
+  for start in range(0, len(question_ids), chunk_size):
+    chunk = question_ids[start:start + chunk_size]
+    for question in Question.query.filter(Question.id.in_(chunk)):
+      questions[question.id] = question
+  return [questions[question_id] for question_id in question_ids if question_id in questions]
+
+def ilike_search(search_term):
+  hits = [question_id for (question_id,) in db.session.query(Question.id)
+    .filter(Question.question.ilike('%' + search_term + '%')).order_by(Question.id)]
+  return load_questions(hits[:10]), len(hits)
+
+def index_search(search_index, search_term):
+  hits, total_hits = search_index.search(search_term, limit=10)
+  return load_questions(hits), total_hits
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+  parser.add_argument('--repeat', type=int, default=10)
+  args = parser.parse_args()
+
+  print_row('questions', 'term', 'ilike ms', 'index ms', 'hits')
+  for size in args.sizes:
+    app = make_app()
+    with app.app_context():
+      seed_questions(size)
+      search_index = SearchIndex(max_age=None)
+      search_index.load()
+      for search_term in SEARCH_TERMS:
+        baseline = median_ms(lambda: ilike_search(search_term), args.repeat)
+        indexed = median_ms(lambda: index_search(search_index, search_term), args.repeat)
+        print_row(size, repr(search_term), '%.3f' % baseline, '%.3f' % indexed, index_search(search_index, search_term)[1])
+      db.session.remove()
+
+if __name__ == '__main__':
+  main()
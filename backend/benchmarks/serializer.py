@@ -0,0 +1,71 @@
+import argparse
+
+from flask import jsonify as flask_jsonify
+
+from models import db, Question, Category
+from flaskr.serializer import Serializer, Rows, BACKENDS, compress, ENCODINGS, jsonify
+from flaskr.streaming import QUESTION_FIELDS, QUESTION_COLUMNS
+from benchmarks import make_app, seed_questions, median_ms, print_row
+
+# ----------------------------------------------------------------------
+# JSON serialization of the question payloads
+#
+#   python -m benchmarks.serializer --questions 10000 --repeat 200
+#
+# Times Question.format() followed by Flask's jsonify against row tuples
+# written by the serializer, with each installed JSON backend, on the
+# payloads of a listing page, a category page and a page of search results
+# of --page-size questions. The questions are loaded before timing, so only
+# building and encoding the response is measured. Then reports the size and
+# time of compressing each payload.
+# ----------------------------------------------------------------------
+
+def payloads(categories):
+  return [
+    ('page', lambda hits: {
+      'questions': hits, 'categories': categories, 'success': True, 'total_questions': 10000, 'next_url': '/questions/2'
+    }),
+    ('category page', lambda hits: {
+      'questions': hits, 'success': True, 'total_questions': 1000, 'next_url': '/categories/1/questions/2'
+    }),
+    ('search', lambda hits: {
+      'questions': hits, 'success': True, 'totalQuestions': 250
+    })
+  ]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--questions', type=int, default=10000)
+  parser.add_argument('--page-size', type=int, nargs='+', default=[10, 100])
+  parser.add_argument('--repeat', type=int, default=200)
+  args = parser.parse_args()
+
+  app = make_app()
+  backends = [name for name, (module, *_) in BACKENDS.items() if module is not None]
+  with app.app_context():
+    seed_questions(args.questions)
+    categories = {category.id: category.type for category in Category.query.all()}
+
+    print_row('questions', 'format+jsonify', *backends, label='payload (median ms)')
+    sizes = []
+    for page_size in args.page_size:
+      questions = Question.query.order_by(Question.id).limit(page_size).all()
+      rows = db.session.query(*QUESTION_COLUMNS).order_by(Question.id).limit(page_size).all()
+      for label, payload in payloads(categories):
+        timings = [median_ms(lambda: flask_jsonify(payload([question.format() for question in questions])).get_data(), args.repeat)]
+        for backend in backends:
+          app.extensions['serializer'] = Serializer(backend)
+          timings.append(median_ms(lambda: jsonify(payload(Rows(rows, QUESTION_FIELDS))).get_data(), args.repeat))
+        print_row(page_size, *['%.4f' % timing for timing in timings], label=label)
+        sizes.append((page_size, label, jsonify(payload(Rows(rows, QUESTION_FIELDS))).get_data()))
+
+  print()
+  print_row('questions', 'bytes', *[column for encoding in ENCODINGS for column in (encoding + ' bytes', encoding + ' ms')], label='payload')
+  for page_size, label, body in sizes:
+    columns = []
+    for encoding in ENCODINGS:
+      columns.extend([len(compress(body, encoding)), '%.4f' % median_ms(lambda: compress(body, encoding), args.repeat)])
+    print_row(page_size, len(body), *columns, label=label)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+import argparse, gc, itertools, tracemalloc
+from types import SimpleNamespace
+
+from werkzeug.datastructures import MultiDict
+
+from sqlalchemy import func
+
+from models import db, Question
+from flaskr import QUESTIONS_PER_PAGE, paginate_store
+from flaskr.store import QuestionStore
+from flaskr.streaming import format_row
+from benchmarks import make_app, seed_questions, median_ms, print_row
+
+# ----------------------------------------------------------------------
+# Memory and read latency of the question store against the ORM
+#
+#   python -m benchmarks.store --sizes 10000 100000 1000000
+#
+# Reports the memory held per question by ORM instances and by the
+# column-oriented question store, then the median time of the reads the
+# store serves: a listing page (first and deep), a category page with its
+# total, and loading one quiz question.
+# ----------------------------------------------------------------------
+
+def traced_bytes(load):
+  gc.collect()
+  tracemalloc.start()
+  held = load()
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return held, size
+
+# Counts the rows of a query without loading them, like the listings did
+# before the category stats.
+def count_questions(selection):
+  return selection.with_entities(func.count(Question.id)).order_by(None).scalar()
+
+def orm_page(page, category=None):
+  selection = Question.query if category is None else Question.query.filter_by(category=category)
+  questions = selection.order_by(Question.id).offset((page - 1) * QUESTIONS_PER_PAGE).limit(QUESTIONS_PER_PAGE).all()
+  return [question.format() for question in questions], count_questions(selection)
+
+def store_page(question_store, page, category=None):
+  return paginate_store(SimpleNamespace(args=MultiDict({'page': page})), question_store, None, category=category), question_store.count(category=category)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  print_row('questions', 'ORM ms', 'store ms', label='read')
+  memory = []
+  for size in args.sizes:
+    app = make_app()
+    with app.app_context():
+      seed_questions(size)
+
+      orm, orm_bytes = traced_bytes(lambda: Question.query.all())
+      del orm
+      db.session.remove()
+      question_store, store_bytes = traced_bytes(lambda: QuestionStore().current())
+      memory.append((size, orm_bytes / size, store_bytes / size))
+
+      deep_page = size // QUESTIONS_PER_PAGE - 1
+      question_ids = list(itertools.islice((row[0] for row in question_store.rows()), 0, size, max(1, size // 50)))
+      ids = itertools.cycle(question_ids)
+      for label, orm_read, store_read in [
+        ('page 1', lambda: orm_page(1), lambda: store_page(question_store, 1)),
+        ('page %d' % deep_page, lambda: orm_page(deep_page), lambda: store_page(question_store, deep_page)),
+        ('category page 1', lambda: orm_page(1, 1), lambda: store_page(question_store, 1, 1)),
+        ('one question', lambda: Question.query.get(next(ids)).format(), lambda: format_row(question_store.get(next(ids))))
+      ]:
+        print_row(size, '%.3f' % median_ms(orm_read, args.repeat), '%.3f' % median_ms(store_read, args.repeat), label=label)
+        db.session.remove()
+
+  print()
+  print_row('questions', 'ORM bytes', 'store bytes', label='memory per question')
+  for size, orm_bytes, store_bytes in memory:
+    print_row(size, '%.0f' % orm_bytes, '%.0f' % store_bytes)
+
+if __name__ == '__main__':
+  main()
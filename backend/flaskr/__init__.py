@@ -1,28 +1,166 @@
-import os, random, sys, traceback
-from flask import Flask, request, abort, jsonify, url_for
+import csv, functools, itertools, json, os, shutil, sys, tempfile, traceback
+import click
+from flask import Flask, current_app, request, abort, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import or_
 
 from models import *
+from .quiz import QuizIndex, DEFAULT_DIFFICULTY
+from .sessions import QuizSession, make_session_store
+from .search import SearchIndex
+from .indexes import IndexRefresher
+from .categories import CategoryCache
+from .bulk import QuestionImporter, QuestionDeleter, READERS, WRITERS, FORMATS
+from .streaming import iter_questions, iter_questions_by_id, stream_questions, wants_stream, format_row, QUESTION_FIELDS, QUESTION_COLUMNS
+from .metrics import Metrics
+from .cache import make_response_cache
+from .store import QuestionStore
+from .serializer import Serializer, Rows, jsonify, compress_response
+from .limits import make_request_limits, retry_after_headers
+from .stats import CategoryStats
+from .dedup import DedupIndex, duplicate_of
+from .jobs import JobRunner
+from .answers import AnswerCache, grade
 
 # ----------------------------------------------------------------------
 # Utils
 # ----------------------------------------------------------------------
 
 # Set up a function to paginate trivia questions with 10 results per page.
-# Returns the list of 10 questions. 
+# Takes a query and only fetches the rows for the requested page from the
+# database, either by page number (LIMIT/OFFSET) or, when the `after_id`
+# argument is passed, by cursor (WHERE id > after_id) so deep pages stay cheap.
+# Returns the (id, question, answer, difficulty, category) rows of the 10
+# questions, read without building ORM instances.
 QUESTIONS_PER_PAGE = 10
 
 def paginate_questions(request, selection, page):
   if not page:
     page = request.args.get('page', 1, type=int)
-  start = (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
+  after_id = request.args.get('after_id', type=int)
 
-  questions = [question.format() for question in selection]
-  questions_displayed = questions[start:end]
+  selection = selection.order_by(Question.id)
+  if after_id is not None:
+    selection = selection.filter(Question.id > after_id)
+  elif page >= 1:
+    selection = selection.offset((page - 1) * QUESTIONS_PER_PAGE)
+  else:
+    return []
+
+  return selection.with_entities(*QUESTION_COLUMNS).limit(QUESTIONS_PER_PAGE).all()
+
+# Set up a function to paginate questions from the in-memory question store
+# instead of the database, like paginate_questions.
+
+def paginate_store(request, question_store, page, category=None):
+  if not page:
+    page = request.args.get('page', 1, type=int)
+  after_id = request.args.get('after_id', type=int)
+
+  if after_id is not None:
+    rows = question_store.rows(category=category, after_id=after_id)
+  elif page >= 1:
+    rows = question_store.rows(category=category, offset=(page - 1) * QUESTIONS_PER_PAGE)
+  else:
+    return []
+
+  return list(itertools.islice(rows, QUESTIONS_PER_PAGE))
+
+# Set up a function to build the link to the next page. Cursor requests get a
+# cursor link pointing after the last question displayed.
+
+def next_page_url(request, endpoint, questions_displayed, page, **values):
+  if 'after_id' in request.args:
+    return url_for(endpoint, after_id=questions_displayed[-1][0], **values)
+  return url_for(endpoint, page=page+1, **values)
+
+# Set up function to read the arguments of a step of the v2 listing: the
+# `after` cursor (0 for the first step), the number of questions `limit`
+# (SCROLL_LIMIT by default, at most SCROLL_LIMIT_MAX), the optional
+# `difficulty` and the comma-separated `fields` to return, every field of
+# QUESTION_FIELDS by default. Invalid values abort with 422.
+SCROLL_LIMIT = 20
+SCROLL_LIMIT_MAX = 100
+
+def scroll_args(args):
+  try:
+    after_id = int(args.get('after', 0))
+    limit = int(args.get('limit', SCROLL_LIMIT))
+    difficulty = args.get('difficulty')
+    if difficulty is not None and not is_valid_difficulty(difficulty):
+      abort(422)
+  except ValueError:
+    abort(422)
+  if after_id < 0 or not 1 <= limit <= SCROLL_LIMIT_MAX:
+    abort(422)
+
+  fields = args.get('fields')
+  fields = fields.split(',') if fields else list(QUESTION_FIELDS)
+  if any(field not in QUESTION_FIELDS for field in fields) or len(set(fields)) != len(fields):
+    abort(422)
+  return after_id, limit, int(difficulty) if difficulty is not None else None, fields
+
+# Set up function to list the columns a scroll step reads: the fields asked
+# for, then the ID when it isn't one of them, as the next cursor needs it.
 
-  return questions_displayed
+def scroll_columns(fields):
+  return fields if 'id' in fields else fields + ['id']
+
+# Set up function to cut the `limit + 1` rows read for a scroll step, with
+# the columns of scroll_columns, into the rows to return and the `after`
+# cursor of the next step, None when there are no more questions.
+
+def scroll_page(rows, fields, limit):
+  next_after = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_after = rows[-1][fields.index('id') if 'id' in fields else len(fields)]
+  if 'id' not in fields:
+    rows = [tuple(row[:len(fields)]) for row in rows]
+  return rows, next_after
+
+# Set up a decorator to let clients and shared caches keep the responses of an
+# endpoint for `max_age` seconds; after that they revalidate them with the
+# ETag. Set outside the response cache, so cached responses get it too.
+
+def cache_for(max_age):
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+      response = current_app.make_response(view(*args, **kwargs))
+      if response.status_code in (200, 304):
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+      return response
+    return wrapper
+  return decorator
+
+# Set up a decorator for the endpoints that only read from the database. Their
+# queries run on one of the DATABASE_REPLICA_URLS, round-robin, when any are
+# configured.
+
+def read_only(view):
+  @functools.wraps(view)
+  def wrapper(*args, **kwargs):
+    with db.read_only():
+      return view(*args, **kwargs)
+  return wrapper
+
+# Set up function to read the page of search results asked for, None for
+# every result.
+
+def search_page(body):
+  page = body.get('page')
+  if page is None:
+    return None
+  try:
+    page = int(page)
+  except (TypeError, ValueError):
+    abort(422)
+  if page < 1:
+    abort(422)
+  return page
 
 # Set up function to validate if difficulty level is valid.
 
@@ -33,6 +171,123 @@ def is_valid_difficulty(difficulty):
   else:
     return False
 
+# Set up function to load the rows of questions by ID, in the order of the
+# IDs given, from the question store when it is enabled.
+
+def question_rows(question_ids, question_store=None):
+  if question_store is None:
+    return list(iter_questions_by_id(question_ids))
+  rows = (question_store.get(question_id) for question_id in question_ids)
+  return [row for row in rows if row is not None]
+
+# Set up function to load questions by ID as dicts, like question_rows.
+
+def format_questions(question_ids, question_store=None):
+  return [format_row(row) for row in question_rows(question_ids, question_store)]
+
+# Set up function to read the quiz category, sent either as an ID or as a
+# category object. 0 means all categories.
+
+def quiz_category_id(category):
+  if isinstance(category, dict):
+    return int(category['id'])
+  return int(category)
+
+# Set up function to read the ids of the questions already asked in a quiz,
+# an empty list by default.
+
+def quiz_previous_questions(body):
+  previous_questions = body.get('previous_questions', [])
+  if not isinstance(previous_questions, list):
+    abort(422)
+  for question_id in previous_questions:
+    if isinstance(question_id, bool) or not isinstance(question_id, int):
+      abort(422)
+  return previous_questions
+
+# Set up function to read the number of questions of a quiz round, 5 by
+# default and at most QUIZ_ROUND_MAX.
+QUIZ_ROUND_SIZE = 5
+QUIZ_ROUND_MAX = 50
+
+def quiz_round_size(body):
+  count = body.get('count', QUIZ_ROUND_SIZE)
+  if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= QUIZ_ROUND_MAX:
+    abort(422)
+  return count
+
+# Set up functions to drop the answers from the quiz questions, when
+# QUIZ_HIDE_ANSWERS leaves checking them to POST /quizzes/answers.
+QUIZ_FIELDS = [field for field in QUESTION_FIELDS if field != 'answer']
+
+def quiz_rows(rows, hide_answers=False):
+  if not hide_answers:
+    return Rows(rows, QUESTION_FIELDS)
+  position = QUESTION_FIELDS.index('answer')
+  return Rows([tuple(row)[:position] + tuple(row)[position + 1:] for row in rows], QUIZ_FIELDS)
+
+def quiz_question(question, hide_answers=False):
+  if not hide_answers:
+    return question
+  return {field: value for field, value in question.items() if field != 'answer'}
+
+# Set up function to read the answers of a check request: one
+# {question_id, answer} object, or a round of at most QUIZ_ROUND_MAX of them
+# in `answers`. Returns the (question id, answer) pairs and whether the
+# request was a batch.
+
+def answer_args(body):
+  if not body:
+    abort(400)
+  batch = 'answers' in body
+  answers = body['answers'] if batch else [body]
+  if not isinstance(answers, list) or not 1 <= len(answers) <= QUIZ_ROUND_MAX:
+    abort(422)
+  submissions = []
+  for answer in answers:
+    if not isinstance(answer, dict) or 'question_id' not in answer or 'answer' not in answer:
+      abort(400)
+    question_id = answer['question_id']
+    if isinstance(question_id, bool) or not isinstance(question_id, int) or not isinstance(answer['answer'], str):
+      abort(422)
+    submissions.append((question_id, answer['answer']))
+  return submissions, batch
+
+# Set up function to build the response of a check request from the graded
+# answers.
+
+def answer_results(results, batch):
+  if not batch:
+    return {**results[0], 'success': True}
+  return {
+    'results': results,
+    'total_correct': sum(1 for result in results if result['correct']),
+    'success': True
+  }
+
+# Set up function to read the difficulty filter of a quiz request, sent either
+# as one difficulty or as an inclusive [min, max] range. Returns None when
+# there is no filter.
+
+def quiz_difficulty(body):
+  difficulty = body.get('difficulty')
+  if difficulty is None:
+    return None
+  levels = difficulty if isinstance(difficulty, list) else [difficulty]
+  if len(levels) not in (1, 2):
+    abort(400)
+  try:
+    if not all(is_valid_difficulty(level) for level in levels):
+      abort(422)
+  except (TypeError, ValueError):
+    abort(422)
+  if len(levels) == 1:
+    return int(levels[0])
+  low, high = int(levels[0]), int(levels[1])
+  if low > high:
+    abort(422)
+  return list(range(low, high + 1))
+
 # ----------------------------------------------------------------------
 # Config
 # ----------------------------------------------------------------------
@@ -41,7 +296,226 @@ def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   app.url_map.strict_slashes = False
-  setup_db(app)
+  app.config.from_mapping(
+    DATABASE_URL=database_path,
+    DATABASE_FIXTURES=os.environ.get('DATABASE_FIXTURES'),
+    QUIZ_SESSION_STORE='memory',
+    QUIZ_SESSION_TTL=3600,
+    QUIZ_SESSION_MAX=10000,
+    SEARCH_BACKEND='index',
+    SEARCH_MIN_PREFIX=3,
+    INDEX_REFRESH_INTERVAL=30,
+    METRICS_ENABLED=False,
+    METRICS_SERVER_TIMING=False,
+    RESPONSE_CACHE='memory',
+    RESPONSE_CACHE_SIZE=1024,
+    RESPONSE_CACHE_TTL=60,
+    DATABASE_REPLICA_URLS=[],
+    DATABASE_POOL_SIZE=5,
+    DATABASE_MAX_OVERFLOW=10,
+    DATABASE_POOL_PRE_PING=True,
+    DATABASE_POOL_RECYCLE=1800,
+    QUESTION_STORE=False,
+    SOFT_DELETE=False,
+    JSON_BACKEND='auto',
+    RESPONSE_COMPRESSION=False,
+    RESPONSE_COMPRESSION_MIN_SIZE=1024,
+    RATE_LIMIT_STORE=None,
+    RATE_LIMITS={
+      'search': {'client': (5, 20), 'route': (200, 400)},
+      'quiz': {'client': (10, 40), 'route': (500, 1000)}
+    },
+    RATE_LIMIT_CLIENT_HEADER=None,
+    MAX_CONCURRENT_REQUESTS=None,
+    ADMISSION_RETRY_AFTER=1,
+    CATEGORIES_MAX_AGE=300,
+    DEDUP_THRESHOLD=0.7,
+    REJECT_DUPLICATES=True,
+    JOB_WORKERS=2,
+    JOB_DIRECTORY=None,
+    QUIZ_HIDE_ANSWERS=False,
+    ANSWER_CACHE_SIZE=100000
+  )
+  if test_config:
+    app.config.from_mapping(test_config)
+  # DATABASE_URL may name an embedded SQLite database, a file
+  # ('sqlite:////tmp/trivia.db') or in memory ('sqlite://'); DATABASE_FIXTURES
+  # is a pg_dump file such as trivia.psql loaded into its empty tables.
+  setup_db(app, app.config['DATABASE_URL'])
+  if app.config['DATABASE_FIXTURES']:
+    with app.app_context():
+      seed_db(app.config['DATABASE_FIXTURES'])
+  # JSON encoder of every response: orjson or ujson when installed, else the
+  # standard library.
+  app.extensions['serializer'] = Serializer(app.config['JSON_BACKEND'])
+
+  # In-process index of question ids used to pick quiz questions.
+  quiz_index = QuizIndex()
+  # Store for server-side quiz sessions, in memory or in a local SQLite file.
+  quiz_sessions = make_session_store(app.config)
+  # In-process inverted index used by the search endpoint.
+  search_index = SearchIndex(min_prefix=app.config['SEARCH_MIN_PREFIX'])
+  # In-process map of categories by ID and by type.
+  category_cache = CategoryCache()
+  # In-process question counts per category and difficulty, used for the
+  # totals of the listings and the stats endpoint.
+  category_stats = CategoryStats()
+  # In-process index of normalized question text and MinHash signatures,
+  # used to find duplicate questions.
+  dedup_index = DedupIndex(app.config['DEDUP_THRESHOLD'])
+  # In-process normalized answers of the recently checked questions, used to
+  # grade submitted answers.
+  answer_cache = AnswerCache(app.config['ANSWER_CACHE_SIZE'])
+  # Optional in-memory copy of the questions serving the read endpoints,
+  # loaded when the app starts.
+  question_store = None
+  if app.config['QUESTION_STORE']:
+    question_store = QuestionStore()
+    with app.app_context():
+      question_store.load()
+  # Reloads the in-process indexes in a background thread before they
+  # expire, checking every INDEX_REFRESH_INTERVAL seconds, and loads the
+  # search and dedup indexes when the app starts. None leaves every load to
+  # the requests.
+  refresher = None
+  if app.config['INDEX_REFRESH_INTERVAL']:
+    refresher = IndexRefresher(app, app.config['INDEX_REFRESH_INTERVAL'])
+    refresher.register(quiz_index)
+    refresher.register(category_stats)
+    refresher.register(search_index, preload=app.config['SEARCH_BACKEND'] == 'index')
+    refresher.register(dedup_index, preload=app.config['REJECT_DUPLICATES'])
+    if question_store:
+      refresher.register(question_store)
+    refresher.start()
+    app.extensions['index_refresher'] = refresher
+  # Cache of read responses, invalidated per category by the write endpoints.
+  response_cache = make_response_cache(app.config)
+  # Token-bucket rate limits and load shedding for the search and quiz
+  # routes, the most expensive ones.
+  limits = make_request_limits(app.config)
+
+  # Reloads an index after writes it doesn't follow. With the refresher the
+  # reload runs in the background and the index keeps serving its current
+  # contents meanwhile, so adding a question never waits for the whole table
+  # to be read.
+  def reload_index(index):
+    if refresher:
+      refresher.request(index)
+    else:
+      index.reset()
+
+  # Drops everything held in process about the questions, which is reloaded
+  # from the database on next use. Called after background jobs that change
+  # the questions, and by the tests after rolling back the writes of each
+  # test.
+  def reset_caches():
+    quiz_index.reset()
+    search_index.reset()
+    category_stats.reset()
+    reload_index(dedup_index)
+    answer_cache.reset()
+    CategoryCache.invalidate()
+    if question_store:
+      question_store.reset()
+    response_cache.clear()
+  app.extensions['reset_caches'] = reset_caches
+
+  # Drops the questions removed by a QuestionDeleter from the in-process
+  # indexes, the category stats and the cached responses of their categories.
+  def forget_questions(deleter):
+    response_cache.invalidate('questions', *['category:%s' % category_id for category_id in deleter.categories])
+    for (category_id, difficulty), count in deleter.counts.items():
+      category_stats.remove(category_id, difficulty, count)
+    for question_id in deleter.deleted:
+      quiz_index.remove(question_id)
+      search_index.remove(question_id)
+      dedup_index.remove(question_id)
+      answer_cache.remove(question_id)
+      if question_store:
+        question_store.remove(question_id)
+
+  # Returns the dedup index imports check their rows against, None when
+  # duplicates are accepted.
+  def importer_dedup():
+    return dedup_index if app.config['REJECT_DUPLICATES'] else None
+
+  # Runs maintenance jobs in JOB_WORKERS local processes, which build the app
+  # from the same config. The workers don't load fixtures or a question store
+  # of their own.
+  jobs = JobRunner(app, app.config['JOB_WORKERS'], dict(
+    test_config or {},
+    DATABASE_URL=app.config['DATABASE_URL'],
+    DATABASE_FIXTURES=None,
+    QUESTION_STORE=False,
+    INDEX_REFRESH_INTERVAL=None,
+    JOB_WORKERS=0
+  ))
+  app.extensions['jobs'] = jobs
+
+  # Job to import an NDJSON or CSV file saved by POST /jobs/import, which is
+  # deleted once read. Progress counts its lines.
+  @jobs.register('import', on_finish=lambda result, params: reset_caches())
+  def import_job(params, progress):
+    try:
+      with open(params['path'], 'rb') as lines:
+        # CSV files start with a header row.
+        total = max(0, sum(1 for _ in lines) - (1 if params['format'] == 'csv' else 0))
+        lines.seek(0)
+        importer = QuestionImporter(category_cache, is_valid_difficulty, dedup=importer_dedup())
+        importer.run(progress.track(READERS[params['format']](lines), total))
+      return importer.format()
+    finally:
+      os.remove(params['path'])
+
+  # Job to count the questions per category and difficulty. The counts
+  # replace the category stats of the process that submitted it, unless
+  # questions were written since; the stats are reloaded instead.
+  def apply_category_counts(result, params):
+    if not category_stats.load_counts(result['counts'], params.get('generation')):
+      reload_index(category_stats)
+
+  @jobs.register('category-stats', on_finish=apply_category_counts)
+  def category_stats_job(params, progress):
+    return {'counts': [list(row) for row in CategoryStats.select()]}
+
+  # Job to group the duplicate questions of the whole table. Progress counts
+  # the questions read into the index.
+  @jobs.register('find-duplicates')
+  def find_duplicates_job(params, progress):
+    index = DedupIndex(params['threshold'], max_age=None)
+    rows = progress.track(iter_questions(chunk_size=10000), Question.visible().count())
+    index.load_rows((row[0], row[1]) for row in rows)
+    clusters = index.clusters()
+    return {'clusters': clusters, 'total_clusters': len(clusters)}
+
+  # Reads the questions a bulk request applies to: a list of IDs, or a
+  # category and/or difficulty filter.
+  def bulk_filter(body):
+    if not body or not any(field in body for field in ['ids', 'category', 'difficulty']):
+      abort(400)
+    question_ids = body.get('ids')
+    if question_ids is not None:
+      if not isinstance(question_ids, list) or not all(isinstance(question_id, int) and not isinstance(question_id, bool) for question_id in question_ids):
+        abort(422)
+    category_id = None
+    if body.get('category') is not None:
+      category_id = category_cache.find(body['category'])
+      if category_id is None:
+        abort(400)
+    difficulty = body.get('difficulty')
+    if difficulty is not None:
+      try:
+        if not is_valid_difficulty(difficulty):
+          abort(422)
+      except (TypeError, ValueError):
+        abort(422)
+      difficulty = int(difficulty)
+    return {'question_ids': question_ids, 'category': category_id, 'difficulty': difficulty}
+
+  # Per-route query counts and timings, exposed at /metrics when enabled.
+  metrics = Metrics()
+  if app.config['METRICS_ENABLED']:
+    metrics.init_app(app)
 
   # CORS app
   cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -59,75 +533,161 @@ def create_app(test_config=None):
       )
       return response
 
+  # Compresses large responses with gzip, or brotli when installed, for the
+  # clients that accept it.
+  if app.config['RESPONSE_COMPRESSION']:
+    @app.after_request
+    def compress(response):
+      return compress_response(request, response, app.config['RESPONSE_COMPRESSION_MIN_SIZE'])
+
 # ----------------------------------------------------------------------
 # Endpoints
 # ----------------------------------------------------------------------
 
-  # Endpoint to handle GET requests for all available categories.
+  # Endpoint to handle GET requests for all available categories. Served from
+  # the category cache with an ETag, so a client that already has the current
+  # categories gets a 304 without a body. Clients may keep them for
+  # CATEGORIES_MAX_AGE seconds without asking again.
   @app.route('/categories', methods=['GET'])
+  @app.route('/v2/categories', methods=['GET'])
+  @cache_for(app.config['CATEGORIES_MAX_AGE'])
+  @read_only
+  @response_cache.cached(lambda: [], version=lambda: category_cache.current().etag)
   def get_categories():
-      categories = Category.query.all()
+      categories = category_cache.all()
       if not categories:
         abort(404)
 
-      return jsonify({
-        'success': True,
-        'categories': {category.id:category.type for category in categories},
-      }), 200
+      if request.if_none_match.contains(category_cache.etag):
+        response = app.response_class(status=304)
+      else:
+        response = jsonify({
+          'success': True,
+          'categories': categories,
+        })
+      response.set_etag(category_cache.etag)
+      return response
 
   # Endpoint to handle GET requests for questions, paginated by QUESTIONS_PER_PAGE, showing all questions.
   @app.route('/questions', methods=['GET'])
   @app.route('/questions/<int:page>', methods=['GET'])
+  @read_only
+  @response_cache.cached(lambda page=False: ['questions'], version=lambda: category_cache.current().etag)
   def get_questions(page=False):
     # Get categories for JSON return for frontend.
-    categories = Category.query.all()
-    # Get all questions
-    questions = Question.query.all()
-    questions_displayed = paginate_questions(request, questions, page=page)
+    categories = category_cache.all()
+    # Streams every question after the optional cursor instead of one page.
+    if wants_stream(request):
+      after_id = request.args.get('after_id', 0, type=int)
+      return stream_questions(request, iter_questions(after_id=after_id), 'total_questions', {'categories': categories})
+    # Only the requested page of questions is loaded; the total is counted in SQL.
+    if question_store:
+      questions_displayed = paginate_store(request, question_store, page)
+    else:
+      questions_displayed = paginate_questions(request, Question.visible(), page=page)
+    # The total comes from the category stats rather than a COUNT query.
+    total_questions = category_stats.total()
     if not questions_displayed:
       abort(404)
 
     return jsonify({
-      'questions': questions_displayed,
-      'categories': {category.id:category.type for category in categories},
+      'questions': Rows(questions_displayed, QUESTION_FIELDS),
+      'categories': categories,
       'success': True,
-      'total_questions': len(questions),
-      'next_url': url_for('get_questions', page=page+1)
+      'total_questions': total_questions,
+      'next_url': next_page_url(request, 'get_questions', questions_displayed, page)
+      }), 200
+
+  # Endpoint for the v2 listing, made for infinite scroll: each step returns
+  # the `limit` questions after the `after` ID, optionally of one category
+  # (ID or type) and difficulty, with only the `fields` asked for. Unlike
+  # /questions it leaves out the categories (fetched once from
+  # /v2/categories), the totals and the next URL, and it never counts or
+  # skips rows. `next` is the `after` of the next step, null after the last
+  # question.
+  @app.route('/v2/questions', methods=['GET'])
+  @read_only
+  @response_cache.cached(lambda: [
+    'category:%s' % category_cache.find(request.args['category']) if 'category' in request.args else 'questions'
+  ])
+  def scroll_questions():
+    after_id, limit, difficulty, fields = scroll_args(request.args)
+    category_id = None
+    if 'category' in request.args:
+      category_id = category_cache.find(request.args['category'])
+      if category_id is None:
+        abort(400)
+
+    if question_store:
+      positions = [QUESTION_FIELDS.index(field) for field in scroll_columns(fields)]
+      rows = question_store.rows(category=category_id, difficulty=difficulty, after_id=after_id)
+      rows = [tuple(row[position] for position in positions) for row in itertools.islice(rows, limit + 1)]
+    else:
+      selection = Question.visible(*[getattr(Question, field) for field in scroll_columns(fields)])
+      selection = selection.filter(Question.id > after_id)
+      if category_id is not None:
+        selection = selection.filter(Question.category == category_id)
+      if difficulty is not None:
+        selection = selection.filter(Question.difficulty == difficulty)
+      rows = selection.order_by(Question.id).limit(limit + 1).all()
+    questions, next_after = scroll_page(rows, fields, limit)
+
+    return jsonify({
+      'questions': Rows(questions, fields),
+      'next': next_after,
+      'success': True
       }), 200
 
+  # Endpoint to get the number of questions of every category and how they
+  # are spread over the difficulties, from the category stats.
+  @app.route('/categories/stats', methods=['GET'])
+  @read_only
+  def get_category_stats():
+    categories = category_cache.all()
+    if not categories:
+      abort(404)
+
+    return jsonify({
+      'categories': category_stats.format(categories),
+      'total_questions': category_stats.total(),
+      'success': True
+    }), 200
+
   # Endpoint to handle GET request for questions, paginated by QUESTIONS_PER_PAGE and filtered by category ID.
   # Uses paginate_questions for the pagination.
   @app.route('/categories/<category>/questions', methods=['GET'])
   @app.route('/categories/<category>/questions/<int:page>', methods=['GET'])
+  @read_only
+  @response_cache.cached(lambda category, page=False: ['category:%s' % category_cache.find(category)])
   def get_questions_by_category(category, page=False):
-    category_data = False
-
-    # Checks for valid category ID.
-    if category.isnumeric():
-      category_data = Category.query.get(category)
-      category_id = category
-
-    # Checks for category type and converts to ID if found.
-    if not category_data:
-      category_data = Category.query.filter_by(type=category).first()
-      category_id = category_data.id
+    # Checks for valid category ID or type and converts it to the ID.
+    category_id = category_cache.find(category)
 
     # If category is not found, returns error message.
-    if not category_data:
+    if category_id is None:
       abort(400)
 
-    questions = Question.query.filter_by(category=category_id).all()
-    questions_displayed = paginate_questions(request, questions, page=page)
+    questions = Question.visible().filter_by(category=category_id)
+    # Streams every question of the category after the optional cursor.
+    if wants_stream(request):
+      after_id = request.args.get('after_id', 0, type=int)
+      return stream_questions(request, iter_questions(questions, after_id=after_id), 'total_questions')
+
+    if question_store:
+      questions_displayed = paginate_store(request, question_store, page, category=category_id)
+    else:
+      questions_displayed = paginate_questions(request, questions, page=page)
+    total_questions = category_stats.total(category_id)
 
     # If page number doesn't exist, returns 404.
     if not questions_displayed:
       abort(404)
 
     return jsonify({
-      'questions': questions_displayed,
+      'questions': Rows(questions_displayed, QUESTION_FIELDS),
       'success': True,
-      'total_questions': len(questions),
-      'next_url': url_for('get_questions_by_category', category=category, page=page+1)
+      'total_questions': total_questions,
+      'next_url': next_page_url(request, 'get_questions_by_category', questions_displayed, page, category=category)
       }), 200
 
   # Endpoint to handle DELETE requests using question ID.
@@ -137,13 +697,40 @@ def create_app(test_config=None):
     if not quest_id:
       abort(400)
 
-    question_to_delete = Question.query.get(quest_id)
+    # Deletes the question, or flags it as deleted with SOFT_DELETE, in one
+    # statement and one commit.
+    try:
+      deleter = QuestionDeleter(soft=app.config['SOFT_DELETE']).run([quest_id])
+      db.session.commit()
+
+    except:
+      db.session.rollback()
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+      abort(500)
+
     # Checks if question ID exists.
-    if not question_to_delete:
+    if not deleter.deleted:
       abort(404)
+    forget_questions(deleter)
+
+    return jsonify({
+      'id': quest_id,
+      'success': True
+      }), 200
+
+  # Endpoint to delete questions in bulk, by a list of IDs or by category
+  # and/or difficulty. Matching rows are deleted in chunks, one statement per
+  # chunk, in a single transaction. With SOFT_DELETE they are only flagged as
+  # deleted and can be restored.
+  @app.route('/questions/delete', methods=['POST'])
+  def delete_questions_in_bulk():
+    question_filter = bulk_filter(request.get_json())
 
     try:
-      question_to_delete.delete()
+      deleter = QuestionDeleter(soft=app.config['SOFT_DELETE']).run(**question_filter)
       db.session.commit()
 
     except:
@@ -154,8 +741,47 @@ def create_app(test_config=None):
       traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
       abort(500)
 
+    if not deleter.deleted:
+      abort(404)
+    forget_questions(deleter)
+
     return jsonify({
-      'id': quest_id,
+      'deleted': len(deleter.deleted),
+      'success': True
+      }), 200
+
+  # Endpoint to restore soft-deleted questions, by a list of IDs or by
+  # category and/or difficulty.
+  @app.route('/questions/restore', methods=['POST'])
+  def restore_questions():
+    question_filter = bulk_filter(request.get_json())
+
+    try:
+      deleter = QuestionDeleter(soft=True).restore(**question_filter)
+      db.session.commit()
+
+    except:
+      db.session.rollback()
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+      abort(500)
+
+    if not deleter.restored:
+      abort(404)
+    # Restored questions are picked up when the indexes next load.
+    quiz_index.reset()
+    search_index.reset()
+    reload_index(dedup_index)
+    if question_store:
+      question_store.reset()
+    for (category_id, difficulty), count in deleter.counts.items():
+      category_stats.add(category_id, difficulty, count)
+    response_cache.invalidate('questions', *['category:%s' % category_id for category_id in deleter.categories])
+
+    return jsonify({
+      'restored': len(deleter.restored),
       'success': True
       }), 200
 
@@ -179,24 +805,27 @@ def create_app(test_config=None):
     category = body['category']
     difficulty = body['difficulty']
 
-    category_data = False
-    # Checks for valid category ID.
-    if isinstance(category, int) or category.isnumeric():
-      category_data = Category.query.get(category)
-      category_id = category
-
-    # Checks for category type and converts to ID if found.
-    if not category_data:
-      category_data = Category.query.filter_by(type=category).first()
-      category_id = category_data.id
+    # Checks for valid category ID or type and converts it to the ID.
+    category_id = category_cache.find(category)
 
     # If category is not found, returns error message.
-    if not category_data:
+    if category_id is None:
       abort(400)
 
     if not is_valid_difficulty(difficulty):
       abort(422)
 
+    # The question and answer are text.
+    if not isinstance(question, str) or not isinstance(answer, str):
+      abort(422)
+
+    # Rejects a question duplicating another one, word for word or nearly,
+    # unless the client sends allow_duplicate.
+    if app.config['REJECT_DUPLICATES'] and not body.get('allow_duplicate'):
+      duplicates = dedup_index.matches(question)
+      if duplicates:
+        raise duplicate_of([question_id for question_id, _ in duplicates])
+
     new_question = Question(
       question = question,
       answer = answer,
@@ -207,6 +836,13 @@ def create_app(test_config=None):
     try:
       db.session.add(new_question)
       db.session.commit()
+      response_cache.invalidate('questions', 'category:%s' % category_id)
+      quiz_index.add(new_question.id, category_id, new_question.difficulty)
+      category_stats.add(category_id, new_question.difficulty)
+      search_index.add(new_question.id, question, answer)
+      dedup_index.add(new_question.id, question)
+      if question_store:
+        question_store.add(new_question.id, question, answer, new_question.difficulty, category_id)
       data = {
         'id': new_question.id,
         'question': new_question.question,
@@ -228,59 +864,396 @@ def create_app(test_config=None):
       'success': True
       }), 200
 
-  # Endpoint to handle search requests.
+  # Endpoint to import questions in bulk. The body is NDJSON (one question
+  # object per line) or CSV with a header row, and is read as a stream. Rows
+  # are inserted in chunks with one commit per chunk; invalid rows are
+  # skipped and reported by line number.
+  @app.route('/questions/import', methods=['POST'])
+  def import_questions():
+    import_format = FORMATS.get(request.mimetype)
+    if not import_format:
+      abort(400)
+
+    try:
+      importer = QuestionImporter(category_cache, is_valid_difficulty, dedup=importer_dedup())
+      importer.run(READERS[import_format](request.stream))
+
+    except (UnicodeDecodeError, csv.Error):
+      db.session.rollback()
+      abort(400)
+
+    except:
+      db.session.rollback()
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+      abort(500)
+
+    finally:
+      # Imported rows are picked up when the indexes next load.
+      quiz_index.reset()
+      search_index.reset()
+      category_stats.reset()
+      reload_index(dedup_index)
+      if question_store:
+        question_store.reset()
+      response_cache.invalidate('questions', *['category:%s' % category_id for category_id in importer.categories])
+
+    return jsonify({
+      **importer.format(),
+      'success': True
+      }), 200
+
+  # Endpoint to list the groups of duplicate questions found by the dedup
+  # index, largest first, QUESTIONS_PER_PAGE groups per page.
+  @app.route('/questions/duplicates', methods=['GET'])
+  @read_only
+  def get_duplicate_questions():
+    page = request.args.get('page', 1, type=int)
+    clusters = dedup_index.clusters()
+    displayed = clusters[(page - 1) * QUESTIONS_PER_PAGE:page * QUESTIONS_PER_PAGE] if page >= 1 else []
+    if not displayed and page != 1:
+      abort(404)
+
+    return jsonify({
+      'clusters': [format_questions(question_ids, question_store) for question_ids in displayed],
+      'total_clusters': len(clusters),
+      'success': True
+      }), 200
+
+  # Endpoint to export every question as NDJSON (default) or CSV. The
+  # response is streamed, reading the table in chunks.
+  @app.route('/questions/export', methods=['GET'])
+  @read_only
+  def export_questions():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in WRITERS:
+      abort(400)
+
+    writer, mimetype = WRITERS[export_format]
+    return app.response_class(stream_with_context(writer(iter_questions())), mimetype=mimetype)
+
+  # Endpoint to handle search requests. Questions are ranked by how well they
+  # match the search term and can be paginated with the optional page number.
+  # SEARCH_BACKEND = 'ilike' falls back to a substring scan of the table.
   @app.route('/search', methods=['POST'])
+  @limits.limited('search')
+  @read_only
   def find_questions():
     body = request.get_json()
     search_term = body['searchTerm']
-    search_data = Question.query.filter(Question.question.ilike('%' + search_term + '%')).all()
+    search_answers = body.get('searchAnswers', False)
+    page = search_page(body)
+
+    if app.config['SEARCH_BACKEND'] == 'ilike':
+      search = Question.question.ilike('%' + search_term + '%')
+      if search_answers:
+        search = or_(search, Question.answer.ilike('%' + search_term + '%'))
+      hits = [question_id for (question_id,) in Question.visible(Question.id).filter(search).order_by(Question.id)]
+      total_hits = len(hits)
+    else:
+      limit = page * QUESTIONS_PER_PAGE if page else None
+      hits, total_hits = search_index.search(search_term, search_answers=search_answers, limit=limit)
+
+    # Streams every hit, best match first, instead of building the response.
+    if wants_stream(request):
+      return stream_questions(request, iter_questions_by_id(hits), 'totalQuestions')
+
+    if page:
+      hits = hits[(page - 1) * QUESTIONS_PER_PAGE:page * QUESTIONS_PER_PAGE]
+    search_data = question_rows(hits, question_store)
 
     if not search_data:
       abort(404)
 
     return jsonify({
-      'questions': [data.format() for data in search_data],
+      'questions': Rows(search_data, QUESTION_FIELDS),
       'success': True,
-      'totalQuestions': len(search_data)
+      'totalQuestions': total_hits
     }), 200
 
   # Endpoint to play quiz that filters by category and previous questions that have been answered. 
   @app.route('/quizzes', methods=['POST'])
+  @limits.limited('quiz')
+  @read_only
   def play_quiz():
     body = request.get_json()
     category = body['category']
-    if isinstance(category, dict):
-      category_id = int(category['id'])
-    else:
-      category_id = int(category)
-    if 'previous_questions' in body:
-      previous_questions = body['previous_questions']
-    else:
-      previous_questions = []
+    category_id = quiz_category_id(category)
+    previous_questions = quiz_previous_questions(body)
+
+    if category_id != 0:
+      quiz_category = category_cache.get(category_id)
+
+      if not quiz_category:
+        abort(404)
+
+    # An adaptive quiz asks one level harder after a correct answer and one
+    # level easier after a wrong one, starting from `difficulty`.
+    difficulty = quiz_difficulty(body)
+    adaptive = body.get('adaptive', False)
+    if adaptive:
+      if isinstance(difficulty, list):
+        abort(400)
+      if difficulty is None:
+        difficulty = DEFAULT_DIFFICULTY
+
+    # Picks a random eligible id from the quiz index and loads only that row.
+    # Ids of questions deleted by another worker are dropped and picked again.
+    questions = []
+    while not questions:
+      if adaptive:
+        question_id = quiz_index.pick_adaptive(category_id, previous_questions, difficulty, body.get('correct'))
+      else:
+        question_id = quiz_index.pick(category_id, previous_questions, difficulty=difficulty)
+      if question_id is None:
+        abort(404)
+      questions = format_questions([question_id], question_store)
+      if not questions:
+        quiz_index.remove(question_id)
 
-    questions = Question.query
+    return jsonify({
+      'category': category,
+      'previous_questions': previous_questions,
+      'question': quiz_question(questions[0], app.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }), 200
 
-    if category_id is not 0:
-      quiz_category = Category.query.get(category_id)
+  # Endpoint to get a whole quiz round at once: `count` distinct random
+  # questions, with the same category, difficulty and previous questions
+  # arguments as play_quiz. Fewer questions are returned when fewer are left.
+  @app.route('/quizzes/rounds', methods=['POST'])
+  @limits.limited('quiz')
+  @read_only
+  def play_quiz_round():
+    body = request.get_json()
+    if not body or 'category' not in body:
+      abort(400)
+    category = body['category']
+    category_id = quiz_category_id(category)
+    previous_questions = quiz_previous_questions(body)
+    difficulty = quiz_difficulty(body)
+    count = quiz_round_size(body)
+
+    if category_id != 0:
+      quiz_category = category_cache.get(category_id)
 
       if not quiz_category:
         abort(404)
 
-      questions = questions.filter_by(category=category_id)
+    # The sampled ids are loaded in one query. Ids of questions deleted by
+    # another worker are dropped and replaced.
+    questions = []
+    excluded = list(previous_questions)
+    while len(questions) < count:
+      question_ids = quiz_index.sample(category_id, count - len(questions), excluded, difficulty=difficulty)
+      if not question_ids:
+        break
+      loaded = question_rows(question_ids, question_store)
+      found = {row[0] for row in loaded}
+      for question_id in question_ids:
+        if question_id not in found:
+          quiz_index.remove(question_id)
+      questions.extend(loaded)
+      excluded.extend(question_ids)
 
-    if previous_questions:
-      questions = questions.filter(Question.id.notin_(previous_questions))
-    questions = questions.all()
     if not questions:
       abort(404)
 
     return jsonify({
       'category': category,
       'previous_questions': previous_questions,
-      'question': random.choice(questions).format(),
+      'questions': quiz_rows(questions, app.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }), 200
+
+  # Endpoint to check answers to quiz questions on the server, one answer or
+  # a whole round in `answers`. Each question's answer is normalized once
+  # and cached, so grading only normalizes the submitted answer; case,
+  # punctuation, articles, numbers written as words and small typos are
+  # forgiven.
+  @app.route('/quizzes/answers', methods=['POST'])
+  @limits.limited('quiz')
+  @read_only
+  def check_answers():
+    submissions, batch = answer_args(request.get_json())
+    question_ids = list(dict.fromkeys(question_id for question_id, _ in submissions))
+
+    keys = answer_cache.find(question_ids)
+    missing = [question_id for question_id in question_ids if question_id not in keys]
+    if missing:
+      keys.update(answer_cache.load_rows((row[0], row[2]) for row in question_rows(missing, question_store)))
+    if len(keys) < len(question_ids):
+      abort(404)
+
+    return jsonify(answer_results(grade(submissions, keys), batch)), 200
+
+  # Endpoint to start a quiz session. The server shuffles the question ids of
+  # the category once and remembers which have been asked, so the client only
+  # sends the session ID on each turn.
+  @app.route('/quizzes/sessions', methods=['POST'])
+  @limits.limited('quiz')
+  @read_only
+  def create_quiz_session():
+    body = request.get_json()
+    if not body or 'category' not in body:
+      abort(400)
+    category_id = quiz_category_id(body['category'])
+
+    if category_id != 0:
+      quiz_category = category_cache.get(category_id)
+
+      if not quiz_category:
+        abort(404)
+
+    session = QuizSession.shuffled(category_id, quiz_index.ids(category_id, quiz_difficulty(body)))
+    quiz_sessions.save(session)
+
+    return jsonify({
+      **session.format(),
+      'expires_in': app.config['QUIZ_SESSION_TTL'],
       'success': True
     }), 200
 
+  # Endpoint to get the next question of a quiz session. Returns 404 when the
+  # session doesn't exist, has expired or has no questions left.
+  @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+  @limits.limited('quiz')
+  @read_only
+  def next_quiz_session_question(session_id):
+    session = quiz_sessions.get(session_id)
+    if not session:
+      abort(404)
+
+    # Skips questions deleted since the session started.
+    questions = []
+    while not questions:
+      question_id = session.next_question_id()
+      if question_id is None:
+        quiz_sessions.save(session)
+        abort(404)
+      questions = format_questions([question_id], question_store)
+    quiz_sessions.save(session)
+
+    return jsonify({
+      **session.format(),
+      'question': quiz_question(questions[0], app.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }), 200
+
+  # Endpoint to end a quiz session.
+  @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+  def delete_quiz_session(session_id):
+    if not quiz_sessions.delete(session_id):
+      abort(404)
+
+    return jsonify({
+      'session_id': session_id,
+      'success': True
+    }), 200
+
+  # Endpoint to submit a maintenance job, run by a background worker. Kinds:
+  # 'category-stats' and 'find-duplicates' (params: optional threshold).
+  # Returns 202 with the queued job, to be polled at its Location.
+  @app.route('/jobs', methods=['POST'])
+  def submit_job():
+    body = request.get_json()
+    if not body or body.get('kind') not in ['category-stats', 'find-duplicates']:
+      abort(400)
+    params = body.get('params') or {}
+    if not isinstance(params, dict):
+      abort(422)
+
+    if body['kind'] == 'find-duplicates':
+      threshold = params.get('threshold', app.config['DEDUP_THRESHOLD'])
+      if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 < threshold <= 1:
+        abort(422)
+      params = {'threshold': threshold}
+    else:
+      params = {'generation': category_stats.generation}
+
+    job = jobs.submit(body['kind'], params)
+    return jsonify({
+      'job': job.format(),
+      'success': True
+    }), 202, {'Location': url_for('get_job', job_id=job.id)}
+
+  # Endpoint to import questions in a background job. The body is saved to a
+  # file in JOB_DIRECTORY as it is read, then imported like POST
+  # /questions/import by a worker.
+  @app.route('/jobs/import', methods=['POST'])
+  def submit_import_job():
+    import_format = FORMATS.get(request.mimetype)
+    if not import_format:
+      abort(400)
+
+    handle, path = tempfile.mkstemp(prefix='trivia-import-', suffix='.' + import_format, dir=app.config['JOB_DIRECTORY'])
+    with os.fdopen(handle, 'wb') as upload:
+      shutil.copyfileobj(request.stream, upload)
+
+    job = jobs.submit('import', {'path': path, 'format': import_format})
+    return jsonify({
+      'job': job.format(),
+      'success': True
+    }), 202, {'Location': url_for('get_job', job_id=job.id)}
+
+  # Endpoint to poll a job: its status, progress and, once it has
+  # succeeded, its result.
+  @app.route('/jobs/<int:job_id>', methods=['GET'])
+  def get_job(job_id):
+    job = Job.query.get(job_id)
+    if job is None:
+      abort(404)
+
+    return jsonify({
+      'job': job.format(),
+      'success': True
+    }), 200
+
+  # Endpoint to read the request metrics in the Prometheus text format. Only
+  # available when METRICS_ENABLED is set.
+  if app.config['METRICS_ENABLED']:
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+      return app.response_class(metrics.render(db.pools()), mimetype='text/plain; version=0.0.4')
+
+# ----------------------------------------------------------------------
+# Commands
+# ----------------------------------------------------------------------
+
+  # Command to import questions from an NDJSON or CSV file (by extension):
+  #   flask import-questions questions.ndjson
+  @app.cli.command('import-questions')
+  @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+  def import_questions_command(path):
+    import_format = 'csv' if path.endswith('.csv') else 'ndjson'
+    with open(path, encoding='utf-8', newline='') as lines:
+      importer = QuestionImporter(category_cache, is_valid_difficulty, dedup=importer_dedup())
+      importer.run(READERS[import_format](lines))
+    click.echo(json.dumps(importer.format(), indent=2))
+
+  # Command to export every question to an NDJSON or CSV file (by extension):
+  #   flask export-questions questions.csv
+  @app.cli.command('export-questions')
+  @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+  def export_questions_command(path):
+    export_format = 'csv' if path.endswith('.csv') else 'ndjson'
+    writer, mimetype = WRITERS[export_format]
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+      for chunk in writer(iter_questions()):
+        output.write(chunk)
+
+  # Command to scan the questions table and print each group of duplicate
+  # questions as a line of JSON, largest first:
+  #   flask find-duplicates --threshold 0.8
+  @app.cli.command('find-duplicates')
+  @click.option('--threshold', type=float, default=None)
+  def find_duplicates_command(threshold):
+    index = DedupIndex(threshold or app.config['DEDUP_THRESHOLD'], max_age=None).current()
+    for question_ids in index.clusters():
+      click.echo(json.dumps({'ids': question_ids, 'questions': format_questions(question_ids)}))
+
 # ----------------------------------------------------------------------
 # Error handlers
 # ----------------------------------------------------------------------
@@ -303,6 +1276,16 @@ def create_app(test_config=None):
       "message": "Item not found."
       }), 404
 
+  #Error handler for new questions duplicating existing ones.
+  @app.errorhandler(409)
+  def conflict(error):
+    return jsonify({
+      "success": False, 
+      "error": 409,
+      "message": "Duplicate question.",
+      "duplicates": getattr(error, 'duplicates', [])
+      }), 409
+
   #Error handler for requests that cannot be processed.
   @app.errorhandler(422)
   def unprocessable(error):
@@ -312,6 +1295,15 @@ def create_app(test_config=None):
       "message": "Request could not be processed."
       }), 422
 
+  #Error handler for clients sending requests faster than their rate limit.
+  @app.errorhandler(429)
+  def too_many_requests(error):
+    return jsonify({
+      "success": False, 
+      "error": 429,
+      "message": "Too many requests."
+      }), 429, retry_after_headers(error)
+
   #Error handler for when the server fails. 
   @app.errorhandler(500)
   def internal_server_error(error):
@@ -321,6 +1313,15 @@ def create_app(test_config=None):
       "message": "Internal Server Error."
       }), 500
 
+  #Error handler for requests shed while the server is overloaded.
+  @app.errorhandler(503)
+  def service_unavailable(error):
+    return jsonify({
+      "success": False, 
+      "error": 503,
+      "message": "Service unavailable."
+      }), 503, retry_after_headers(error)
+
 # ----------------------------------------------------------------------
 # Runs app
 # ----------------------------------------------------------------------
@@ -0,0 +1,198 @@
+import re, threading, time, unicodedata
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------
+# Answer checking
+# ----------------------------------------------------------------------
+
+WORD_PATTERN = re.compile(r'\w+')
+# Thousands separators, as in 1,000.
+DIGIT_GROUP_PATTERN = re.compile(r'(?<=\d)[,_](?=\d{3}\b)')
+
+ARTICLES = frozenset(['a', 'an', 'the'])
+
+NUMBER_WORDS = {
+  'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+  'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+  'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16,
+  'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20,
+  'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70,
+  'eighty': 80, 'ninety': 90
+}
+SCALE_WORDS = {'hundred': 100, 'thousand': 1000, 'million': 1000000, 'billion': 1000000000}
+
+# Replaces numbers written as words ("twenty one", "one hundred and five",
+# "nineteen ninety") with their digits. Digits lose their leading zeros. A
+# word that can't extend the number before it starts a new one: units and
+# teens only follow tens or scales, so "seven eleven" is 7 and 11.
+def numbers_as_digits(words):
+  result, total, current, last = [], 0, 0, None
+  for position, word in enumerate(words):
+    if word in NUMBER_WORDS:
+      value = NUMBER_WORDS[word]
+      kind = 'unit' if value < 10 else 'teen' if value < 20 else 'tens'
+      # Years are said in pairs of digits: "nineteen eighty", "twenty ten".
+      if last in ('teen', 'tens') and kind != 'unit' and current % 100 >= 10:
+        current = current * 100 + value
+      elif last == 'scale' or (last == 'tens' and kind == 'unit'):
+        current += value
+      else:
+        if last is not None:
+          result.append(str(total + current))
+        total, current = 0, value
+      last = kind
+      continue
+    if word in SCALE_WORDS and last is not None:
+      if SCALE_WORDS[word] == 100:
+        current = (current or 1) * 100
+      else:
+        total, current = total + (current or 1) * SCALE_WORDS[word], 0
+      last = 'scale'
+      continue
+    # "and" only belongs to a number written as words between two parts.
+    if word == 'and' and last is not None and position + 1 < len(words) and words[position + 1] in NUMBER_WORDS:
+      continue
+    if last is not None:
+      result.append(str(total + current))
+      total, current, last = 0, 0, None
+    result.append(word.lstrip('0') or '0' if word.isdecimal() else word)
+  if last is not None:
+    result.append(str(total + current))
+  return result
+
+# Returns the words of an answer, lowercased and without accents,
+# punctuation or articles, with numbers as digits. An answer made only of
+# articles keeps them.
+def normalize_answer(text):
+  text = (text or '').replace("'", '').replace('’', '')
+  if not text.isascii():
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+  words = numbers_as_digits(WORD_PATTERN.findall(DIGIT_GROUP_PATTERN.sub('', text.lower())))
+  return [word for word in words if word not in ARTICLES] or words
+
+# Typos forgiven in an answer of the given length: none up to 3 characters,
+# one up to 7 and two beyond.
+def allowed_typos(length):
+  if length <= 3:
+    return 0
+  if length <= 7:
+    return 1
+  return 2
+
+# Checks that two strings are at most `limit` edits apart, counting an
+# insertion, deletion, substitution or swap of two adjacent characters as
+# one edit. Only the cells within `limit` of the diagonal are computed, and
+# the check stops as soon as every cell of a row is over the limit.
+def within_distance(first, second, limit):
+  if first == second:
+    return True
+  if abs(len(first) - len(second)) > limit or limit == 0:
+    return False
+  # Common prefixes and suffixes cost nothing.
+  start = 0
+  while start < len(first) and start < len(second) and first[start] == second[start]:
+    start += 1
+  end = 0
+  while end < len(first) - start and end < len(second) - start and first[-1 - end] == second[-1 - end]:
+    end += 1
+  first, second = first[start:len(first) - end], second[start:len(second) - end]
+
+  over = limit + 1
+  before, previous = None, list(range(len(second) + 1))
+  for row in range(1, len(first) + 1):
+    current = [row] + [over] * len(second)
+    for column in range(max(1, row - limit), min(len(second), row + limit) + 1):
+      value = min(
+        previous[column] + 1,
+        current[column - 1] + 1,
+        previous[column - 1] + (first[row - 1] != second[column - 1])
+      )
+      if row > 1 and column > 1 and first[row - 1] == second[column - 2] and first[row - 2] == second[column - 1]:
+        value = min(value, before[column - 2] + 1)
+      current[column] = value
+    if min(current) > limit:
+      return False
+    before, previous = previous, current
+  return previous[-1] <= limit
+
+'''
+AnswerKey
+    the normalized form of a question's answer, precomputed once so a check
+    only normalizes the submitted answer. The numbers must match exactly;
+    the rest may differ by the typos allowed for the answer's length, and
+    spaces are ignored.
+'''
+class AnswerKey:
+
+  __slots__ = ('answer', 'numbers', 'compact', 'typos')
+
+  def __init__(self, answer):
+    words = normalize_answer(answer)
+    self.answer = answer
+    self.numbers = [word for word in words if word.isdecimal()]
+    self.compact = ''.join(words)
+    self.typos = allowed_typos(len(self.compact))
+
+  def check(self, submitted):
+    words = normalize_answer(submitted)
+    compact = ''.join(words)
+    if not compact or [word for word in words if word.isdecimal()] != self.numbers:
+      return False
+    return within_distance(compact, self.compact, self.typos)
+
+'''
+AnswerCache
+    answer keys of the most recently checked questions, by id, up to
+    `max_size` of them. Keys missing from the cache are built from the
+    (id, answer) rows of the database. Like the other in-process indexes it
+    is emptied after `max_age` seconds, to pick up answers changed by other
+    worker processes.
+'''
+class AnswerCache:
+
+  def __init__(self, max_size=100000, max_age=300):
+    self.max_size = max_size
+    self.max_age = max_age
+    self.keys = OrderedDict()
+    self.loaded_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def reset(self):
+    with self.lock:
+      self.keys.clear()
+      self.loaded_at = time.monotonic()
+
+  # Returns {id: AnswerKey} of the given questions found in the cache.
+  def find(self, question_ids):
+    if self.max_age is not None and time.monotonic() - self.loaded_at > self.max_age:
+      self.reset()
+    found = {}
+    with self.lock:
+      for question_id in question_ids:
+        key = self.keys.get(question_id)
+        if key is not None:
+          self.keys.move_to_end(question_id)
+          found[question_id] = key
+    return found
+
+  # Builds and caches the keys of (id, answer) rows. Returns them by id.
+  def load_rows(self, rows):
+    loaded = {question_id: AnswerKey(answer) for question_id, answer in rows}
+    with self.lock:
+      self.keys.update(loaded)
+      while len(self.keys) > self.max_size:
+        self.keys.popitem(last=False)
+    return loaded
+
+  def remove(self, question_id):
+    with self.lock:
+      self.keys.pop(question_id, None)
+
+# Grades (question id, submitted answer) pairs with the answer keys of the
+# questions. Returns one result per pair.
+def grade(submissions, keys):
+  return [{
+    'question_id': question_id,
+    'correct': keys[question_id].check(answer),
+    'correct_answer': keys[question_id].answer
+  } for question_id, answer in submissions]
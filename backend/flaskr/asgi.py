@@ -0,0 +1,828 @@
+import asyncio, json, re, sys, traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from sqlalchemy import create_engine, text
+
+try:
+  import asyncpg
+except ImportError:
+  asyncpg = None
+
+from models import database_path
+from werkzeug.exceptions import HTTPException
+
+from . import QUESTIONS_PER_PAGE, is_valid_difficulty, quiz_category_id, quiz_previous_questions, quiz_difficulty, quiz_round_size, search_page, quiz_rows, quiz_question, answer_args, answer_results, scroll_args, scroll_columns, scroll_page
+from .quiz import QuizIndex, DEFAULT_DIFFICULTY
+from .sessions import QuizSession, make_session_store
+from .search import SearchIndex
+from .indexes import reload_due
+from .categories import CategoryCache
+from .stats import CategoryStats
+from .dedup import DedupIndex, duplicate_of
+from .answers import AnswerCache, grade
+from .serializer import Serializer, Rows, negotiate_encoding, compress
+from .limits import AdmissionControl, make_rate_limiter, client_address, retry_later
+
+# ----------------------------------------------------------------------
+# Async (ASGI) app
+#
+#   uvicorn flaskr.asgi:app --workers 2
+#
+# Serves the trivia routes of create_app with the same JSON contracts,
+# without blocking a thread per request: Postgres is reached through an
+# asyncpg connection pool. Other databases (SQLite for tests and local
+# runs) go through SQLAlchemy on a small thread pool. Bulk import/export,
+# streaming, the response cache and /metrics are only served by the WSGI
+# app.
+# ----------------------------------------------------------------------
+
+DEFAULT_CONFIG = {
+  'DATABASE_URL': database_path,
+  'DATABASE_POOL_MIN_SIZE': 2,
+  'DATABASE_POOL_MAX_SIZE': 20,
+  'DATABASE_THREADS': 8,
+  'QUIZ_SESSION_STORE': 'memory',
+  'QUIZ_SESSION_TTL': 3600,
+  'QUIZ_SESSION_MAX': 10000,
+  'SEARCH_BACKEND': 'index',
+  'SEARCH_MIN_PREFIX': 3,
+  'INDEX_REFRESH_INTERVAL': 30,
+  'SOFT_DELETE': False,
+  'JSON_BACKEND': 'auto',
+  'RESPONSE_COMPRESSION': False,
+  'RESPONSE_COMPRESSION_MIN_SIZE': 1024,
+  'RATE_LIMIT_STORE': None,
+  'RATE_LIMITS': {
+    'search': {'client': (5, 20), 'route': (200, 400)},
+    'quiz': {'client': (10, 40), 'route': (500, 1000)}
+  },
+  'RATE_LIMIT_CLIENT_HEADER': None,
+  'MAX_CONCURRENT_REQUESTS': None,
+  'ADMISSION_RETRY_AFTER': 1,
+  'DEDUP_THRESHOLD': 0.7,
+  'REJECT_DUPLICATES': True,
+  'QUIZ_HIDE_ANSWERS': False,
+  'ANSWER_CACHE_SIZE': 100000
+}
+
+ERROR_MESSAGES = {
+  400: 'Bad request.',
+  404: 'Item not found.',
+  405: 'Method not allowed.',
+  409: 'Duplicate question.',
+  422: 'Request could not be processed.',
+  429: 'Too many requests.',
+  500: 'Internal Server Error.',
+  503: 'Service unavailable.'
+}
+
+# Route groups with rate limits, by handler.
+LIMITED_ROUTES = {
+  'find_questions': 'search',
+  'play_quiz': 'quiz',
+  'play_quiz_round': 'quiz',
+  'check_answers': 'quiz',
+  'create_quiz_session': 'quiz',
+  'next_quiz_session_question': 'quiz'
+}
+
+# Queries loading the in-process indexes, by attribute of the app.
+INDEX_QUERIES = {
+  'quiz_index': 'SELECT id, category, difficulty FROM questions WHERE NOT deleted',
+  'search_index': 'SELECT id, question, answer FROM questions WHERE NOT deleted',
+  'category_stats': 'SELECT category, difficulty, count(id) FROM questions WHERE NOT deleted GROUP BY category, difficulty',
+  'dedup_index': 'SELECT id, question FROM questions WHERE NOT deleted'
+}
+
+QUESTION_FIELDS = ['id', 'question', 'answer', 'difficulty', 'category']
+QUESTION_COLUMNS = 'id, question, answer, difficulty, category'
+
+class HTTPError(Exception):
+
+  def __init__(self, code):
+    super().__init__(code)
+    self.code = code
+
+def abort(code):
+  raise HTTPError(code)
+
+def format_question(row):
+  return dict(zip(QUESTION_FIELDS, row))
+
+# Rewrites the :name placeholders of a query into asyncpg's $1, $2...
+def positional(sql, params):
+  names = []
+  def placeholder(match):
+    names.append(match.group(1))
+    return '$%d' % len(names)
+  return re.sub(r'(?<!:):(\w+)', placeholder, sql), [params[name] for name in names]
+
+# Builds ':id0, :id1, ...' placeholders and their parameters for an IN list.
+def in_list(values, prefix='id'):
+  params = {'%s%d' % (prefix, number): value for number, value in enumerate(values)}
+  return ', '.join(':' + name for name in params), params
+
+'''
+AsyncpgDatabase
+    runs queries on a pool of asyncpg connections, created on first use in
+    the serving event loop.
+'''
+class AsyncpgDatabase:
+
+  def __init__(self, url, min_size=2, max_size=20):
+    self.url = url
+    self.min_size = min_size
+    self.max_size = max_size
+    self.pool = None
+    self.lock = None
+
+  async def connect(self):
+    if asyncpg is None:
+      raise RuntimeError('The async app needs asyncpg to reach Postgres: pip install asyncpg')
+    if self.pool is None:
+      if self.lock is None:
+        self.lock = asyncio.Lock()
+      async with self.lock:
+        if self.pool is None:
+          self.pool = await asyncpg.create_pool(self.url, min_size=self.min_size, max_size=self.max_size)
+    return self.pool
+
+  async def fetch(self, sql, params={}):
+    sql, args = positional(sql, params)
+    pool = await self.connect()
+    async with pool.acquire() as connection:
+      return [tuple(row) for row in await connection.fetch(sql, *args)]
+
+  async def fetchval(self, sql, params={}):
+    sql, args = positional(sql, params)
+    pool = await self.connect()
+    async with pool.acquire() as connection:
+      return await connection.fetchval(sql, *args)
+
+  async def execute(self, sql, params={}):
+    await self.fetchval(sql, params)
+
+  async def close(self):
+    if self.pool is not None:
+      await self.pool.close()
+      self.pool = None
+
+'''
+ThreadPoolDatabase
+    runs queries with SQLAlchemy on a thread pool, for databases without an
+    async driver such as the SQLite files used by the tests.
+'''
+class ThreadPoolDatabase:
+
+  def __init__(self, url, threads=8):
+    self.engine = create_engine(url)
+    self.executor = ThreadPoolExecutor(threads)
+
+  async def run(self, function):
+    return await asyncio.get_event_loop().run_in_executor(self.executor, function)
+
+  async def fetch(self, sql, params={}):
+    # Rows are read inside an explicit transaction, so statements with a
+    # RETURNING clause commit after their rows are fetched.
+    def fetch():
+      with self.engine.begin() as connection:
+        return [tuple(row) for row in connection.execute(text(sql), params)]
+    return await self.run(fetch)
+
+  async def fetchval(self, sql, params={}):
+    def fetchval():
+      with self.engine.begin() as connection:
+        return connection.execute(text(sql), params).scalar()
+    return await self.run(fetchval)
+
+  async def execute(self, sql, params={}):
+    def execute():
+      with self.engine.begin() as connection:
+        connection.execute(text(sql), params)
+    await self.run(execute)
+
+  async def close(self):
+    self.engine.dispose()
+
+def make_async_database(config):
+  url = config['DATABASE_URL']
+  if url.startswith('postgres'):
+    return AsyncpgDatabase(url, min_size=config['DATABASE_POOL_MIN_SIZE'], max_size=config['DATABASE_POOL_MAX_SIZE'])
+  return ThreadPoolDatabase(url, threads=config['DATABASE_THREADS'])
+
+'''
+Request
+    the parts of an ASGI HTTP request the routes use.
+'''
+class Request:
+
+  def __init__(self, method, path, args, body, headers={}, client=None):
+    self.method = method
+    self.path = path
+    self.args = args
+    self.body = body
+    self.headers = headers
+    self.client = client
+
+  @classmethod
+  async def read(cls, scope, receive):
+    body = b''
+    while True:
+      message = await receive()
+      body += message.get('body', b'')
+      if not message.get('more_body'):
+        break
+    args = {name: values[0] for name, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+    return cls(scope['method'], scope['path'], args, body, headers, (scope.get('client') or [None])[0])
+
+  def arg(self, name, default=None, type=str):
+    try:
+      return type(self.args[name])
+    except (KeyError, ValueError):
+      return default
+
+  def get_json(self):
+    try:
+      body = json.loads(self.body.decode('utf-8'))
+    except ValueError:
+      abort(400)
+    if not isinstance(body, dict):
+      abort(400)
+    return body
+
+'''
+TriviaASGI
+    the ASGI application. Routes are coroutines returning the JSON payload;
+    errors are raised as HTTPError and answered like the WSGI app's error
+    handlers.
+'''
+class TriviaASGI:
+
+  def __init__(self, config=None):
+    self.config = dict(DEFAULT_CONFIG, **(config or {}))
+    self.database = make_async_database(self.config)
+    self.serializer = Serializer(self.config['JSON_BACKEND'])
+    # Rate limits and a cap on concurrent requests for the search and quiz
+    # routes, like the WSGI app. The asyncpg pool queues requests itself, so
+    # only the cap sheds load.
+    self.limiter = make_rate_limiter(self.config)
+    self.admission = AdmissionControl(self.config['MAX_CONCURRENT_REQUESTS'])
+    self.client_header = (self.config['RATE_LIMIT_CLIENT_HEADER'] or '').lower() or None
+    self.quiz_index = QuizIndex()
+    self.search_index = SearchIndex(min_prefix=self.config['SEARCH_MIN_PREFIX'])
+    self.refresher = None
+    # One load at a time per index, shared by the requests waiting for it.
+    self.index_locks = {name: asyncio.Lock() for name in INDEX_QUERIES}
+    self.category_cache = CategoryCache()
+    self.category_stats = CategoryStats()
+    self.dedup_index = DedupIndex(self.config['DEDUP_THRESHOLD'])
+    self.answer_cache = AnswerCache(self.config['ANSWER_CACHE_SIZE'])
+    self.quiz_sessions = make_session_store(self.config)
+    self.routes = [
+      ('GET', r'/(?:v2/)?categories', self.get_categories),
+      ('GET', r'/categories/stats', self.get_category_stats),
+      ('GET', r'/questions(?:/(?P<page>\d+))?', self.get_questions),
+      ('GET', r'/categories/(?P<category>[^/]+)/questions(?:/(?P<page>\d+))?', self.get_questions_by_category),
+      ('GET', r'/v2/questions', self.scroll_questions),
+      ('DELETE', r'/questions/(?P<quest_id>\d+)', self.delete_questions),
+      ('POST', r'/questions', self.add_questions),
+      ('POST', r'/search', self.find_questions),
+      ('POST', r'/quizzes', self.play_quiz),
+      ('POST', r'/quizzes/rounds', self.play_quiz_round),
+      ('POST', r'/quizzes/answers', self.check_answers),
+      ('POST', r'/quizzes/sessions', self.create_quiz_session),
+      ('POST', r'/quizzes/sessions/(?P<session_id>[^/]+)/next', self.next_quiz_session_question),
+      ('DELETE', r'/quizzes/sessions/(?P<session_id>[^/]+)', self.delete_quiz_session)
+    ]
+    self.routes = [(method, re.compile(pattern + '/?$'), handler) for method, pattern, handler in self.routes]
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      await self.lifespan(receive, send)
+      return
+    if scope['type'] != 'http':
+      return
+
+    request = await Request.read(scope, receive)
+    retry_after = None
+    try:
+      status, payload = 200, await self.dispatch(request)
+    except (HTTPError, HTTPException) as error:
+      status, payload = error.code, {
+        'success': False,
+        'error': error.code,
+        'message': ERROR_MESSAGES.get(error.code, '')
+      }
+      retry_after = getattr(error, 'retry_after', None)
+      if hasattr(error, 'duplicates'):
+        payload['duplicates'] = error.duplicates
+    except Exception:
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+      status, payload = 500, {'success': False, 'error': 500, 'message': ERROR_MESSAGES[500]}
+
+    body = self.serializer.dumps(payload)
+    headers = [
+      (b'content-type', b'application/json'),
+      (b'access-control-allow-headers', b'Content-Type,Authorization,true'),
+      (b'access-control-allow-methods', b'GET,PATCH,POST,DELETE,OPTIONS')
+    ]
+    if retry_after:
+      headers.append((b'retry-after', str(retry_after).encode('latin-1')))
+    # Compresses large responses like the WSGI app.
+    if self.config['RESPONSE_COMPRESSION'] and status == 200 and len(body) >= self.config['RESPONSE_COMPRESSION_MIN_SIZE']:
+      headers.append((b'vary', b'Accept-Encoding'))
+      encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+      if encoding:
+        body = compress(body, encoding)
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({
+      'type': 'http.response.start',
+      'status': status,
+      'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        if self.config['INDEX_REFRESH_INTERVAL']:
+          self.refresher = asyncio.ensure_future(self.refresh_indexes(self.config['INDEX_REFRESH_INTERVAL']))
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        if self.refresher:
+          self.refresher.cancel()
+        await self.database.close()
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  async def dispatch(self, request):
+    path_matched = False
+    for method, pattern, handler in self.routes:
+      match = pattern.match(request.path)
+      if not match:
+        continue
+      path_matched = True
+      if method == request.method:
+        arguments = {name: value for name, value in match.groupdict().items() if value is not None}
+        group = LIMITED_ROUTES.get(handler.__name__)
+        if group:
+          return await self.limited(group, request, handler, arguments)
+        return await handler(request, **arguments)
+    abort(405 if path_matched else 404)
+
+  # Runs a handler of a rate-limited route group, answering 429 when the
+  # client is over its limit and 503 when MAX_CONCURRENT_REQUESTS are running.
+  async def limited(self, group, request, handler, arguments):
+    if self.limiter:
+      wait = self.limiter.check(group, client_address(request.client, request.headers, self.client_header))
+      if wait:
+        raise retry_later(HTTPError(429), wait)
+    if not self.admission.enter():
+      raise retry_later(HTTPError(503), self.config['ADMISSION_RETRY_AFTER'])
+    try:
+      return await handler(request, **arguments)
+    finally:
+      self.admission.leave()
+
+# ----------------------------------------------------------------------
+# Indexes
+# ----------------------------------------------------------------------
+
+  async def categories(self):
+    if not self.category_cache.is_loaded():
+      self.category_cache.load_rows(await self.database.fetch('SELECT id, type FROM categories ORDER BY id'))
+    return self.category_cache
+
+  # Loads an index of INDEX_QUERIES, unless it is loaded and not `force`d.
+  # Writes are recorded before the rows are read, the new contents are built
+  # on a thread and only published on the event loop, so requests keep being
+  # served from the current contents meanwhile.
+  async def load_index(self, name, force=False):
+    index = getattr(self, name)
+    async with self.index_locks[name]:
+      if not force and index.is_loaded():
+        return index
+      index.start_build()
+      try:
+        rows = await self.database.fetch(INDEX_QUERIES[name])
+        contents = await asyncio.get_event_loop().run_in_executor(None, index.build, rows)
+      except BaseException:
+        index.cancel_build()
+        raise
+      index.publish(contents)
+    return index
+
+  async def stats(self):
+    if not self.category_stats.is_loaded():
+      await self.load_index('category_stats')
+    return self.category_stats
+
+  async def quiz(self):
+    if not self.quiz_index.is_loaded():
+      await self.load_index('quiz_index')
+    return self.quiz_index
+
+  async def search_hits(self, search_term, search_answers, limit):
+    if not self.search_index.is_loaded():
+      await self.load_index('search_index')
+    return self.search_index.search(search_term, search_answers=search_answers, limit=limit)
+
+  # Loads the search and dedup indexes when the app starts, then reloads the
+  # loaded indexes before they expire, like the IndexRefresher of the WSGI
+  # app.
+  async def refresh_indexes(self, interval):
+    preloaded = []
+    if self.config['SEARCH_BACKEND'] == 'index':
+      preloaded.append('search_index')
+    if self.config['REJECT_DUPLICATES']:
+      preloaded.append('dedup_index')
+    for name in preloaded:
+      if getattr(self, name).loaded_at is None:
+        await self.reload_index(name)
+    while True:
+      await asyncio.sleep(interval)
+      for name in INDEX_QUERIES:
+        if reload_due(getattr(self, name), interval):
+          await self.reload_index(name)
+
+  async def reload_index(self, name):
+    try:
+      await self.load_index(name, force=True)
+    except Exception:
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+
+  async def dedup(self):
+    if not self.dedup_index.is_loaded():
+      await self.load_index('dedup_index')
+    return self.dedup_index
+
+  # Returns {id: AnswerKey} of the questions, loading the keys missing from
+  # the answer cache.
+  async def answer_keys(self, question_ids):
+    keys = self.answer_cache.find(question_ids)
+    missing = [question_id for question_id in question_ids if question_id not in keys]
+    if missing:
+      placeholders, params = in_list(missing)
+      keys.update(self.answer_cache.load_rows(await self.database.fetch(
+        'SELECT id, answer FROM questions WHERE NOT deleted AND id IN (' + placeholders + ')', params)))
+    return keys
+
+  async def load_questions(self, question_ids):
+    if not question_ids:
+      return []
+    placeholders, params = in_list(question_ids)
+    rows = await self.database.fetch('SELECT ' + QUESTION_COLUMNS + ' FROM questions WHERE NOT deleted AND id IN (' + placeholders + ')', params)
+    rows = {row[0]: row for row in rows}
+    return [rows[question_id] for question_id in question_ids if question_id in rows]
+
+# ----------------------------------------------------------------------
+# Endpoints
+# ----------------------------------------------------------------------
+
+  async def get_categories(self, request):
+    categories = (await self.categories()).by_id
+    if not categories:
+      abort(404)
+
+    return {
+      'success': True,
+      'categories': categories
+    }
+
+  async def get_category_stats(self, request):
+    categories = (await self.categories()).by_id
+    if not categories:
+      abort(404)
+    stats = await self.stats()
+
+    return {
+      'categories': stats.format(categories),
+      'total_questions': stats.total(),
+      'success': True
+    }
+
+  # Returns the requested page of questions matching the WHERE clause, and
+  # the link to the next page, like paginate_questions and next_page_url.
+  async def paginate(self, request, path_page, where, params, next_path):
+    page = int(path_page) if path_page else request.arg('page', 1, type=int)
+    after_id = request.arg('after_id', type=int)
+
+    conditions = ['NOT deleted'] + where
+    params = dict(params, limit=QUESTIONS_PER_PAGE)
+    if after_id is not None:
+      conditions.append('id > :after_id')
+      params['after_id'] = after_id
+      offset = ''
+    elif page >= 1:
+      offset = ' OFFSET :offset'
+      params['offset'] = (page - 1) * QUESTIONS_PER_PAGE
+    else:
+      abort(404)
+
+    clause = ' WHERE ' + ' AND '.join(conditions)
+    rows = await self.database.fetch(
+      'SELECT ' + QUESTION_COLUMNS + ' FROM questions' + clause + ' ORDER BY id LIMIT :limit' + offset, params)
+    if not rows:
+      abort(404)
+
+    if after_id is not None:
+      next_url = next_path + '?after_id=%d' % rows[-1][0]
+    else:
+      next_url = next_path + '/%d' % ((int(path_page) if path_page else 0) + 1)
+    return rows, next_url
+
+  async def get_questions(self, request, page=None):
+    categories = (await self.categories()).by_id
+    questions, next_url = await self.paginate(request, page, [], {}, '/questions')
+
+    return {
+      'questions': Rows(questions, QUESTION_FIELDS),
+      'categories': categories,
+      'success': True,
+      'total_questions': (await self.stats()).total(),
+      'next_url': next_url
+    }
+
+  async def get_questions_by_category(self, request, category, page=None):
+    category_id = (await self.categories()).find(category)
+    if category_id is None:
+      abort(400)
+
+    where, params = ['category = :category'], {'category': category_id}
+    questions, next_url = await self.paginate(request, page, where, params, '/categories/%s/questions' % category)
+
+    return {
+      'questions': Rows(questions, QUESTION_FIELDS),
+      'success': True,
+      'total_questions': (await self.stats()).total(category_id),
+      'next_url': next_url
+    }
+
+  async def scroll_questions(self, request):
+    after_id, limit, difficulty, fields = scroll_args(request.args)
+    conditions, params = ['NOT deleted', 'id > :after_id'], {'after_id': after_id, 'limit': limit + 1}
+    if 'category' in request.args:
+      params['category'] = (await self.categories()).find(request.args['category'])
+      if params['category'] is None:
+        abort(400)
+      conditions.append('category = :category')
+    if difficulty is not None:
+      conditions.append('difficulty = :difficulty')
+      params['difficulty'] = difficulty
+
+    rows = await self.database.fetch(
+      'SELECT ' + ', '.join(scroll_columns(fields)) + ' FROM questions WHERE ' + ' AND '.join(conditions) + ' ORDER BY id LIMIT :limit', params)
+    questions, next_after = scroll_page(rows, fields, limit)
+
+    return {
+      'questions': Rows(questions, fields),
+      'next': next_after,
+      'success': True
+    }
+
+  async def delete_questions(self, request, quest_id):
+    quest_id = int(quest_id)
+    if not quest_id:
+      abort(400)
+
+    # Deletes the question, or flags it as deleted with SOFT_DELETE.
+    if self.config['SOFT_DELETE']:
+      sql = 'UPDATE questions SET deleted = :deleted WHERE id = :id AND NOT deleted RETURNING category, difficulty'
+    else:
+      sql = 'DELETE FROM questions WHERE id = :id AND NOT deleted RETURNING category, difficulty'
+    rows = await self.database.fetch(sql, {'id': quest_id, 'deleted': True})
+    if not rows:
+      abort(404)
+
+    self.quiz_index.remove(quest_id)
+    self.search_index.remove(quest_id)
+    self.dedup_index.remove(quest_id)
+    self.answer_cache.remove(quest_id)
+    self.category_stats.remove(*rows[0])
+
+    return {
+      'id': quest_id,
+      'success': True
+    }
+
+  async def add_questions(self, request):
+    body = request.get_json()
+
+    for field in ['question', 'answer', 'category', 'difficulty']:
+      if field not in body:
+        abort(400)
+
+    category_id = (await self.categories()).find(body['category'])
+    if category_id is None:
+      abort(400)
+
+    if not is_valid_difficulty(body['difficulty']):
+      abort(422)
+
+    if not isinstance(body['question'], str) or not isinstance(body['answer'], str):
+      abort(422)
+
+    if self.config['REJECT_DUPLICATES'] and not body.get('allow_duplicate'):
+      duplicates = (await self.dedup()).matches(body['question'])
+      if duplicates:
+        raise duplicate_of([question_id for question_id, _ in duplicates])
+
+    data = {
+      'question': body['question'],
+      'answer': body['answer'],
+      'category': category_id,
+      'difficulty': int(body['difficulty'])
+    }
+    data['id'] = await self.database.fetchval(
+      'INSERT INTO questions (question, answer, category, difficulty) '
+      'VALUES (:question, :answer, :category, :difficulty) RETURNING id', data)
+    self.quiz_index.add(data['id'], category_id, data['difficulty'])
+    self.category_stats.add(category_id, data['difficulty'])
+    self.search_index.add(data['id'], data['question'], data['answer'])
+    self.dedup_index.add(data['id'], data['question'])
+
+    return {
+      'question': data,
+      'success': True
+    }
+
+  async def find_questions(self, request):
+    body = request.get_json()
+    if 'searchTerm' not in body:
+      abort(400)
+    search_term = body['searchTerm']
+    search_answers = body.get('searchAnswers', False)
+    page = search_page(body)
+
+    if self.config['SEARCH_BACKEND'] == 'ilike':
+      condition = 'lower(question) LIKE lower(:term)'
+      if search_answers:
+        condition += ' OR lower(answer) LIKE lower(:term)'
+      rows = await self.database.fetch('SELECT id FROM questions WHERE NOT deleted AND (' + condition + ') ORDER BY id', {'term': '%' + search_term + '%'})
+      hits = [row[0] for row in rows]
+      total_hits = len(hits)
+    else:
+      limit = page * QUESTIONS_PER_PAGE if page else None
+      hits, total_hits = await self.search_hits(search_term, search_answers, limit)
+
+    if page:
+      hits = hits[(page - 1) * QUESTIONS_PER_PAGE:page * QUESTIONS_PER_PAGE]
+    questions = await self.load_questions(hits)
+
+    if not questions:
+      abort(404)
+
+    return {
+      'questions': Rows(questions, QUESTION_FIELDS),
+      'success': True,
+      'totalQuestions': total_hits
+    }
+
+  async def play_quiz(self, request):
+    body = request.get_json()
+    if 'category' not in body:
+      abort(400)
+    category = body['category']
+    category_id = quiz_category_id(category)
+    previous_questions = quiz_previous_questions(body)
+
+    if category_id != 0 and category_id not in (await self.categories()).by_id:
+      abort(404)
+
+    difficulty = quiz_difficulty(body)
+    adaptive = body.get('adaptive', False)
+    if adaptive:
+      if isinstance(difficulty, list):
+        abort(400)
+      if difficulty is None:
+        difficulty = DEFAULT_DIFFICULTY
+
+    quiz = await self.quiz()
+    while True:
+      if adaptive:
+        question_id = quiz.pick_adaptive(category_id, previous_questions, difficulty, body.get('correct'))
+      else:
+        question_id = quiz.pick(category_id, previous_questions, difficulty=difficulty)
+      if question_id is None:
+        abort(404)
+      questions = await self.load_questions([question_id])
+      if questions:
+        break
+      self.quiz_index.remove(question_id)
+
+    return {
+      'category': category,
+      'previous_questions': previous_questions,
+      'question': quiz_question(format_question(questions[0]), self.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }
+
+  async def play_quiz_round(self, request):
+    body = request.get_json()
+    if 'category' not in body:
+      abort(400)
+    category = body['category']
+    category_id = quiz_category_id(category)
+    previous_questions = quiz_previous_questions(body)
+    difficulty = quiz_difficulty(body)
+    count = quiz_round_size(body)
+
+    if category_id != 0 and category_id not in (await self.categories()).by_id:
+      abort(404)
+
+    quiz = await self.quiz()
+    questions = []
+    excluded = list(previous_questions)
+    while len(questions) < count:
+      question_ids = quiz.sample(category_id, count - len(questions), excluded, difficulty=difficulty)
+      if not question_ids:
+        break
+      loaded = await self.load_questions(question_ids)
+      found = {row[0] for row in loaded}
+      for question_id in question_ids:
+        if question_id not in found:
+          quiz.remove(question_id)
+      questions.extend(loaded)
+      excluded.extend(question_ids)
+
+    if not questions:
+      abort(404)
+
+    return {
+      'category': category,
+      'previous_questions': previous_questions,
+      'questions': quiz_rows(questions, self.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }
+
+  async def check_answers(self, request):
+    submissions, batch = answer_args(request.get_json())
+    question_ids = list(dict.fromkeys(question_id for question_id, _ in submissions))
+
+    keys = await self.answer_keys(question_ids)
+    if len(keys) < len(question_ids):
+      abort(404)
+
+    return answer_results(grade(submissions, keys), batch)
+
+  async def create_quiz_session(self, request):
+    body = request.get_json()
+    if 'category' not in body:
+      abort(400)
+    category_id = quiz_category_id(body['category'])
+
+    if category_id != 0 and category_id not in (await self.categories()).by_id:
+      abort(404)
+
+    session = QuizSession.shuffled(category_id, (await self.quiz()).ids(category_id, quiz_difficulty(body)))
+    self.quiz_sessions.save(session)
+
+    return {
+      **session.format(),
+      'expires_in': self.config['QUIZ_SESSION_TTL'],
+      'success': True
+    }
+
+  async def next_quiz_session_question(self, request, session_id):
+    session = self.quiz_sessions.get(session_id)
+    if not session:
+      abort(404)
+
+    questions = []
+    while not questions:
+      question_id = session.next_question_id()
+      if question_id is None:
+        self.quiz_sessions.save(session)
+        abort(404)
+      questions = await self.load_questions([question_id])
+    self.quiz_sessions.save(session)
+
+    return {
+      **session.format(),
+      'question': quiz_question(format_question(questions[0]), self.config['QUIZ_HIDE_ANSWERS']),
+      'success': True
+    }
+
+  async def delete_quiz_session(self, request, session_id):
+    if not self.quiz_sessions.delete(session_id):
+      abort(404)
+
+    return {
+      'session_id': session_id,
+      'success': True
+    }
+
+def create_asgi_app(config=None):
+  return TriviaASGI(config)
+
+app = create_asgi_app()
@@ -0,0 +1,236 @@
+import csv, io, json
+from collections import Counter
+
+from models import db, Question
+from .streaming import QUESTION_FIELDS, ndjson_lines
+from .dedup import DedupIndex
+
+# ----------------------------------------------------------------------
+# Bulk question import, deletion and export
+# ----------------------------------------------------------------------
+
+# Most row errors reported back by an import; the rest are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+# Reads NDJSON lines into (line number, record) pairs. Lines that aren't JSON
+# objects come back with an error message instead of a record.
+def read_ndjson(lines):
+  for line_number, line in enumerate(lines, start=1):
+    if isinstance(line, bytes):
+      line = line.decode('utf-8')
+    if not line.strip():
+      continue
+    try:
+      record = json.loads(line)
+    except ValueError:
+      yield line_number, None, 'Invalid JSON.'
+      continue
+    if not isinstance(record, dict):
+      yield line_number, None, 'Expected a JSON object.'
+      continue
+    yield line_number, record, None
+
+# Reads CSV lines with a header row into (line number, record) pairs.
+def read_csv(lines):
+  lines = (line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+  reader = csv.DictReader(lines)
+  for record in reader:
+    yield reader.line_num, record, None
+
+READERS = {
+  'ndjson': read_ndjson,
+  'csv': read_csv
+}
+
+'''
+QuestionImporter
+    validates imported records and inserts them in chunks, each chunk as one
+    multi-row INSERT followed by one commit. Categories are resolved through
+    the category cache, so an import costs no per-row lookups. With a
+    `dedup` index, rows duplicating a question or an earlier row are
+    reported and skipped.
+'''
+class QuestionImporter:
+
+  def __init__(self, category_cache, is_valid_difficulty, chunk_size=1000, dedup=None):
+    self.category_cache = category_cache
+    self.is_valid_difficulty = is_valid_difficulty
+    self.chunk_size = chunk_size
+    self.dedup = dedup
+    # Rows of this import, by line number, for the duplicates within the file.
+    self.seen = None
+    if dedup is not None:
+      self.seen = DedupIndex(dedup.threshold, max_age=None)
+      self.seen.load_rows([])
+    self.imported = 0
+    self.categories = set()
+    self.errors = []
+    self.total_errors = 0
+
+  def error(self, line_number, message):
+    self.total_errors += 1
+    if len(self.errors) < MAX_REPORTED_ERRORS:
+      self.errors.append({'line': line_number, 'error': message})
+
+  # Returns the row to insert for a record, or raises ValueError.
+  def validate(self, record):
+    for field in ['question', 'answer', 'category', 'difficulty']:
+      if record.get(field) in (None, ''):
+        raise ValueError('Missing ' + field + '.')
+    for field in ['question', 'answer']:
+      if not isinstance(record[field], str):
+        raise ValueError('Invalid ' + field + '.')
+
+    category_id = self.category_cache.find(record['category'])
+    if category_id is None:
+      raise ValueError('Unknown category.')
+    try:
+      difficulty = int(record['difficulty'])
+    except (TypeError, ValueError):
+      raise ValueError('Invalid difficulty.')
+    if not self.is_valid_difficulty(difficulty):
+      raise ValueError('Invalid difficulty.')
+
+    return {
+      'question': record['question'],
+      'answer': record['answer'],
+      'category': category_id,
+      'difficulty': difficulty
+    }
+
+  # Raises ValueError when the question duplicates a question of the table
+  # or of an earlier line of the import.
+  def check_duplicate(self, line_number, row):
+    if self.dedup is None:
+      return
+    matches = self.dedup.matches(row['question'])
+    if matches:
+      raise ValueError('Duplicate of question %d.' % matches[0][0])
+    matches = self.seen.matches(row['question'])
+    if matches:
+      raise ValueError('Duplicate of line %d.' % matches[0][0])
+    self.seen.add(line_number, row['question'])
+
+  def insert(self, rows):
+    db.session.execute(Question.__table__.insert().values(rows))
+    db.session.commit()
+    self.imported += len(rows)
+    self.categories.update(row['category'] for row in rows)
+
+  def run(self, records):
+    rows = []
+    for line_number, record, error in records:
+      if error:
+        self.error(line_number, error)
+        continue
+      try:
+        row = self.validate(record)
+        self.check_duplicate(line_number, row)
+        rows.append(row)
+      except ValueError as exception:
+        self.error(line_number, str(exception))
+        continue
+      if len(rows) == self.chunk_size:
+        self.insert(rows)
+        rows = []
+    if rows:
+      self.insert(rows)
+    return self
+
+  def format(self):
+    return {
+      'imported': self.imported,
+      'errors': self.errors,
+      'total_errors': self.total_errors
+    }
+
+'''
+QuestionDeleter
+    deletes the questions matched by a list of ids or by a category and
+    difficulty filter. Matching rows are read `chunk_size` at a time and each
+    chunk is deleted with one set-based statement, all in the caller's
+    transaction. With `soft` the rows are only flagged as deleted, which
+    `restore` can undo.
+'''
+class QuestionDeleter:
+
+  def __init__(self, soft=False, chunk_size=1000):
+    self.soft = soft
+    self.chunk_size = chunk_size
+    self.deleted = []
+    self.restored = []
+    self.categories = set()
+    # Questions deleted or restored per (category, difficulty).
+    self.counts = Counter()
+
+  # Yields chunks of the (id, category, difficulty) rows matched whose
+  # deleted flag is `deleted`.
+  def select(self, question_ids=None, category=None, difficulty=None, deleted=False):
+    selection = db.session.query(Question.id, Question.category, Question.difficulty).filter(Question.deleted.is_(deleted))
+    if category is not None:
+      selection = selection.filter(Question.category == category)
+    if difficulty is not None:
+      selection = selection.filter(Question.difficulty == difficulty)
+
+    if question_ids is not None:
+      for start in range(0, len(question_ids), self.chunk_size):
+        rows = selection.filter(Question.id.in_(question_ids[start:start + self.chunk_size])).all()
+        if rows:
+          yield rows
+      return
+
+    after_id = 0
+    while True:
+      rows = selection.filter(Question.id > after_id).order_by(Question.id).limit(self.chunk_size).all()
+      if not rows:
+        return
+      yield rows
+      after_id = rows[-1][0]
+
+  def run(self, question_ids=None, category=None, difficulty=None):
+    for rows in self.select(question_ids, category, difficulty):
+      chunk = [row[0] for row in rows]
+      selection = Question.query.filter(Question.id.in_(chunk))
+      if self.soft:
+        selection.update({Question.deleted: True}, synchronize_session=False)
+      else:
+        selection.delete(synchronize_session=False)
+      self.deleted.extend(chunk)
+      self.categories.update(row[1] for row in rows)
+      self.counts.update((row[1], row[2]) for row in rows)
+    return self
+
+  def restore(self, question_ids=None, category=None, difficulty=None):
+    for rows in self.select(question_ids, category, difficulty, deleted=True):
+      chunk = [row[0] for row in rows]
+      Question.query.filter(Question.id.in_(chunk)).update({Question.deleted: False}, synchronize_session=False)
+      self.restored.extend(chunk)
+      self.categories.update(row[1] for row in rows)
+      self.counts.update((row[1], row[2]) for row in rows)
+    return self
+
+# Yields the CSV header, then one chunk of CSV text per 1000 rows.
+def export_csv(rows, chunk_size=1000):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(QUESTION_FIELDS)
+  for number, row in enumerate(rows, start=1):
+    writer.writerow(row)
+    if number % chunk_size == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  yield buffer.getvalue()
+
+WRITERS = {
+  'ndjson': (ndjson_lines, 'application/x-ndjson'),
+  'csv': (export_csv, 'text/csv')
+}
+
+# Maps a request or file mimetype to an import format.
+FORMATS = {
+  'application/x-ndjson': 'ndjson',
+  'application/jsonl': 'ndjson',
+  'application/json': 'ndjson',
+  'text/csv': 'csv'
+}
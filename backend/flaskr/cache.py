@@ -0,0 +1,194 @@
+import functools, sqlite3, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, request
+
+from .streaming import wants_stream
+
+# ----------------------------------------------------------------------
+# Response cache
+# ----------------------------------------------------------------------
+
+'''
+MemoryCacheBackend
+    size-bounded LRU of cached responses, plus the generation counters of
+    the cache scopes, kept in process.
+'''
+class MemoryCacheBackend:
+
+  def __init__(self, max_entries=1024, clock=time.time):
+    self.max_entries = max_entries
+    self.clock = clock
+    self.entries = OrderedDict()
+    self.generations = {}
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      if entry[0] <= self.clock():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return entry[1:]
+
+  def set(self, key, body, mimetype, etag, ttl):
+    with self.lock:
+      self.entries[key] = (self.clock() + ttl, body, mimetype, etag)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+  def generation(self, scope):
+    return self.generations.get(scope, 0)
+
+  def bump(self, scope):
+    with self.lock:
+      self.generations[scope] = self.generations.get(scope, 0) + 1
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+'''
+SQLiteCacheBackend
+    cached responses and generation counters in a local SQLite file, shared
+    by every worker process on the machine. Once `max_entries` is reached
+    the least recently used responses are evicted.
+'''
+class SQLiteCacheBackend:
+
+  def __init__(self, path, max_entries=1024, clock=time.time):
+    self.path = path
+    self.max_entries = max_entries
+    self.clock = clock
+    with self.connect() as connection:
+      connection.execute(
+        'CREATE TABLE IF NOT EXISTS responses ('
+        'key TEXT PRIMARY KEY, body BLOB, mimetype TEXT, etag TEXT, expires_at REAL, used_at REAL)'
+      )
+      connection.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)')
+      connection.execute('CREATE TABLE IF NOT EXISTS generations (scope TEXT PRIMARY KEY, generation INTEGER)')
+
+  @contextmanager
+  def connect(self):
+    connection = sqlite3.connect(self.path, timeout=10)
+    try:
+      with connection:
+        yield connection
+    finally:
+      connection.close()
+
+  def get(self, key):
+    now = self.clock()
+    with self.connect() as connection:
+      row = connection.execute(
+        'SELECT body, mimetype, etag FROM responses WHERE key = ? AND expires_at > ?', (key, now)
+      ).fetchone()
+      if row is not None:
+        connection.execute('UPDATE responses SET used_at = ? WHERE key = ?', (now, key))
+    return row
+
+  def set(self, key, body, mimetype, etag, ttl):
+    now = self.clock()
+    with self.connect() as connection:
+      connection.execute(
+        'INSERT OR REPLACE INTO responses (key, body, mimetype, etag, expires_at, used_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (key, body, mimetype, etag, now + ttl, now)
+      )
+      connection.execute(
+        'DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+        'ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+        (self.max_entries,)
+      )
+
+  def generation(self, scope):
+    with self.connect() as connection:
+      row = connection.execute('SELECT generation FROM generations WHERE scope = ?', (scope,)).fetchone()
+    return row[0] if row else 0
+
+  def bump(self, scope):
+    with self.connect() as connection:
+      connection.execute(
+        'INSERT INTO generations (scope, generation) VALUES (?, 1) '
+        'ON CONFLICT (scope) DO UPDATE SET generation = generation + 1',
+        (scope,)
+      )
+
+  def clear(self):
+    with self.connect() as connection:
+      connection.execute('DELETE FROM responses')
+
+'''
+ResponseCache
+    caches successful responses of read endpoints, keyed by path, query
+    string and the generations of the scopes the response depends on. A
+    write bumps the generation of the scopes it touches ('questions' for any
+    question, 'category:<id>' for the questions of one category), so only
+    the responses that depend on them stop being found; they age out of the
+    LRU. Entries also expire after `ttl` seconds.
+'''
+class ResponseCache:
+
+  def __init__(self, backend, ttl=60):
+    self.backend = backend
+    self.ttl = ttl
+
+  def key(self, scopes):
+    generations = ['%s=%s' % (scope, self.backend.generation(scope)) for scope in scopes]
+    return '|'.join([request.path + '?' + request.query_string.decode('utf-8')] + generations)
+
+  def invalidate(self, *scopes):
+    if self.backend is None:
+      return
+    for scope in scopes:
+      self.backend.bump(scope)
+
+  # Drops every cached response.
+  def clear(self):
+    if self.backend is not None:
+      self.backend.clear()
+
+  # Decorates a view to cache its 200 responses. `scopes` returns the list of
+  # scopes for the view arguments; responses also vary on the `version`
+  # string, e.g. the ETag of the categories the response includes. Streamed
+  # responses are never cached.
+  def cached(self, scopes, version=lambda: ''):
+    def decorator(view):
+      @functools.wraps(view)
+      def wrapper(**kwargs):
+        if self.backend is None or wants_stream(request):
+          return view(**kwargs)
+        key = self.key(scopes(**kwargs)) + '|' + version()
+        cached = self.backend.get(key)
+        if cached is not None:
+          body, mimetype, etag = cached
+          if etag and request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+          else:
+            response = current_app.response_class(body, mimetype=mimetype)
+          if etag:
+            response.set_etag(etag)
+          return response
+
+        response = current_app.make_response(view(**kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+          etag = response.get_etag()[0]
+          self.backend.set(key, response.get_data(), response.mimetype, etag, self.ttl)
+        return response
+      return wrapper
+    return decorator
+
+# Builds the response cache backend selected by the app config. RESPONSE_CACHE
+# is None (no caching), 'memory' or the path of a SQLite file.
+def make_response_cache(config):
+  if not config['RESPONSE_CACHE']:
+    backend = None
+  elif config['RESPONSE_CACHE'] == 'memory':
+    backend = MemoryCacheBackend(max_entries=config['RESPONSE_CACHE_SIZE'])
+  else:
+    backend = SQLiteCacheBackend(config['RESPONSE_CACHE'], max_entries=config['RESPONSE_CACHE_SIZE'])
+  return ResponseCache(backend, ttl=config['RESPONSE_CACHE_TTL'])
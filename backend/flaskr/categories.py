@@ -0,0 +1,82 @@
+import hashlib, json, time
+
+from sqlalchemy import event
+
+from models import db, Category
+
+# ----------------------------------------------------------------------
+# Category cache
+# ----------------------------------------------------------------------
+
+'''
+CategoryCache
+    in-process copy of the categories table, indexed by id and by type.
+    Every write to a Category bumps the shared `version` counter, which makes
+    every cache reload on its next use. Like the other in-process indexes it
+    also reloads after `max_age` seconds to pick up changes made by other
+    worker processes.
+'''
+class CategoryCache:
+
+  version = 0
+
+  @classmethod
+  def invalidate(cls):
+    cls.version += 1
+
+  def __init__(self, max_age=300):
+    self.max_age = max_age
+    self.loaded_version = None
+    self.loaded_at = None
+    self.by_id = {}
+    self.by_type = {}
+    self.etag = None
+
+  def load(self):
+    self.load_rows(db.session.query(Category.id, Category.type).order_by(Category.id).all())
+
+  # Loads the cache from (id, type) rows in ID order.
+  def load_rows(self, rows):
+    rows = [tuple(row) for row in rows]
+    self.loaded_version = CategoryCache.version
+    self.by_id = {category_id: category_type for category_id, category_type in rows}
+    self.by_type = {category_type: category_id for category_id, category_type in rows}
+    self.etag = hashlib.sha1(json.dumps(rows).encode('utf-8')).hexdigest()
+    self.loaded_at = time.monotonic()
+
+  def is_loaded(self):
+    if self.loaded_version != CategoryCache.version:
+      return False
+    if self.max_age is not None and time.monotonic() - self.loaded_at > self.max_age:
+      return False
+    return True
+
+  def current(self):
+    if not self.is_loaded():
+      self.load()
+    return self
+
+  # Returns the {id: type} map of every category.
+  def all(self):
+    return self.current().by_id
+
+  def get(self, category_id):
+    return self.current().by_id.get(int(category_id))
+
+  # Finds a category by ID (integer or numeric string) or by type. Returns
+  # the category ID, or None when there is no such category or the value is
+  # neither.
+  def find(self, category):
+    if isinstance(category, bool) or not isinstance(category, (int, str)):
+      return None
+    self.current()
+    if isinstance(category, int) or category.isdecimal():
+      if int(category) in self.by_id:
+        return int(category)
+    return self.by_type.get(category)
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def invalidate_category_cache(mapper, connection, target):
+  CategoryCache.invalidate()
@@ -0,0 +1,271 @@
+import functools, hashlib, re, unicodedata, zlib
+from array import array
+from bisect import bisect_left
+
+from werkzeug.exceptions import Conflict
+
+from models import Question
+from .answers import numbers_as_digits
+from .indexes import ReloadableIndex
+
+# ----------------------------------------------------------------------
+# Duplicate questions
+# ----------------------------------------------------------------------
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Words left out of the normalized text, so rewordings such as "What is" and
+# "What's" compare equal. Question words are kept: "Who is Batman?" and "What
+# is Batman?" are different questions.
+STOPWORDS = frozenset('''
+  a an and are as at be by can did do does for from had has have in is it its
+  of on or s that the their there this to was were will with
+'''.split())
+
+# MinHash signatures have SIGNATURE_SIZE values, split into LSH_BANDS bands
+# of LSH_ROWS values. Two questions become candidates when every value of one
+# band is equal, which is likely above a similarity of about
+# (1 / LSH_BANDS) ** (1 / LSH_ROWS), 0.6.
+SIGNATURE_SIZE = 32
+LSH_BANDS = 8
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+
+
+# Slots take the low 32 bits of a band value, below the band key.
+SLOT_MASK = 0xffffffff
+
+
+# Returns the words of a question, lowercased and without accents,
+# punctuation or stopwords, with numbers as digits. A question made only of
+# stopwords keeps them.
+def normalize(text):
+  text = text or ''
+  if not text.isascii():
+    text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+  words = numbers_as_digits(WORD_PATTERN.findall(text.lower()))
+  return [word for word in words if word not in STOPWORDS] or words
+
+# Returns the words and word pairs of the normalized question.
+def shingles(words):
+  shingles = set(words)
+  shingles.update(first + ' ' + second for first, second in zip(words, words[1:]))
+  return shingles
+
+# Returns SIGNATURE_SIZE independent 32-bit hashes of a shingle, as bytes.
+# Words and common pairs recur across questions, so they are kept.
+@functools.lru_cache(maxsize=65536)
+def shingle_hashes(shingle):
+  return hashlib.shake_128(shingle.encode('utf-8')).digest(4 * SIGNATURE_SIZE)
+
+# Returns the MinHash signature of a set of shingles: for each of the
+# SIGNATURE_SIZE hash functions, the smallest hash of a shingle.
+def signature(shingles):
+  hashes = array('I', b''.join([shingle_hashes(shingle) for shingle in shingles]) or bytes(4 * SIGNATURE_SIZE))
+  return array('I', [min(hashes[position::SIGNATURE_SIZE]) for position in range(SIGNATURE_SIZE)])
+
+# Returns a 32-bit key of the numbers of a question, in order. Questions
+# whose numbers differ ask different things ("atomic number 6" and "atomic
+# number 8"), however similar their words, so only questions with the same
+# key are compared. A question without numbers has the key 0.
+def numbers_key(words):
+  return zlib.crc32(' '.join(word for word in words if word.isdecimal()).encode('ascii'))
+
+# Returns the 32-bit key of each band of a signature.
+def band_keys(signature):
+  return [zlib.crc32(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+# Estimates the Jaccard similarity of the shingles of two questions from the
+# share of equal values of their signatures.
+def similarity(first, second):
+  return sum(1 for a, b in zip(first, second) if a == b) / SIGNATURE_SIZE
+
+'''
+DedupIndex
+    finds questions that duplicate another one: their numbers are the same
+    and their words and word pairs are estimated at least `threshold`
+    similar from MinHash signatures, questions equal once normalized having
+    a similarity of 1. Candidates come from locality-sensitive hashing on
+    bands of the signatures, so a check compares a handful of questions
+    rather than all of them, and the clusters of the whole table are found
+    without comparing every pair. Like the other in-process indexes it is
+    reloaded after `max_age` seconds, by the IndexRefresher when the app
+    runs one.
+
+    Each question takes a slot of flat arrays holding its id, signature and
+    numbers key, and each band is a sorted array of (band key << 32 | slot)
+    searched with bisect, about 300 bytes a question. Questions added since
+    the index was built are kept in small per-band dicts until the next
+    reload, and removed questions leave their slot behind, unused.
+'''
+class DedupIndex(ReloadableIndex):
+
+  def __init__(self, threshold=0.7, max_age=300):
+    self.threshold = threshold
+    super().__init__(max_age)
+
+  def clear(self):
+    self.slots = {}
+    self.ids = array('q')
+    self.signatures = array('I')
+    self.numbers = array('I')
+    self.bands = [array('Q') for _ in range(LSH_BANDS)]
+    self.recent = [{} for _ in range(LSH_BANDS)]
+    self.cached_clusters = None
+
+  def load(self):
+    self.load_rows(Question.visible(Question.id, Question.question).yield_per(10000))
+
+  # Builds the bands unsorted and sorts each one once, rather than inserting
+  # every question in order.
+  def build(self, rows):
+    index = object.__new__(type(self))
+    index.clear()
+    for question_id, question in rows:
+      slot, band_keys = index.add_slot(question_id, question)
+      for band, band_key in enumerate(band_keys):
+        index.bands[band].append(band_key << 32 | slot)
+    index.bands = [array('Q', sorted(values)) for values in index.bands]
+    return vars(index)
+
+  def add(self, question_id, question):
+    self.change('add', question_id, question)
+
+  def remove(self, question_id):
+    self.change('remove', question_id)
+
+  # Stores a question in a new slot. Returns the slot and the keys of the
+  # bands of its signature.
+  def add_slot(self, question_id, question):
+    if question_id in self.slots:
+      self._remove(question_id)
+    words = normalize(question)
+    question_signature = signature(shingles(words))
+    slot = len(self.ids)
+    self.slots[question_id] = slot
+    self.ids.append(question_id)
+    self.signatures.extend(question_signature)
+    self.numbers.append(numbers_key(words))
+    self.cached_clusters = None
+    return slot, band_keys(question_signature)
+
+  def _add(self, question_id, question):
+    slot, band_keys = self.add_slot(question_id, question)
+    for band, band_key in enumerate(band_keys):
+      self.recent[band].setdefault(band_key, []).append(slot)
+
+  def _remove(self, question_id):
+    slot = self.slots.pop(question_id, None)
+    if slot is None:
+      return
+    for band, band_key in enumerate(band_keys(self.signature(slot))):
+      recent = self.recent[band].get(band_key)
+      if recent and slot in recent:
+        recent.remove(slot)
+        if not recent:
+          del self.recent[band][band_key]
+    self.cached_clusters = None
+
+  def signature(self, slot):
+    return self.signatures[slot * SIGNATURE_SIZE:(slot + 1) * SIGNATURE_SIZE]
+
+  # Tells whether the slot still holds its question.
+  def is_live(self, slot):
+    return self.slots.get(self.ids[slot]) == slot
+
+  # Returns the slots of the live questions with the key in the band.
+  def band_slots(self, band, band_key):
+    values = self.bands[band]
+    start = bisect_left(values, band_key << 32)
+    end = bisect_left(values, (band_key + 1) << 32, start)
+    slots = [value & SLOT_MASK for value in values[start:end]]
+    slots.extend(self.recent[band].get(band_key, ()))
+    return [slot for slot in slots if self.is_live(slot)]
+
+  # Returns the candidates sharing a band and the numbers with the question,
+  # and their similarity to it.
+  def candidates(self, question_signature, numbers):
+    found = {}
+    for band, band_key in enumerate(band_keys(question_signature)):
+      for slot in self.band_slots(band, band_key):
+        question_id = self.ids[slot]
+        if question_id not in found and self.numbers[slot] == numbers:
+          found[question_id] = similarity(question_signature, self.signature(slot))
+    return found
+
+  # Returns [(question_id, similarity)] of the indexed questions duplicating
+  # the text, most similar first. Exact duplicates (after normalization) have
+  # a similarity of 1.
+  def matches(self, question):
+    self.current()
+    words = normalize(question)
+    question_signature, numbers = signature(shingles(words)), numbers_key(words)
+    with self.lock:
+      found = self.candidates(question_signature, numbers)
+    matches = [(question_id, score) for question_id, score in found.items() if score >= self.threshold]
+    return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+  # Returns the groups of duplicate questions, as lists of ids, largest
+  # first. Only the questions sharing a band are compared, and matching
+  # pairs are merged with union-find, so the work grows with the number of
+  # candidate pairs rather than with every pair of questions. The result is
+  # kept until the index changes.
+  def clusters(self):
+    self.current()
+    with self.lock:
+      if self.cached_clusters is None:
+        self.cached_clusters = self.find_clusters()
+      return self.cached_clusters
+
+  # Yields the lists of slots sharing a key in a band, for the keys shared by
+  # several slots.
+  def band_groups(self, band):
+    recent, values = self.recent[band], self.bands[band]
+    keys = [value >> 32 for value in values]
+    shared = {keys[position] for position in range(1, len(keys)) if keys[position] == keys[position - 1]}
+    shared.update(recent)
+    for band_key in shared:
+      start = bisect_left(values, band_key << 32)
+      end = bisect_left(values, (band_key + 1) << 32, start)
+      slots = [value & SLOT_MASK for value in values[start:end]] + recent.get(band_key, [])
+      if len(slots) > 1:
+        yield slots
+
+  def find_clusters(self):
+    parents = {}
+
+    def find(question_id):
+      root = question_id
+      while parents.get(root, root) != root:
+        root = parents[root]
+      while question_id != root:
+        parents[question_id], question_id = root, parents[question_id]
+      return root
+
+    def merge(first, second):
+      first, second = find(first), find(second)
+      if first != second:
+        parents.setdefault(first, first)
+        parents.setdefault(second, second)
+        parents[max(first, second)] = min(first, second)
+
+    for band in range(LSH_BANDS):
+      for slots in self.band_groups(band):
+        slots = [slot for slot in slots if self.is_live(slot)]
+        for position, slot in enumerate(slots):
+          question_id, question_signature = self.ids[slot], self.signature(slot)
+          for other in slots[position + 1:]:
+            other_id = self.ids[other]
+            if self.numbers[slot] == self.numbers[other] and find(question_id) != find(other_id) and similarity(question_signature, self.signature(other)) >= self.threshold:
+              merge(question_id, other_id)
+
+    clusters = {}
+    for question_id in parents:
+      clusters.setdefault(find(question_id), []).append(question_id)
+    return sorted((sorted(ids) for ids in clusters.values()), key=lambda ids: (-len(ids), ids[0]))
+
+# Builds the 409 error raised for a question duplicating the given ones,
+# listed in the response by the error handler.
+def duplicate_of(question_ids):
+  error = Conflict()
+  error.duplicates = question_ids
+  return error
@@ -0,0 +1,193 @@
+import sys, threading, time, traceback
+
+# ----------------------------------------------------------------------
+# In-process indexes
+# ----------------------------------------------------------------------
+
+'''
+ReloadableIndex
+    base of the in-process indexes loaded from the database and kept current
+    by the write endpoints. A reload builds the new contents in an index of
+    its own while requests keep reading the published ones, then publishes
+    them under the lock along with the writes made during the build, so a
+    reader never sees a half-built index. Readers and writers hold the lock
+    while they use the contents. The index is reloaded after `max_age`
+    seconds so that changes made by other worker processes are eventually
+    picked up.
+
+    Subclasses set their empty contents in `clear`, add one row in `_add`
+    and implement each write as a `_<name>` method applied with `change`.
+    Writes are recorded from the start of a build, before its rows are
+    read, and replayed after it, so a write may be in the rows already:
+    writes should be idempotent, and rows should be read as the build
+    iterates them. `generation` counts the writes and resets, so contents
+    computed elsewhere can be published only if nothing changed since.
+'''
+class ReloadableIndex:
+
+  def __init__(self, max_age=300):
+    self.max_age = max_age
+    self.loaded_at = None
+    self.generation = 0
+    self.lock = threading.RLock()
+    # Held while building, so one build runs at a time and the requests that
+    # need a loaded index wait for it rather than build their own.
+    self.loading = threading.RLock()
+    self.changes = None
+    self.clear()
+
+  def clear(self):
+    raise NotImplementedError
+
+  def load(self):
+    raise NotImplementedError
+
+  # Returns the contents of an index holding the rows, built in a new index
+  # nothing reads from.
+  def build(self, rows):
+    index = object.__new__(type(self))
+    index.clear()
+    for row in rows:
+      index._add(*row)
+    return vars(index)
+
+  # Loads the index from rows, replacing its contents at once.
+  def load_rows(self, rows):
+    with self.loading:
+      self.start_build()
+      try:
+        contents = self.build(rows)
+      except BaseException:
+        self.cancel_build()
+        raise
+      self.publish(contents)
+
+  # A load in steps, for callers that read the rows and build the contents
+  # elsewhere: start recording the writes before the rows are read, then
+  # publish the built contents with the writes recorded, or cancel.
+  def start_build(self):
+    with self.lock:
+      self.changes = []
+
+  def cancel_build(self):
+    with self.lock:
+      self.changes = None
+
+  def publish(self, contents):
+    with self.lock:
+      self.__dict__.update(contents)
+      for name, args in self.changes:
+        getattr(self, '_' + name)(*args)
+      self.changes = None
+      self.loaded_at = time.monotonic()
+
+  def reset(self):
+    with self.lock:
+      self.generation += 1
+      self.loaded_at = None
+
+  def is_loaded(self):
+    if self.loaded_at is None:
+      return False
+    if self.max_age is not None and time.monotonic() - self.loaded_at > self.max_age:
+      return False
+    return True
+
+  def current(self):
+    if not self.is_loaded():
+      with self.loading:
+        if not self.is_loaded():
+          self.load()
+    return self
+
+  # Applies a write, `_<name>(*args)`, to the published contents, and records
+  # it for the build in progress. Nothing is applied before the index is
+  # first loaded; the load will read the written row.
+  def change(self, name, *args):
+    with self.lock:
+      self.generation += 1
+      if self.changes is not None:
+        self.changes.append((name, args))
+      if self.loaded_at is not None:
+        getattr(self, '_' + name)(*args)
+
+# Tells whether a refresh checking every `interval` seconds should reload the
+# index now, before it expires. An index that was never loaded, or was reset,
+# is left to the first request that needs it.
+def reload_due(index, interval):
+  loaded_at = index.loaded_at
+  if loaded_at is None or index.max_age is None:
+    return False
+  return time.monotonic() - loaded_at >= index.max_age - interval
+
+'''
+IndexRefresher
+    daemon thread loading the in-process indexes of an app in the background:
+    the `preload` ones when the app starts, those asked for with `request`,
+    and every loaded index again before it expires, so requests keep reading
+    the published contents instead of waiting for a reload. It wakes up every
+    `interval` seconds and reloads the indexes that would expire before it
+    next wakes up.
+'''
+class IndexRefresher:
+
+  def __init__(self, app, interval=30):
+    self.app = app
+    self.interval = interval
+    self.indexes = []
+    self.preloaded = []
+    self.requested = set()
+    self.lock = threading.Lock()
+    self.wakeup = threading.Event()
+    self.stopped = threading.Event()
+    self.thread = None
+
+  def register(self, index, preload=False):
+    self.indexes.append(index)
+    if preload:
+      self.preloaded.append(index)
+
+  def start(self):
+    self.thread = threading.Thread(target=self.run, name='index-refresher', daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    self.stopped.set()
+    self.wakeup.set()
+    if self.thread is not None:
+      self.thread.join()
+
+  # Asks for the index to be reloaded now, after writes it can't follow. It
+  # keeps serving its current contents meanwhile.
+  def request(self, index):
+    with self.lock:
+      self.requested.add(index)
+    self.wakeup.set()
+
+  def run(self):
+    for index in self.preloaded:
+      if index.loaded_at is None:
+        self.reload(index)
+    while not self.stopped.is_set():
+      self.wakeup.wait(self.interval)
+      self.wakeup.clear()
+      with self.lock:
+        requested, self.requested = self.requested, set()
+      for index in self.indexes:
+        if self.stopped.is_set():
+          return
+        if index in requested or self.due(index):
+          self.reload(index)
+
+  def due(self, index):
+    return reload_due(index, self.interval)
+
+  def reload(self, index):
+    try:
+      with self.app.app_context():
+        index.load()
+    except Exception:
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
@@ -0,0 +1,172 @@
+import functools, json, multiprocessing, sys, threading, time, traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from models import db, Job
+
+# ----------------------------------------------------------------------
+# Background jobs
+# ----------------------------------------------------------------------
+
+# Seconds between two writes of the progress of a running job.
+PROGRESS_INTERVAL = 0.5
+
+# App of a worker process, built once by init_worker.
+worker_app = None
+
+def init_worker(config):
+  global worker_app
+  from . import create_app
+  worker_app = create_app(config)
+
+# Runs a job in a worker process. Returns its result, or None when it failed.
+def run_job(job_id):
+  with worker_app.app_context():
+    return worker_app.extensions['jobs'].execute(job_id)
+
+'''
+JobProgress
+    units of work done by a running job, out of `total` when it is known.
+    Counted in memory and written to the job row at most every `interval`
+    seconds, so a job can report every row it reads.
+'''
+class JobProgress:
+
+  def __init__(self, job, interval=PROGRESS_INTERVAL):
+    self.job = job
+    self.interval = interval
+    self.done = 0
+    self.total = None
+    self.written_at = time.monotonic()
+
+  def update(self, done, total=None):
+    self.done = done
+    if total is not None:
+      self.total = total
+      self.write()
+    elif time.monotonic() - self.written_at >= self.interval:
+      self.write()
+
+  def write(self):
+    self.job.progress, self.job.total = self.done, self.total
+    db.session.commit()
+    self.written_at = time.monotonic()
+
+  # Yields the items, counting each one done.
+  def track(self, items, total=None):
+    if total is not None:
+      self.update(0, total)
+    for done, item in enumerate(items, start=1):
+      yield item
+      self.update(done)
+
+'''
+JobRunner
+    runs the jobs of an app in a pool of `workers` processes on the same
+    machine, with the jobs table as the only shared state. Each worker
+    builds its own app from `worker_config` and runs the job function
+    registered for the kind, which writes its progress and result to the
+    job row. `on_finish` callbacks, called with the result and the params of
+    the job, then apply the result in the process that submitted it. With no workers, jobs run in the submitting request.
+'''
+class JobRunner:
+
+  def __init__(self, app, workers=2, worker_config=None):
+    self.app = app
+    self.workers = workers
+    self.worker_config = worker_config or {}
+    self.kinds = {}
+    self.callbacks = {}
+    self.executor = None
+    self.lock = threading.Lock()
+
+  # Registers the function of a kind of job, called with the job params and
+  # its JobProgress. It returns the result of the job as a JSON object.
+  def register(self, kind, on_finish=None):
+    def decorator(function):
+      self.kinds[kind] = function
+      if on_finish:
+        self.callbacks[kind] = on_finish
+      return function
+    return decorator
+
+  # Workers are started with spawn, so they don't inherit the threads, locks
+  # and database connections of the server process.
+  def pool(self):
+    with self.lock:
+      if self.executor is None:
+        self.executor = ProcessPoolExecutor(
+          self.workers,
+          mp_context=multiprocessing.get_context('spawn'),
+          initializer=init_worker,
+          initargs=(self.worker_config,)
+        )
+      return self.executor
+
+  # Saves a queued job and hands it to a worker. Returns the job.
+  def submit(self, kind, params=None):
+    job = Job(kind, params)
+    db.session.add(job)
+    db.session.commit()
+    if not self.workers:
+      self.finish(kind, params, self.execute(job.id))
+      return job
+    future = self.pool().submit(run_job, job.id)
+    future.add_done_callback(functools.partial(self.done, job.id, kind, params))
+    return job
+
+  def execute(self, job_id):
+    job = Job.query.get(job_id)
+    job.status, job.started_at = 'running', datetime.utcnow()
+    db.session.commit()
+    progress = JobProgress(job)
+    try:
+      result = self.kinds[job.kind](json.loads(job.params), progress)
+      job.status, job.result = 'succeeded', json.dumps(result)
+      job.progress = progress.total if progress.total is not None else progress.done
+      job.total = progress.total
+
+    except Exception as exception:
+      db.session.rollback()
+      exc_type, exc_value, exc_traceback = sys.exc_info()
+
+      print("*** print_exception:")
+      traceback.print_exception(exc_type, exc_value, exc_traceback, limit = 2, file = sys.stdout)
+      job.status, job.error = 'failed', str(exception) or exc_type.__name__
+      result = None
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return result
+
+  def finish(self, kind, params, result):
+    if result is not None and kind in self.callbacks:
+      self.callbacks[kind](result, params or {})
+
+  # Called in the submitting process when a worker is done with a job. A
+  # worker that died leaves the pool broken, so the next job starts a new one.
+  def done(self, job_id, kind, params, future):
+    try:
+      result = future.result()
+    except Exception as exception:
+      with self.lock:
+        if self.executor is not None:
+          self.executor.shutdown(wait=False)
+          self.executor = None
+      with self.app.app_context():
+        self.fail(job_id, str(exception) or type(exception).__name__)
+      return
+    with self.app.app_context():
+      self.finish(kind, params, result)
+
+  def fail(self, job_id, error):
+    job = Job.query.get(job_id)
+    if job is not None and job.status in ['queued', 'running']:
+      job.status, job.error, job.finished_at = 'failed', error, datetime.utcnow()
+      db.session.commit()
+
+  def shutdown(self, wait=True):
+    with self.lock:
+      if self.executor is not None:
+        self.executor.shutdown(wait=wait)
+        self.executor = None
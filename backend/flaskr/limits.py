@@ -0,0 +1,222 @@
+import functools, math, sqlite3, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import request
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+
+from models import db
+
+# ----------------------------------------------------------------------
+# Rate limits and admission control
+# ----------------------------------------------------------------------
+
+'''
+MemoryBucketStore
+    token buckets kept in process, by key. Each bucket holds up to `burst`
+    tokens and refills at `rate` tokens per second; a request takes one.
+    Once `max_buckets` is reached the least recently used bucket is dropped,
+    which only forgets a client that has been quiet the longest.
+'''
+class MemoryBucketStore:
+
+  def __init__(self, max_buckets=100000, clock=time.monotonic):
+    self.max_buckets = max_buckets
+    self.clock = clock
+    self.buckets = OrderedDict()
+    self.lock = threading.Lock()
+
+  # Takes a token from the bucket. Returns 0 when one was taken, otherwise
+  # the seconds until the next token.
+  def take(self, key, rate, burst):
+    with self.lock:
+      now = self.clock()
+      tokens, updated_at = self.buckets.get(key, (burst, now))
+      tokens, wait = refill(tokens, updated_at, now, rate, burst)
+      self.buckets[key] = (tokens, now)
+      self.buckets.move_to_end(key)
+      while len(self.buckets) > self.max_buckets:
+        self.buckets.popitem(last=False)
+      return wait
+
+'''
+SQLiteBucketStore
+    token buckets in a local SQLite file, shared by every worker process on
+    the machine. Each take is one write transaction, so concurrent workers
+    never hand out the same token. Buckets unused for `max_idle` seconds are
+    deleted now and then.
+'''
+class SQLiteBucketStore:
+
+  def __init__(self, path, max_idle=3600, clock=time.time):
+    self.path = path
+    self.max_idle = max_idle
+    self.clock = clock
+    self.takes = 0
+    with self.connect() as connection:
+      connection.execute('CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)')
+      connection.execute('CREATE INDEX IF NOT EXISTS rate_buckets_updated_at ON rate_buckets (updated_at)')
+
+  @contextmanager
+  def connect(self):
+    connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+    try:
+      yield connection
+    finally:
+      connection.close()
+
+  def take(self, key, rate, burst):
+    with self.connect() as connection:
+      connection.execute('BEGIN IMMEDIATE')
+      try:
+        now = self.clock()
+        row = connection.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+        tokens, wait = refill(*(row or (burst, now)), now, rate, burst)
+        connection.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)', (key, tokens, now))
+        self.takes += 1
+        if self.takes % 1000 == 0:
+          connection.execute('DELETE FROM rate_buckets WHERE updated_at < ?', (now - self.max_idle,))
+        connection.execute('COMMIT')
+      except:
+        connection.execute('ROLLBACK')
+        raise
+    return wait
+
+# Refills a bucket for the time since it was updated and takes a token.
+# Returns the tokens left and 0, or the tokens and the seconds to wait when
+# there isn't a whole token.
+def refill(tokens, updated_at, now, rate, burst):
+  tokens = min(burst, tokens + max(0, now - updated_at) * rate)
+  if tokens >= 1:
+    return tokens - 1, 0
+  return tokens, (1 - tokens) / rate
+
+'''
+RateLimiter
+    applies the rate limit policies of the route groups. RATE_LIMITS maps a
+    group to its policies: {'client': (rate, burst)} limits each client and
+    {'route': (rate, burst)} every client together, in requests per second.
+'''
+class RateLimiter:
+
+  def __init__(self, store, policies):
+    self.store = store
+    self.policies = policies
+
+  # Returns 0 when the request is admitted, otherwise the seconds after
+  # which the client may try again.
+  def check(self, group, client):
+    waits = []
+    for scope, (rate, burst) in sorted(self.policies.get(group, {}).items()):
+      key = '%s:%s' % (group, client) if scope == 'client' else group
+      waits.append(self.store.take(key, rate, burst))
+    return max(waits, default=0)
+
+'''
+AdmissionControl
+    sheds requests to the limited routes once `max_in_flight` of them are
+    running, or when every connection of a database pool is checked out,
+    rather than letting them queue for a connection until they time out.
+'''
+class AdmissionControl:
+
+  def __init__(self, max_in_flight=None, pool_limit=None):
+    self.max_in_flight = max_in_flight
+    self.pool_limit = pool_limit
+    self.in_flight = 0
+    self.lock = threading.Lock()
+
+  def saturated(self, pools):
+    if self.pool_limit is None:
+      return False
+    return any(pool.checkedout() >= self.pool_limit for pool in pools.values() if hasattr(pool, 'checkedout'))
+
+  # Counts the request in and returns True, or returns False when it should
+  # be shed. Every admitted request must call leave.
+  def enter(self, pools={}):
+    with self.lock:
+      if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+        return False
+      if self.saturated(pools):
+        return False
+      self.in_flight += 1
+      return True
+
+  def leave(self):
+    with self.lock:
+      self.in_flight -= 1
+
+'''
+RequestLimits
+    the rate limiter and admission control of an app. `limited` decorates
+    the views of a route group; it returns them unchanged when neither is
+    configured.
+'''
+class RequestLimits:
+
+  def __init__(self, limiter=None, admission=None, retry_after=1, client_header=None):
+    self.limiter = limiter
+    self.admission = admission
+    self.retry_after = retry_after
+    self.client_header = client_header
+
+  def limited(self, group):
+    def decorator(view):
+      if self.limiter is None and self.admission is None:
+        return view
+
+      @functools.wraps(view)
+      def wrapper(*args, **kwargs):
+        if self.limiter:
+          wait = self.limiter.check(group, client_address(request.remote_addr, request.headers, self.client_header))
+          if wait:
+            raise retry_later(TooManyRequests(), wait)
+        if self.admission is None:
+          return view(*args, **kwargs)
+        if not self.admission.enter(db.pools()):
+          raise retry_later(ServiceUnavailable(), self.retry_after)
+        try:
+          return view(*args, **kwargs)
+        finally:
+          self.admission.leave()
+      return wrapper
+    return decorator
+
+# Identifies the client by its address, or by the first address of
+# `client_header` (e.g. X-Forwarded-For) when the app runs behind a trusted
+# proxy.
+def client_address(remote_addr, headers, client_header=None):
+  if client_header and headers.get(client_header):
+    return headers[client_header].split(',')[0].strip()
+  return remote_addr
+
+# Sets the seconds the client should wait on a 429 or 503 error, sent in the
+# Retry-After header by the error handlers.
+def retry_later(error, seconds):
+  error.retry_after = max(1, int(math.ceil(seconds)))
+  return error
+
+def retry_after_headers(error):
+  retry_after = getattr(error, 'retry_after', None)
+  return {'Retry-After': str(retry_after)} if retry_after else {}
+
+# Builds the rate limiter selected by the app config. RATE_LIMIT_STORE is None
+# (no rate limits), 'memory' or the path of a SQLite file.
+def make_rate_limiter(config):
+  if not config['RATE_LIMIT_STORE']:
+    return None
+  if config['RATE_LIMIT_STORE'] == 'memory':
+    return RateLimiter(MemoryBucketStore(), config['RATE_LIMITS'])
+  return RateLimiter(SQLiteBucketStore(config['RATE_LIMIT_STORE']), config['RATE_LIMITS'])
+
+# Builds the limits of an app. MAX_CONCURRENT_REQUESTS caps the requests
+# running on the limited routes; the pools are also checked for saturation
+# whenever rate limits or the cap are enabled.
+def make_request_limits(config):
+  limiter, admission = make_rate_limiter(config), None
+  if limiter or config['MAX_CONCURRENT_REQUESTS'] is not None:
+    pool_limit = None
+    if config['DATABASE_MAX_OVERFLOW'] >= 0:
+      pool_limit = config['DATABASE_POOL_SIZE'] + config['DATABASE_MAX_OVERFLOW']
+    admission = AdmissionControl(config['MAX_CONCURRENT_REQUESTS'], pool_limit)
+  return RequestLimits(limiter, admission, config['ADMISSION_RETRY_AFTER'], config['RATE_LIMIT_CLIENT_HEADER'])
@@ -0,0 +1,156 @@
+import threading, time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------
+# Request metrics
+# ----------------------------------------------------------------------
+
+# Upper bounds, in seconds, of the request duration histogram buckets.
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+'''
+RouteMetrics
+    totals for one route and method: requests, SQL queries, time spent in
+    the database, serializing JSON and in total, plus a histogram of the
+    request durations.
+'''
+class RouteMetrics:
+
+  def __init__(self):
+    self.requests = 0
+    self.queries = 0
+    self.db_seconds = 0.0
+    self.serialize_seconds = 0.0
+    self.seconds = 0.0
+    self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+  def record(self, queries, db_seconds, serialize_seconds, seconds):
+    self.requests += 1
+    self.queries += queries
+    self.db_seconds += db_seconds
+    self.serialize_seconds += serialize_seconds
+    self.seconds += seconds
+    self.buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+
+'''
+Metrics
+    collects RouteMetrics for an app. Only apps created with METRICS_ENABLED
+    register the request hooks, the serializer timer and the SQLAlchemy
+    listeners, so a disabled app pays nothing.
+'''
+class Metrics:
+
+  def __init__(self):
+    self.routes = {}
+    self.lock = threading.Lock()
+    self.server_timing = False
+
+  def init_app(self, app):
+    self.server_timing = app.config['METRICS_SERVER_TIMING']
+    listen_to_engines()
+    app.extensions['serializer'].timer = serialized
+    app.before_request(self.start)
+    app.after_request(self.finish)
+
+  def start(self):
+    g.metrics = {'started': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'serialize_seconds': 0.0}
+
+  def finish(self, response):
+    metrics = g.pop('metrics', None)
+    if metrics is None:
+      return response
+    seconds = time.perf_counter() - metrics['started']
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    with self.lock:
+      route_metrics = self.routes.setdefault((route, request.method), RouteMetrics())
+      route_metrics.record(metrics['queries'], metrics['db_seconds'], metrics['serialize_seconds'], seconds)
+
+    if self.server_timing:
+      response.headers['Server-Timing'] = ', '.join([
+        'db;dur=%.3f;desc="%d queries"' % (metrics['db_seconds'] * 1000, metrics['queries']),
+        'serialize;dur=%.3f' % (metrics['serialize_seconds'] * 1000),
+        'total;dur=%.3f' % (seconds * 1000)
+      ])
+    return response
+
+  # Renders the metrics in the Prometheus text exposition format, followed by
+  # the usage of the given {name: pool} connection pools.
+  def render(self, pools={}):
+    with self.lock:
+      routes = sorted(self.routes.items())
+      lines = []
+      for name, kind, description, value in [
+        ('trivia_requests_total', 'counter', 'Requests handled.', lambda metrics: metrics.requests),
+        ('trivia_db_queries_total', 'counter', 'SQL queries run by requests.', lambda metrics: metrics.queries),
+        ('trivia_db_seconds_total', 'counter', 'Time requests spent running SQL queries.', lambda metrics: metrics.db_seconds),
+        ('trivia_serialize_seconds_total', 'counter', 'Time requests spent serializing JSON.', lambda metrics: metrics.serialize_seconds)
+      ]:
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for (route, method), metrics in routes:
+          lines.append('%s{%s} %s' % (name, labels(route, method), format_value(value(metrics))))
+
+      name = 'trivia_request_duration_seconds'
+      lines.append('# HELP %s Time taken to handle requests.' % name)
+      lines.append('# TYPE %s histogram' % name)
+      for (route, method), metrics in routes:
+        count = 0
+        for bound, bucket in zip(DURATION_BUCKETS + ['+Inf'], metrics.buckets):
+          count += bucket
+          lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels(route, method), bound, count))
+        lines.append('%s_sum{%s} %s' % (name, labels(route, method), format_value(metrics.seconds)))
+        lines.append('%s_count{%s} %d' % (name, labels(route, method), metrics.requests))
+
+    # Only queue pools keep connections open and report their usage.
+    pools = sorted((database, pool) for database, pool in pools.items() if hasattr(pool, 'checkedout'))
+    for name, description, value in [
+      ('trivia_db_pool_size', 'Connections the pool keeps open.', lambda pool: pool.size()),
+      ('trivia_db_pool_checked_out', 'Connections in use.', lambda pool: pool.checkedout()),
+      ('trivia_db_pool_checked_in', 'Idle connections in the pool.', lambda pool: pool.checkedin()),
+      ('trivia_db_pool_overflow', 'Connections open beyond the pool size.', lambda pool: max(0, pool.overflow()))
+    ]:
+      lines.append('# HELP %s %s' % (name, description))
+      lines.append('# TYPE %s gauge' % name)
+      for database, pool in pools:
+        lines.append('%s{database="%s"} %d' % (name, database, value(pool)))
+    return '\n'.join(lines) + '\n'
+
+def labels(route, method):
+  return 'route="%s",method="%s"' % (route.replace('\\', '\\\\').replace('"', '\\"'), method)
+
+def format_value(value):
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Serializer timer adding the time spent encoding responses to the request
+# metrics.
+def serialized(seconds):
+  if has_request_context() and 'metrics' in g:
+    g.metrics['serialize_seconds'] += seconds
+
+# The SQLAlchemy listeners are registered once, for every engine, and only
+# count queries run during a request of an app with metrics enabled.
+_listening = False
+
+def listen_to_engines():
+  global _listening
+  if _listening:
+    return
+  _listening = True
+  event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+  event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  started = conn.info.get('metrics_query_started')
+  if not started:
+    return
+  started = started.pop()
+  if has_request_context() and 'metrics' in g:
+    g.metrics['queries'] += 1
+    g.metrics['db_seconds'] += time.perf_counter() - started
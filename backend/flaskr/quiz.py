@@ -0,0 +1,225 @@
+import random
+
+from models import Question
+from .indexes import ReloadableIndex
+
+# ----------------------------------------------------------------------
+# Quiz question sampling
+# ----------------------------------------------------------------------
+
+# Category id used by the quiz to mean "all categories".
+ALL_CATEGORIES = 0
+
+# Range of question difficulties, and the level adaptive quizzes start at.
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+DEFAULT_DIFFICULTY = 3
+
+'''
+IdBucket
+    a set of question ids with O(1) add, remove and uniform random choice.
+    Ids are kept in a list and their positions in a dict, so removal swaps
+    the last id into the freed slot.
+'''
+class IdBucket:
+
+  def __init__(self):
+    self.ids = []
+    self.positions = {}
+
+  def __len__(self):
+    return len(self.ids)
+
+  def __contains__(self, question_id):
+    return question_id in self.positions
+
+  def add(self, question_id):
+    if question_id in self.positions:
+      return
+    self.positions[question_id] = len(self.ids)
+    self.ids.append(question_id)
+
+  def remove(self, question_id):
+    position = self.positions.pop(question_id, None)
+    if position is None:
+      return
+    last_id = self.ids.pop()
+    if position < len(self.ids):
+      self.ids[position] = last_id
+      self.positions[last_id] = position
+
+  def choice(self, rng=random):
+    return self.ids[rng.randrange(len(self.ids))]
+
+'''
+QuizIndex
+    in-process index of question ids per category and per (category,
+    difficulty), loaded from the database (ids, categories and difficulties
+    only) and kept current by the write endpoints.
+'''
+class QuizIndex(ReloadableIndex):
+
+  def clear(self):
+    self.buckets = {ALL_CATEGORIES: IdBucket()}
+    self.questions = {}
+
+  def load(self):
+    self.load_rows(Question.visible(Question.id, Question.category, Question.difficulty))
+
+  # Returns the bucket of the category, or of one difficulty in the category.
+  def bucket(self, category_id, difficulty=None):
+    self.current()
+    with self.lock:
+      return self._bucket(category_id, difficulty)
+
+  def _bucket(self, category_id, difficulty=None):
+    key = int(category_id) if difficulty is None else (int(category_id), int(difficulty))
+    return self.buckets.get(key, IdBucket())
+
+  # Returns the ids of the category, of one difficulty or of a list of
+  # difficulties.
+  def ids(self, category_id, difficulty=None):
+    self.current()
+    ids = []
+    with self.lock:
+      for bucket in self.difficulty_buckets(category_id, difficulty):
+        ids.extend(bucket.ids)
+    return ids
+
+  def difficulty_buckets(self, category_id, difficulty):
+    if difficulty is None or isinstance(difficulty, int):
+      return [self._bucket(category_id, difficulty)]
+    return [self._bucket(category_id, level) for level in sorted(set(difficulty))]
+
+  def add(self, question_id, category, difficulty=None):
+    self.change('add', question_id, category, difficulty)
+
+  def remove(self, question_id):
+    self.change('remove', question_id)
+
+  def _add(self, question_id, category, difficulty):
+    # A question added again may have moved to another category or
+    # difficulty.
+    if question_id in self.questions:
+      self._remove(question_id)
+    category = int(category) if category is not None else None
+    difficulty = int(difficulty) if difficulty is not None else None
+    keys = [ALL_CATEGORIES]
+    if category is not None:
+      keys.append(category)
+    if difficulty is not None:
+      keys.append((ALL_CATEGORIES, difficulty))
+      if category is not None:
+        keys.append((category, difficulty))
+    for key in keys:
+      self.buckets.setdefault(key, IdBucket()).add(question_id)
+    self.questions[question_id] = (category, difficulty)
+
+  def _remove(self, question_id):
+    category, difficulty = self.questions.pop(question_id, (None, None))
+    for key in [ALL_CATEGORIES, category, (ALL_CATEGORIES, difficulty), (category, difficulty)]:
+      if key in self.buckets:
+        self.buckets[key].remove(question_id)
+
+  # Picks a random question id from the category that is not one of the
+  # previous questions, or None when the category is exhausted. `difficulty`
+  # restricts the pick to one difficulty or a list of difficulties; every
+  # eligible question is equally likely.
+  def pick(self, category_id, previous_questions=(), rng=random, difficulty=None):
+    self.current()
+    with self.lock:
+      return self._pick(category_id, previous_questions, rng, difficulty)
+
+  def _pick(self, category_id, previous_questions, rng, difficulty):
+    buckets = self.difficulty_buckets(category_id, difficulty)
+    previous_questions = set(previous_questions)
+    excluded = [{question_id for question_id in previous_questions if question_id in bucket} for bucket in buckets]
+    remaining = [len(bucket) - len(bucket_excluded) for bucket, bucket_excluded in zip(buckets, excluded)]
+    total = sum(remaining)
+    if total <= 0:
+      return None
+
+    # Draws the bucket in proportion to its eligible questions.
+    index = 0
+    if len(buckets) > 1:
+      draw = rng.randrange(total)
+      while draw >= remaining[index]:
+        draw -= remaining[index]
+        index += 1
+    return pick_from_bucket(buckets[index], excluded[index], remaining[index], rng)
+
+  # Picks `count` distinct random question ids from the category, or from
+  # one difficulty or list of difficulties, that are not previous questions,
+  # in one sampling pass. Returns fewer ids when fewer are left. While most
+  # of the ids stay eligible after the round, random draws are rarely
+  # rejected; otherwise the eligible ids are listed and partially shuffled
+  # (Fisher-Yates for the first `count` positions only).
+  def sample(self, category_id, count, previous_questions=(), rng=random, difficulty=None):
+    self.current()
+    with self.lock:
+      return self._sample(category_id, count, previous_questions, rng, difficulty)
+
+  def _sample(self, category_id, count, previous_questions, rng, difficulty):
+    buckets = self.difficulty_buckets(category_id, difficulty)
+    excluded = {question_id for question_id in previous_questions if any(question_id in bucket for bucket in buckets)}
+    size = sum(len(bucket) for bucket in buckets)
+    remaining = size - len(excluded)
+    count = min(count, remaining)
+    if count <= 0:
+      return []
+
+    if (remaining - count) * 4 >= size:
+      chosen = []
+      while len(chosen) < count:
+        draw = rng.randrange(size)
+        for bucket in buckets:
+          if draw < len(bucket):
+            break
+          draw -= len(bucket)
+        question_id = bucket.ids[draw]
+        if question_id not in excluded:
+          excluded.add(question_id)
+          chosen.append(question_id)
+      return chosen
+
+    eligible = [question_id for bucket in buckets for question_id in bucket.ids if question_id not in excluded]
+    for position in range(count):
+      swap = rng.randrange(position, len(eligible))
+      eligible[position], eligible[swap] = eligible[swap], eligible[position]
+    return eligible[:count]
+
+  # Picks a question for an adaptive quiz: one level harder than
+  # `difficulty` after a correct answer, one level easier after a wrong one,
+  # or at the same level when `correct` is None. When no question is left at
+  # that level the nearest levels are tried. Returns the question id, or
+  # None when the category is exhausted.
+  def pick_adaptive(self, category_id, previous_questions=(), difficulty=DEFAULT_DIFFICULTY, correct=None, rng=random):
+    for level in adaptive_levels(difficulty, correct):
+      question_id = self.pick(category_id, previous_questions, rng, difficulty=level)
+      if question_id is not None:
+        return question_id
+    return None
+
+# Picks a random id of the bucket that is not excluded. While at least a
+# quarter of the bucket is still eligible this is rejection sampling with at
+# most 4 expected draws; otherwise the few remaining ids are listed, which
+# costs no more than reading the previous questions did.
+def pick_from_bucket(bucket, excluded, remaining, rng=random):
+  if remaining * 4 >= len(bucket):
+    while True:
+      question_id = bucket.choice(rng)
+      if question_id not in excluded:
+        return question_id
+
+  eligible = [question_id for question_id in bucket.ids if question_id not in excluded]
+  return rng.choice(eligible)
+
+# Returns the difficulty levels to try for the next adaptive question, the
+# target level first and then the others by distance from it, in the
+# direction of the step first.
+def adaptive_levels(difficulty, correct=None):
+  step = 0 if correct is None else (1 if correct else -1)
+  target = min(MAX_DIFFICULTY, max(MIN_DIFFICULTY, int(difficulty) + step))
+  direction = step or 1
+  return sorted(range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1),
+    key=lambda level: (abs(level - target), (level - target) * direction < 0))
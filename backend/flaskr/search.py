@@ -0,0 +1,154 @@
+import heapq, math, re
+from bisect import bisect_left, insort
+
+from models import Question
+from .indexes import ReloadableIndex
+
+# ----------------------------------------------------------------------
+# Question search
+# ----------------------------------------------------------------------
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text):
+  return TOKEN_PATTERN.findall((text or '').lower())
+
+'''
+FieldIndex
+    inverted index of one text field: for each token, the questions that
+    contain it and how many times. Tokens are also kept in a sorted
+    vocabulary so that a search term can match every token it prefixes.
+'''
+class FieldIndex:
+
+  def __init__(self):
+    self.postings = {}
+    self.vocabulary = []
+    self.documents = {}
+
+  def add(self, question_id, text):
+    for token in self.add_postings(question_id, text):
+      insort(self.vocabulary, token)
+
+  # Adds the question to the postings, replacing any earlier text of it.
+  # Returns the tokens new to the index, which the caller adds to the
+  # vocabulary.
+  def add_postings(self, question_id, text):
+    if question_id in self.documents:
+      self.remove(question_id)
+    tokens = tokenize(text)
+    self.documents[question_id] = set(tokens)
+    new_tokens = []
+    for token in tokens:
+      if token not in self.postings:
+        self.postings[token] = {}
+        new_tokens.append(token)
+      postings = self.postings[token]
+      postings[question_id] = postings.get(question_id, 0) + 1
+    return new_tokens
+
+  def remove(self, question_id):
+    for token in self.documents.pop(question_id, ()):
+      postings = self.postings[token]
+      postings.pop(question_id, None)
+      if not postings:
+        del self.postings[token]
+        del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+  def prefixed(self, prefix):
+    position = bisect_left(self.vocabulary, prefix)
+    while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+      yield self.vocabulary[position]
+      position += 1
+
+  # Returns {question_id: score} for the questions with a token starting with
+  # `term`, or only equal to it when `prefix` is false. Each matching token
+  # adds its count weighted by how rare it is.
+  def scores(self, term, prefix=True):
+    total = len(self.documents) or 1
+    scores = {}
+    tokens = self.prefixed(term) if prefix else [term] if term in self.postings else []
+    for token in tokens:
+      postings = self.postings[token]
+      weight = math.log(1 + total / len(postings))
+      for question_id, count in postings.items():
+        scores[question_id] = scores.get(question_id, 0) + count * weight
+    return scores
+
+'''
+SearchIndex
+    in-process search index over question text and, optionally, answers,
+    loaded from the database and kept current by the write endpoints. Words
+    shorter than `min_prefix` only match whole tokens, so a one or two
+    letter word doesn't walk a large part of the vocabulary.
+'''
+class SearchIndex(ReloadableIndex):
+
+  def __init__(self, max_age=300, min_prefix=3):
+    self.min_prefix = min_prefix
+    super().__init__(max_age)
+
+  def clear(self):
+    self.questions = FieldIndex()
+    self.answers = FieldIndex()
+
+  def load(self):
+    self.load_rows(Question.visible(Question.id, Question.question, Question.answer))
+
+  # Builds the field indexes of (id, question, answer) rows in one pass.
+  def build(self, rows):
+    questions, answers = FieldIndex(), FieldIndex()
+    for question_id, question, answer in rows:
+      questions.add_postings(question_id, question)
+      answers.add_postings(question_id, answer)
+    questions.vocabulary, answers.vocabulary = sorted(questions.postings), sorted(answers.postings)
+    return {'questions': questions, 'answers': answers}
+
+  def add(self, question_id, question, answer):
+    self.change('add', question_id, question, answer)
+
+  def remove(self, question_id):
+    self.change('remove', question_id)
+
+  def _add(self, question_id, question, answer):
+    self.questions.add(question_id, question)
+    self.answers.add(question_id, answer)
+
+  def _remove(self, question_id):
+    self.questions.remove(question_id)
+    self.answers.remove(question_id)
+
+  # Returns the ids of the questions matching every word of the search term,
+  # best match first, and the total number of matches. Words of at least
+  # `min_prefix` letters match as prefixes, so partially typed words find
+  # results. With a `limit` only the
+  # best `limit` ids are ranked. An empty search term matches every question.
+  def search(self, search_term, search_answers=False, limit=None):
+    self.current()
+    with self.lock:
+      return self._search(tokenize(search_term), search_answers, limit)
+
+  def _search(self, terms, search_answers, limit):
+    if not terms:
+      hits = sorted(self.questions.documents)
+      return hits[:limit], len(hits)
+
+    ranked = None
+    for term in set(terms):
+      prefix = len(term) >= self.min_prefix
+      scores = self.questions.scores(term, prefix)
+      if search_answers:
+        for question_id, score in self.answers.scores(term, prefix).items():
+          scores[question_id] = scores.get(question_id, 0) + score
+      if ranked is None:
+        ranked = scores
+      else:
+        ranked = {question_id: ranked[question_id] + score
+          for question_id, score in scores.items() if question_id in ranked}
+      if not ranked:
+        return [], 0
+
+    rank = lambda question_id: (-ranked[question_id], question_id)
+    if limit is None:
+      return sorted(ranked, key=rank), len(ranked)
+    return heapq.nsmallest(limit, ranked, key=rank), len(ranked)
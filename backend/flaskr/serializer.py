@@ -0,0 +1,174 @@
+import gzip, json, time
+from json.encoder import encode_basestring_ascii
+
+from flask import current_app
+from flask.json import JSONEncoder
+from werkzeug.http import parse_accept_header
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import ujson
+except ImportError:
+  ujson = None
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# ----------------------------------------------------------------------
+# JSON serialization and response compression
+# ----------------------------------------------------------------------
+
+# Fallback for the values JSON has no type for (dates, UUIDs...), as Flask's
+# jsonify serializes them.
+default = JSONEncoder().default
+
+'''
+Rows
+    a list of row tuples serialized as an array of JSON objects with the
+    given field names, without building a dict per row.
+'''
+class Rows:
+
+  def __init__(self, rows, fields):
+    self.rows = rows
+    self.fields = tuple(fields)
+
+  def __len__(self):
+    return len(self.rows)
+
+  def __iter__(self):
+    return iter(self.rows)
+
+def stdlib_dumps(value):
+  return json.dumps(value, separators=(',', ':'), default=default).encode('utf-8')
+
+def stdlib_value(value):
+  if type(value) is str:
+    return encode_basestring_ascii(value)
+  if value is None:
+    return 'null'
+  if type(value) is int:
+    return str(value)
+  return json.dumps(value, default=default)
+
+def orjson_dumps(value):
+  return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+def ujson_dumps(value):
+  return ujson.dumps(value, escape_forward_slashes=False).encode('utf-8')
+
+def ujson_value(value):
+  return ujson.dumps(value, escape_forward_slashes=False)
+
+# Backends by name, fastest first: (module, dumps returning bytes, encoder of
+# one row value, whether that encoder returns bytes).
+BACKENDS = {
+  'orjson': (orjson, orjson_dumps, orjson and orjson.dumps, True),
+  'ujson': (ujson, ujson_dumps, ujson_value, False),
+  'json': (json, stdlib_dumps, stdlib_value, False)
+}
+
+'''
+Serializer
+    encodes response payloads to JSON bytes with the fastest installed
+    backend, or the one named by JSON_BACKEND. Rows are written through a
+    %-template per set of fields, so each row costs one formatting
+    operation instead of a dict and a pass of the encoder over it. When a
+    `timer` is set, it is called with the seconds each payload took.
+'''
+class Serializer:
+
+  def __init__(self, backend='auto'):
+    if backend == 'auto':
+      backend = next(name for name, (module, *_) in BACKENDS.items() if module is not None)
+    if backend not in BACKENDS:
+      raise ValueError('unknown JSON backend %r' % backend)
+    module, self.dump, self.value, self.binary = BACKENDS[backend]
+    if module is None:
+      raise RuntimeError('the %s package is not installed' % backend)
+    self.backend = backend
+    self.templates = {}
+    self.timer = None
+
+  def template(self, fields):
+    template = self.templates.get(fields)
+    if template is None:
+      template = '{' + ','.join(json.dumps(field).replace('%', '%%') + ':%s' for field in fields) + '}'
+      if self.binary:
+        template = template.replace('%s', '%b').encode('utf-8')
+      self.templates[fields] = template
+    return template
+
+  # Serializes each row as an object with the given field names and returns
+  # them joined by `separator`.
+  def join_rows(self, rows, fields, separator=','):
+    template, value = self.template(tuple(fields)), self.value
+    objects = [template % tuple(map(value, row)) for row in rows]
+    if self.binary:
+      return separator.encode('utf-8').join(objects)
+    return separator.join(objects).encode('utf-8')
+
+  # Serializes `value`, writing Rows, and the Rows held by a dict, with the
+  # row templates.
+  def dumps(self, value):
+    if self.timer is None:
+      return self.encode(value)
+    started = time.perf_counter()
+    encoded = self.encode(value)
+    self.timer(time.perf_counter() - started)
+    return encoded
+
+  def encode(self, value):
+    if isinstance(value, Rows):
+      return b'[' + self.join_rows(value.rows, value.fields) + b']'
+    if isinstance(value, dict) and any(isinstance(item, Rows) for item in value.values()):
+      return b'{' + b','.join(
+        self.dump(str(key)) + b':' + self.encode(item) for key, item in value.items()
+      ) + b'}'
+    return self.dump(value)
+
+# Serializer of the current app, set up by create_app from JSON_BACKEND.
+def current_serializer():
+  return current_app.extensions['serializer']
+
+# Builds a JSON response like flask.jsonify, with the app's serializer.
+def jsonify(*args, **kwargs):
+  if args and kwargs:
+    raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+  data = args[0] if len(args) == 1 else args or kwargs
+  return current_app.response_class(current_serializer().dumps(data) + b'\n', mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+# Content codings the server can compress with, preferred first.
+ENCODINGS = (['br'] if brotli else []) + ['gzip']
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Returns the best content coding accepted by the Accept-Encoding header, or
+# None to send the body as is.
+def negotiate_encoding(accept_encoding):
+  return parse_accept_header(accept_encoding or '').best_match(ENCODINGS)
+
+def compress(body, encoding):
+  if encoding == 'br':
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+  return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+# Compresses the body of a response of at least `min_size` bytes with the
+# coding negotiated from the request. Streamed responses are sent as they are.
+def compress_response(request, response, min_size):
+  if response.is_streamed or response.direct_passthrough or response.status_code != 200:
+    return response
+  if 'Content-Encoding' in response.headers or (response.content_length or 0) < min_size:
+    return response
+  response.vary.add('Accept-Encoding')
+  encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+  if encoding:
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+  return response
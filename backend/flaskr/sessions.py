@@ -0,0 +1,159 @@
+import random, sqlite3, threading, time, uuid
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# ----------------------------------------------------------------------
+# Quiz sessions
+# ----------------------------------------------------------------------
+
+'''
+QuizSession
+    a quiz in progress. The question ids of the category are shuffled once
+    when the session is created and asked in that order, so the server only
+    has to remember a compact array of ids and a cursor into it.
+'''
+class QuizSession:
+
+  def __init__(self, category, question_ids, session_id=None, cursor=0, expires_at=None):
+    self.id = session_id or uuid.uuid4().hex
+    self.category = category
+    self.question_ids = array('l', question_ids)
+    self.cursor = cursor
+    self.expires_at = expires_at
+
+  @classmethod
+  def shuffled(cls, category, question_ids, rng=random):
+    question_ids = list(question_ids)
+    rng.shuffle(question_ids)
+    return cls(category, question_ids)
+
+  # Returns the next question id to ask, or None when the quiz is over.
+  def next_question_id(self):
+    if self.cursor >= len(self.question_ids):
+      return None
+    question_id = self.question_ids[self.cursor]
+    self.cursor += 1
+    return question_id
+
+  def format(self):
+    return {
+      'session_id': self.id,
+      'category': self.category,
+      'total_questions': len(self.question_ids),
+      'questions_asked': self.cursor
+    }
+
+'''
+MemorySessionStore
+    keeps sessions in process. Sessions expire `ttl` seconds after they were
+    last used and, once `max_sessions` is reached, the least recently used
+    session is evicted.
+'''
+class MemorySessionStore:
+
+  def __init__(self, ttl=3600, max_sessions=10000, clock=time.time):
+    self.ttl = ttl
+    self.max_sessions = max_sessions
+    self.clock = clock
+    self.sessions = OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self, session_id):
+    with self.lock:
+      session = self.sessions.get(session_id)
+      if session is None:
+        return None
+      if session.expires_at <= self.clock():
+        del self.sessions[session_id]
+        return None
+      self.sessions.move_to_end(session_id)
+      return session
+
+  def save(self, session):
+    with self.lock:
+      session.expires_at = self.clock() + self.ttl
+      self.sessions[session.id] = session
+      self.sessions.move_to_end(session.id)
+      while len(self.sessions) > self.max_sessions:
+        self.sessions.popitem(last=False)
+
+  def delete(self, session_id):
+    with self.lock:
+      return self.sessions.pop(session_id, None) is not None
+
+'''
+SQLiteSessionStore
+    keeps sessions in a local SQLite file so that every worker process on the
+    machine shares them. Expiry and eviction follow MemorySessionStore.
+'''
+class SQLiteSessionStore:
+
+  def __init__(self, path, ttl=3600, max_sessions=10000, clock=time.time):
+    self.path = path
+    self.ttl = ttl
+    self.max_sessions = max_sessions
+    self.clock = clock
+    with self.connect() as connection:
+      connection.execute(
+        'CREATE TABLE IF NOT EXISTS quiz_sessions ('
+        'id TEXT PRIMARY KEY, category INTEGER, question_ids BLOB, '
+        'cursor INTEGER, expires_at REAL)'
+      )
+      connection.execute('CREATE INDEX IF NOT EXISTS quiz_sessions_expires_at ON quiz_sessions (expires_at)')
+
+  @contextmanager
+  def connect(self):
+    connection = sqlite3.connect(self.path, timeout=10)
+    try:
+      with connection:
+        yield connection
+    finally:
+      connection.close()
+
+  def get(self, session_id):
+    with self.connect() as connection:
+      row = connection.execute(
+        'SELECT category, question_ids, cursor, expires_at FROM quiz_sessions WHERE id = ?',
+        (session_id,)
+      ).fetchone()
+    if row is None:
+      return None
+    category, question_ids, cursor, expires_at = row
+    if expires_at <= self.clock():
+      self.delete(session_id)
+      return None
+    session = QuizSession(category, [], session_id=session_id, cursor=cursor, expires_at=expires_at)
+    session.question_ids.frombytes(question_ids)
+    return session
+
+  def save(self, session):
+    now = self.clock()
+    session.expires_at = now + self.ttl
+    with self.connect() as connection:
+      connection.execute(
+        'INSERT OR REPLACE INTO quiz_sessions (id, category, question_ids, cursor, expires_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (session.id, session.category, session.question_ids.tobytes(), session.cursor, session.expires_at)
+      )
+      connection.execute('DELETE FROM quiz_sessions WHERE expires_at <= ?', (now,))
+      # Sessions expiring soonest are the least recently used ones.
+      connection.execute(
+        'DELETE FROM quiz_sessions WHERE id IN (SELECT id FROM quiz_sessions '
+        'ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+        (self.max_sessions,)
+      )
+
+  def delete(self, session_id):
+    with self.connect() as connection:
+      cursor = connection.execute('DELETE FROM quiz_sessions WHERE id = ?', (session_id,))
+    return cursor.rowcount > 0
+
+# Builds the session store selected by the app config. QUIZ_SESSION_STORE is
+# either 'memory' or the path of a SQLite file.
+def make_session_store(config):
+  ttl = config['QUIZ_SESSION_TTL']
+  max_sessions = config['QUIZ_SESSION_MAX']
+  if config['QUIZ_SESSION_STORE'] == 'memory':
+    return MemorySessionStore(ttl=ttl, max_sessions=max_sessions)
+  return SQLiteSessionStore(config['QUIZ_SESSION_STORE'], ttl=ttl, max_sessions=max_sessions)
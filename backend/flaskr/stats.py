@@ -0,0 +1,91 @@
+import time
+from collections import Counter
+
+from sqlalchemy import func
+
+from models import Question
+from .indexes import ReloadableIndex
+from .quiz import MIN_DIFFICULTY, MAX_DIFFICULTY
+
+# ----------------------------------------------------------------------
+# Category statistics
+# ----------------------------------------------------------------------
+
+'''
+CategoryStats
+    number of questions per (category, difficulty), loaded with one GROUP BY
+    query and kept current by the write endpoints, so totals and difficulty
+    histograms cost O(categories) instead of a scan of the questions. Like
+    the other in-process indexes it is reloaded after `max_age` seconds to
+    pick up questions written by other worker processes. A reload reads the
+    counts once it records the writes, so the writes made meanwhile are
+    added to them; counts from a job are only published if nothing was
+    written since it was submitted.
+'''
+class CategoryStats(ReloadableIndex):
+
+  def clear(self):
+    self.counts = Counter()
+
+  def load(self):
+    self.load_rows(self.select())
+
+  # Returns the query of the (category, difficulty, count) rows of the
+  # questions table, run when iterated.
+  @staticmethod
+  def select():
+    return (
+      Question.visible(Question.category, Question.difficulty, func.count(Question.id))
+        .group_by(Question.category, Question.difficulty)
+    )
+
+  # Replaces the counts with rows counted elsewhere, unless a write or reset
+  # happened since `generation`. Returns whether they were published.
+  def load_counts(self, rows, generation):
+    contents = self.build(rows)
+    with self.lock:
+      if self.generation != generation:
+        return False
+      self.__dict__.update(contents)
+      self.loaded_at = time.monotonic()
+    return True
+
+  def add(self, category, difficulty, count=1):
+    self.change('add', category, difficulty, count)
+
+  def remove(self, category, difficulty, count=1):
+    self.change('remove', category, difficulty, count)
+
+  def _add(self, category, difficulty, count):
+    self.counts[(category, difficulty)] += count
+
+  def _remove(self, category, difficulty, count):
+    self.counts[(category, difficulty)] -= count
+
+  # Counts the questions, or those of one category.
+  def total(self, category=None):
+    self.current()
+    with self.lock:
+      if category is None:
+        return sum(self.counts.values())
+      category = int(category)
+      return sum(count for (row_category, _), count in self.counts.items() if row_category == category)
+
+  # Returns the number of questions of each difficulty in the category.
+  def histogram(self, category):
+    self.current()
+    histogram = {difficulty: 0 for difficulty in range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1)}
+    with self.lock:
+      for (row_category, difficulty), count in self.counts.items():
+        if row_category == category and difficulty is not None:
+          histogram[difficulty] = histogram.get(difficulty, 0) + count
+    return histogram
+
+  # Returns the totals and histograms of the given {id: type} categories.
+  def format(self, categories):
+    return [{
+      'id': category_id,
+      'type': category_type,
+      'total_questions': self.total(category_id),
+      'difficulties': self.histogram(category_id)
+    } for category_id, category_type in categories.items()]
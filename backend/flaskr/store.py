@@ -0,0 +1,186 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from .streaming import iter_questions
+from .indexes import ReloadableIndex
+
+# ----------------------------------------------------------------------
+# Compact question store
+# ----------------------------------------------------------------------
+
+'''
+QuestionStore
+    in-memory, column-oriented copy of the questions table for the read
+    endpoints. Ids, difficulties and category codes are kept in arrays
+    sorted by id, question and answer texts in lists of interned strings,
+    and row counts per (category, difficulty) in a Counter. The ids of each
+    category, of each (category, difficulty) and of each difficulty across
+    categories are also kept in sorted arrays, so a filtered listing bisects
+    to its first row instead of walking the store. Rows come out as
+    (id, question, answer, difficulty, category) tuples, like the streaming
+    rows, so no ORM instance is built. Like the other in-process indexes it
+    is kept current by the write endpoints and reloaded after `max_age`
+    seconds.
+'''
+class QuestionStore(ReloadableIndex):
+
+  def clear(self):
+    self.ids = array('l')
+    self.difficulties = array('b')
+    self.category_codes = array('h')
+    self.questions = []
+    self.answers = []
+    # Category ids by code, and codes by category id. Code 0 is no category.
+    self.categories = [None]
+    self.codes = {None: 0}
+    self.counts = Counter()
+    # Sorted ids by category code, by (code, difficulty) and, for every
+    # category, by (None, difficulty).
+    self.id_lists = {}
+
+  def load(self):
+    self.load_rows(iter_questions())
+
+  def __len__(self):
+    self.current()
+    return len(self.ids)
+
+  def add(self, question_id, question, answer, difficulty, category):
+    self.change('add', question_id, question, answer, difficulty, category)
+
+  def remove(self, question_id):
+    self.change('remove', question_id)
+
+  def _add(self, question_id, question, answer, difficulty, category):
+    category = int(category) if category is not None else None
+    code = self.codes.get(category)
+    if code is None:
+      code = self.codes[category] = len(self.categories)
+      self.categories.append(category)
+
+    # Rows arrive in id order when loading and new ids are the largest, so
+    # this is almost always an append.
+    position = len(self.ids)
+    if position and self.ids[-1] >= question_id:
+      if self.position(question_id) is not None:
+        self._remove(question_id)
+      position = bisect_left(self.ids, question_id)
+    self.ids.insert(position, question_id)
+    self.difficulties.insert(position, difficulty or 0)
+    self.category_codes.insert(position, code)
+    self.questions.insert(position, sys.intern(question or ''))
+    self.answers.insert(position, sys.intern(answer or ''))
+    self.counts[(category, difficulty)] += 1
+    for key in list_keys(code, difficulty or 0):
+      ids = self.id_lists.get(key)
+      if ids is None:
+        ids = self.id_lists[key] = array('l')
+      if ids and ids[-1] >= question_id:
+        ids.insert(bisect_left(ids, question_id), question_id)
+      else:
+        ids.append(question_id)
+
+  def _remove(self, question_id):
+    position = self.position(question_id)
+    if position is None:
+      return
+    code, difficulty = self.category_codes[position], self.difficulties[position]
+    self.counts[(self.categories[code], difficulty or None)] -= 1
+    for column in (self.ids, self.difficulties, self.category_codes, self.questions, self.answers):
+      del column[position]
+    for key in list_keys(code, difficulty):
+      ids = self.id_lists[key]
+      del ids[bisect_left(ids, question_id)]
+
+  def position(self, question_id):
+    position = bisect_left(self.ids, question_id)
+    if position < len(self.ids) and self.ids[position] == question_id:
+      return position
+    return None
+
+  def row(self, position):
+    return (
+      self.ids[position],
+      self.questions[position],
+      self.answers[position],
+      self.difficulties[position],
+      self.categories[self.category_codes[position]]
+    )
+
+  # Returns the row of the question, or None when there is no such question.
+  def get(self, question_id):
+    self.current()
+    with self.lock:
+      position = self.position(question_id)
+      return self.row(position) if position is not None else None
+
+  # Yields the rows in id order, after `after_id` and skipping the first
+  # `offset` matches, optionally only those of a category and of a
+  # difficulty or list of difficulties. Each row is found again from the id
+  # of the previous one, so rows written or reloaded while the caller
+  # iterates are neither repeated nor skipped.
+  def rows(self, category=None, difficulty=None, after_id=0, offset=0):
+    self.current()
+    with self.lock:
+      keys = self.filter_keys(category, difficulty)
+    if keys is None:
+      return
+    last_id = after_id
+    while True:
+      with self.lock:
+        lists = [self.ids] if not keys else [self.id_lists.get(key, ()) for key in keys]
+        if offset and len(lists) == 1:
+          # One sorted list: the skipped rows are jumped over.
+          position = bisect_right(lists[0], last_id) + offset
+          offset = 0
+          if position > len(lists[0]):
+            return
+          last_id = lists[0][position - 1]
+          continue
+        next_ids = []
+        for ids in lists:
+          position = bisect_right(ids, last_id)
+          if position < len(ids):
+            next_ids.append(ids[position])
+        if not next_ids:
+          return
+        last_id = min(next_ids)
+        if offset:
+          offset -= 1
+          continue
+        row = self.row(self.position(last_id))
+      yield row
+
+  # Returns the keys of the id lists of a filter, an empty list for every
+  # question or None when no question can match.
+  def filter_keys(self, category=None, difficulty=None):
+    code = None
+    if category is not None:
+      code = self.codes.get(int(category))
+      if code is None:
+        return None
+    if difficulty is None:
+      return [] if code is None else [code]
+    difficulties = sorted(set(difficulty)) if isinstance(difficulty, (list, tuple, set, range)) else [difficulty]
+    return [(code, level) for level in difficulties]
+
+  # Counts the questions, optionally only those of a category and of a
+  # difficulty or list of difficulties, without reading any row.
+  def count(self, category=None, difficulty=None):
+    self.current()
+    if category is not None:
+      category = int(category)
+    if difficulty is not None and not isinstance(difficulty, (list, tuple, set, range)):
+      difficulty = {difficulty}
+    with self.lock:
+      return sum(
+        count for (row_category, row_difficulty), count in self.counts.items()
+        if (category is None or row_category == category) and (difficulty is None or row_difficulty in difficulty)
+      )
+
+# Returns the keys of the id lists of a question of the category code and
+# difficulty.
+def list_keys(code, difficulty):
+  return [code, (code, difficulty), (None, difficulty)]
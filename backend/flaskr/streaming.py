@@ -0,0 +1,95 @@
+import itertools, json
+
+from flask import Response, abort, stream_with_context
+
+from models import Question
+from .serializer import current_serializer
+
+# ----------------------------------------------------------------------
+# Streaming responses
+# ----------------------------------------------------------------------
+
+QUESTION_FIELDS = ['id', 'question', 'answer', 'difficulty', 'category']
+QUESTION_COLUMNS = [getattr(Question, field) for field in QUESTION_FIELDS]
+
+# Questions serialized per chunk of a streamed response.
+STREAM_CHUNK_SIZE = 500
+
+# Yields the (id, question, answer, difficulty, category) rows of a query on
+# Question in ID order, starting after `after_id`. Rows are read `chunk_size`
+# at a time with keyset pagination, so at most one chunk is held in memory
+# and no cursor is kept open between chunks.
+def iter_questions(selection=None, after_id=0, chunk_size=1000):
+  if selection is None:
+    selection = Question.visible()
+  selection = selection.with_entities(*QUESTION_COLUMNS).order_by(Question.id)
+  while True:
+    rows = selection.filter(Question.id > after_id).limit(chunk_size).all()
+    if not rows:
+      return
+    for row in rows:
+      yield row
+    after_id = rows[-1][0]
+
+# Yields the rows of the questions with the given IDs, in the order of the
+# IDs, loading `chunk_size` questions at a time.
+def iter_questions_by_id(question_ids, chunk_size=1000):
+  for start in range(0, len(question_ids), chunk_size):
+    chunk = question_ids[start:start + chunk_size]
+    rows = {row[0]: row for row in Question.visible(*QUESTION_COLUMNS).filter(Question.id.in_(chunk))}
+    for question_id in chunk:
+      if question_id in rows:
+        yield rows[question_id]
+
+def format_row(row):
+  return dict(zip(QUESTION_FIELDS, row))
+
+# Checks if the client asked for a streamed response, with ?stream=1 or by
+# accepting NDJSON.
+def wants_stream(request):
+  return request.args.get('stream', 0, type=int) == 1 or wants_ndjson(request)
+
+def wants_ndjson(request):
+  return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def chunked(rows, chunk_size=STREAM_CHUNK_SIZE):
+  rows = iter(rows)
+  while True:
+    chunk = list(itertools.islice(rows, chunk_size))
+    if not chunk:
+      return
+    yield chunk
+
+# Rows are written with the app's serializer, one chunk at a time.
+def ndjson_lines(rows):
+  serializer = current_serializer()
+  for chunk in chunked(rows):
+    yield serializer.join_rows(chunk, QUESTION_FIELDS, '\n').decode('utf-8') + '\n'
+
+# Yields a JSON document with the questions first, so they can be sent as
+# they are read, followed by the other fields. The total number of questions
+# is only known at the end and is stored under `total_key`.
+def json_document(rows, total_key, fields):
+  serializer = current_serializer()
+  total = 0
+  yield '{"questions": ['
+  for chunk in chunked(rows):
+    yield (',' if total else '') + serializer.join_rows(chunk, QUESTION_FIELDS).decode('utf-8')
+    total += len(chunk)
+  tail = dict(fields or {}, success=True)
+  tail[total_key] = total
+  yield '], ' + json.dumps(tail)[1:]
+
+# Builds a streamed response for the question rows: NDJSON if the client
+# accepts it, otherwise a JSON document shaped like the regular response.
+# Returns 404 when there are no rows, like the regular endpoints.
+def stream_questions(request, rows, total_key, fields=None):
+  rows = iter(rows)
+  first = next(rows, None)
+  if first is None:
+    abort(404)
+  rows = itertools.chain([first], rows)
+
+  if wants_ndjson(request):
+    return Response(stream_with_context(ndjson_lines(rows)), mimetype='application/x-ndjson')
+  return Response(stream_with_context(json_document(rows, total_key, fields)), mimetype='application/json')
@@ -0,0 +1,29 @@
+--
+-- Converts questions.category to an integer foreign key to categories.id and
+-- adds the indexes used by the category listings and the quiz. Safe to run
+-- more than once. From the backend folder:
+--
+--   psql trivia < migrations/0001_question_category_fk.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.questions
+    ALTER COLUMN category TYPE integer USING NULLIF(category::text, '')::integer;
+
+-- Questions pointing at a category that doesn't exist lose their category,
+-- as the foreign key's ON DELETE SET NULL would have done.
+UPDATE public.questions SET category = NULL
+    WHERE category IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM public.categories WHERE categories.id = questions.category);
+
+ALTER TABLE public.questions DROP CONSTRAINT IF EXISTS category;
+ALTER TABLE ONLY public.questions
+    ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category_difficulty_id ON public.questions USING btree (category, difficulty, id);
+CREATE INDEX IF NOT EXISTS ix_questions_difficulty_id ON public.questions USING btree (difficulty, id);
+
+ANALYZE public.questions;
+
+COMMIT;
@@ -0,0 +1,14 @@
+--
+-- Adds the questions.deleted flag set by soft deletes (SOFT_DELETE). Existing
+-- questions are not deleted. Safe to run more than once. From the backend
+-- folder:
+--
+--   psql trivia < migrations/0002_question_deleted.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.questions
+    ADD COLUMN IF NOT EXISTS deleted boolean DEFAULT false NOT NULL;
+
+COMMIT;
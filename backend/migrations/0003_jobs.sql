@@ -0,0 +1,24 @@
+--
+-- Adds the jobs table of the background job runner. Safe to run more than
+-- once. From the backend folder:
+--
+--   psql trivia < migrations/0003_jobs.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id serial PRIMARY KEY,
+    kind character varying NOT NULL,
+    status character varying NOT NULL DEFAULT 'queued',
+    params text NOT NULL DEFAULT '{}',
+    result text,
+    error character varying,
+    progress integer NOT NULL DEFAULT 0,
+    total integer,
+    created_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'utc'),
+    started_at timestamp without time zone,
+    finished_at timestamp without time zone
+);
+
+COMMIT;
@@ -1,23 +1,169 @@
-import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+import os, itertools, re
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_app_context
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, Index, create_engine, false, orm, text
+from sqlalchemy.pool import QueuePool, StaticPool
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 import json
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get('DATABASE_URL') or "postgres://{}/{}".format('localhost:5432', database_name)
 
-db = SQLAlchemy()
+'''
+RoutingSession
+    sends the queries of a read-only block to the replica chosen for it.
+    Flushes, and everything outside such a block, use the primary.
+'''
+class RoutingSession(SignallingSession):
+
+  def __init__(self, db, **options):
+    self.db = db
+    super().__init__(db, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    replica = g.get('db_replica') if has_app_context() else None
+    if replica and not self._flushing:
+      return self.db.get_engine(self.app, bind=replica)
+    return super().get_bind(mapper, clause)
+
+'''
+RoutingSQLAlchemy
+    SQLAlchemy with optional read replicas, registered as the binds
+    `replica0`, `replica1`... Read-only blocks pick them round-robin.
+'''
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.next_replica = itertools.count()
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  # Applies the pool options of the app config to the primary and to every
+  # replica. SQLite files, which default to no pooling, are pooled like a
+  # server database; in-memory SQLite keeps its single shared connection.
+  def apply_driver_hacks(self, app, sa_url, options):
+    super().apply_driver_hacks(app, sa_url, options)
+    if options.get('poolclass') is StaticPool:
+      return
+    if sa_url.drivername.startswith('sqlite'):
+      options['poolclass'] = QueuePool
+      options.setdefault('connect_args', {})['check_same_thread'] = False
+    options.update(pool_options(app.config))
+
+  def replicas(self, app=None):
+    binds = self.get_app(app).config.get('SQLALCHEMY_BINDS') or {}
+    return sorted(bind for bind in binds if bind.startswith('replica'))
+
+  # Runs the block's queries on the next replica, or on the primary when
+  # there are none. Nested blocks keep the replica of the outer block.
+  @contextmanager
+  def read_only(self):
+    if g.get('db_replica') is not None:
+      yield
+      return
+    replicas = self.replicas()
+    g.db_replica = replicas[next(self.next_replica) % len(replicas)] if replicas else ''
+    try:
+      yield
+    finally:
+      g.pop('db_replica', None)
+
+  # Returns the connection pool of the primary and of each replica, by name.
+  def pools(self, app=None):
+    pools = {'primary': self.get_engine(app).pool}
+    for replica in self.replicas(app):
+      pools[replica] = self.get_engine(app, bind=replica).pool
+    return pools
+
+db = RoutingSQLAlchemy()
+
+# Options of the connection pools, read from the app config:
+#   DATABASE_POOL_SIZE       connections kept open per database (default 5)
+#   DATABASE_MAX_OVERFLOW    extra connections opened under load (default 10)
+#   DATABASE_POOL_PRE_PING   test connections before use (default True)
+#   DATABASE_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+def pool_options(config):
+    return {
+        'pool_size': config.get('DATABASE_POOL_SIZE', 5),
+        'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 10),
+        'pool_pre_ping': config.get('DATABASE_POOL_PRE_PING', True),
+        'pool_recycle': config.get('DATABASE_POOL_RECYCLE', 1800)
+    }
 
 '''
 setup_db(app)
-    binds a flask application and a SQLAlchemy service
+    binds a flask application and a SQLAlchemy service. The URLs listed in
+    the DATABASE_REPLICA_URLS config serve the read-only routes.
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_BINDS"] = {
+        'replica%d' % number: url for number, url in enumerate(app.config.get('DATABASE_REPLICA_URLS') or [])
+    }
     db.app = app
     db.init_app(app)
-    db.create_all()
+    db.create_all(bind=None)
+
+# Escapes of the text format of COPY blocks.
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+def copy_value(value):
+  if value == '\\N':
+    return None
+  return re.sub(r'\\(.)', lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), value)
+
+# Reads the `COPY public.<table> (<columns>) FROM stdin;` blocks of a pg_dump
+# file such as trivia.psql. Returns {table: (columns, rows)}, with None for
+# NULL values and every other value a string.
+def read_fixtures(path):
+  tables, rows = {}, None
+  with open(path, encoding='utf-8') as lines:
+    for line in lines:
+      line = line.rstrip('\n')
+      if rows is not None:
+        if line == '\\.':
+          rows = None
+        else:
+          rows.append([copy_value(value) for value in line.split('\t')])
+        continue
+      match = re.match(r'COPY (?:\w+\.)?(\w+) \(([^)]*)\) FROM stdin;', line)
+      if match:
+        rows = []
+        tables[match.group(1)] = ([column.strip() for column in match.group(2).split(',')], rows)
+  return tables
+
+def fixture_value(column, value):
+  if value is None:
+    return None
+  if isinstance(column.type, Boolean):
+    return value == 't'
+  if isinstance(column.type, Integer):
+    return int(value)
+  return value
+
+'''
+seed_db(path)
+    loads the rows of a pg_dump file such as trivia.psql into the tables
+    that are still empty, so an embedded SQLite database (or a fresh server
+    database) starts with the same data as `psql trivia < trivia.psql`.
+'''
+def seed_db(path):
+  fixtures = read_fixtures(path)
+  for table in db.Model.metadata.sorted_tables:
+    if table.name not in fixtures or db.session.query(table).first() is not None:
+      continue
+    columns, rows = fixtures[table.name]
+    db.session.execute(table.insert(), [
+      {column: fixture_value(table.c[column], value) for column, value in zip(columns, row)} for row in rows
+    ])
+    # Move the id sequence past the loaded ids, as the dump's setval does.
+    if db.engine.dialect.name == 'postgresql' and 'id' in table.c:
+      db.session.execute(text("SELECT setval(pg_get_serial_sequence('%s', 'id'), (SELECT max(id) FROM %s))" % (table.name, table.name)))
+  db.session.commit()
 
 '''
 Question
@@ -29,8 +175,17 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'))
   difficulty = Column(Integer)
+  # Set instead of deleting the row when the app runs with SOFT_DELETE.
+  deleted = Column(Boolean, nullable=False, default=False, server_default=false())
+
+  # Category listings and quiz filters read questions by category and
+  # difficulty in ID order.
+  __table_args__ = (
+    Index('ix_questions_category_difficulty_id', 'category', 'difficulty', 'id'),
+    Index('ix_questions_difficulty_id', 'difficulty', 'id'),
+  )
 
   def __init__(self, question, answer, category, difficulty):
     self.question = question
@@ -38,6 +193,13 @@ class Question(db.Model):
     self.category = category
     self.difficulty = difficulty
 
+  # Returns the query of the questions that haven't been soft-deleted. Every
+  # read path starts from it.
+  @classmethod
+  def visible(cls, *entities):
+    query = db.session.query(*entities) if entities else cls.query
+    return query.filter(cls.deleted.is_(False))
+
   def insert(self):
     db.session.add(self)
     db.session.commit()
@@ -75,4 +237,49 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+Job
+    a maintenance task run in the background by the job runner. Its row is
+    written by the web process when the job is submitted and by the worker
+    process as it runs, so any server process can report its status.
+'''
+class Job(db.Model):
+  __tablename__ = 'jobs'
+
+  id = Column(Integer, primary_key=True)
+  kind = Column(String, nullable=False)
+  # queued, running, succeeded or failed.
+  status = Column(String, nullable=False, default='queued')
+  # Parameters and result of the job, as JSON.
+  params = Column(Text, nullable=False, default='{}')
+  result = Column(Text)
+  error = Column(String)
+  # Units of work done so far, out of `total` when it is known.
+  progress = Column(Integer, nullable=False, default=0)
+  total = Column(Integer)
+  created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+  started_at = Column(DateTime)
+  finished_at = Column(DateTime)
+
+  def __init__(self, kind, params=None):
+    self.kind = kind
+    self.params = json.dumps(params or {})
+    self.status = 'queued'
+    self.progress = 0
+
+  def format(self):
+    return {
+      'id': self.id,
+      'kind': self.kind,
+      'status': self.status,
+      'params': json.loads(self.params),
+      'progress': self.progress,
+      'total': self.total,
+      'result': json.loads(self.result) if self.result is not None else None,
+      'error': self.error,
+      'created_at': self.created_at.isoformat() if self.created_at else None,
+      'started_at': self.started_at.isoformat() if self.started_at else None,
+      'finished_at': self.finished_at.isoformat() if self.finished_at else None
+    }
@@ -0,0 +1,356 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from urllib.parse import urlsplit
+from flaskr import create_app, QUESTIONS_PER_PAGE
+from flaskr.asgi import create_asgi_app
+
+
+# The tests run against TEST_DATABASE_URL when it is set, otherwise against a
+# SQLite file seeded from trivia.psql once for the module.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+DATABASE_DIRECTORY = tempfile.TemporaryDirectory()
+DATABASE_PATH = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(DATABASE_DIRECTORY.name, 'trivia_test.db')
+
+
+def setUpModule():
+    create_app({'DATABASE_URL': DATABASE_PATH, 'DATABASE_FIXTURES': FIXTURES})
+
+
+def tearDownModule():
+    DATABASE_DIRECTORY.cleanup()
+
+
+class ASGITestClient:
+    """Sends requests to an ASGI app on an event loop kept for the test."""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+
+    def close(self):
+        self.loop.run_until_complete(self.app.database.close())
+        self.loop.close()
+
+    def request(self, method, url, body=None):
+        return self.loop.run_until_complete(self.send(method, url, body))
+
+    async def send(self, method, url, body=None):
+        url = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': url.path,
+            'query_string': url.query.encode('latin-1'),
+            'headers': [(b'content-type', b'application/json')]
+        }
+        messages = [{'type': 'http.request', 'body': json.dumps(body).encode('utf-8') if body is not None else b''}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        status = sent[0]['status']
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        return status, json.loads(body)
+
+
+class WSGITestClient:
+    """Sends requests to a Flask app through its test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def close(self):
+        pass
+
+    def request(self, method, url, body=None):
+        res = self.client.open(url, method=method, json=body)
+        return res.status_code, json.loads(res.data)
+
+
+class ContractTests:
+    """Tests of the JSON contracts that both the WSGI and the ASGI app serve."""
+
+    database_path = DATABASE_PATH
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_get_categories(self):
+        status, data = self.client.request('GET', '/categories')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['categories']))
+
+    def test_get_category_stats(self):
+        status, data = self.client.request('GET', '/categories/stats')
+
+        self.assertEqual(status, 200)
+        self.assertTrue(data['total_questions'])
+        self.assertEqual(sorted(data['categories'][0]), ['difficulties', 'id', 'total_questions', 'type'])
+        self.assertEqual(sorted(data['categories'][0]['difficulties']), ['1', '2', '3', '4', '5'])
+        self.assertLessEqual(sum(category['total_questions'] for category in data['categories']), data['total_questions'])
+
+    def test_get_questions(self):
+        status, data = self.client.request('GET', '/questions')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['total_questions'])
+        self.assertTrue(len(data['categories']))
+        self.assertEqual(len(data['questions']), min(QUESTIONS_PER_PAGE, data['total_questions']))
+        self.assertEqual(data['next_url'], '/questions/1')
+        self.assertEqual(sorted(data['questions'][0]), ['answer', 'category', 'difficulty', 'id', 'question'])
+
+    def test_get_questions_after_id(self):
+        status, first = self.client.request('GET', '/questions')
+        last_id = first['questions'][-1]['id']
+        status, data = self.client.request('GET', '/questions?after_id=%d' % last_id)
+
+        self.assertEqual(status, 200)
+        self.assertTrue(all(question['id'] > last_id for question in data['questions']))
+        self.assertEqual(data['next_url'], '/questions?after_id=%d' % data['questions'][-1]['id'])
+
+    def test_scroll_questions(self):
+        status, data = self.client.request('GET', '/v2/questions?limit=2&fields=id,category&category=1')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(data), ['next', 'questions', 'success'])
+        self.assertEqual(len(data['questions']), 2)
+        self.assertEqual(data['questions'][0], {'id': data['questions'][0]['id'], 'category': 1})
+        self.assertEqual(data['next'], data['questions'][-1]['id'])
+
+        status, data = self.client.request('GET', '/v2/questions?after=%d&fields=question' % data['next'])
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(data['questions'][0]), ['question'])
+
+    def test_422_scroll_unknown_field(self):
+        status, data = self.client.request('GET', '/v2/questions?fields=secret')
+
+        self.assertEqual(status, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_404_beyond_last_page(self):
+        status, data = self.client.request('GET', '/questions/1000')
+
+        self.assertEqual(status, 404)
+        self.assertEqual(data, {'success': False, 'error': 404, 'message': 'Item not found.'})
+
+    def test_get_questions_by_category(self):
+        status, data = self.client.request('GET', '/categories/1/questions')
+
+        self.assertEqual(status, 200)
+        self.assertTrue(all(question['category'] == 1 for question in data['questions']))
+        self.assertEqual(data['next_url'], '/categories/1/questions/1')
+
+    def test_400_unknown_category(self):
+        status, data = self.client.request('GET', '/categories/1000/questions')
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_add_and_delete_question(self):
+        status, data = self.client.request('POST', '/questions', {
+            'question': 'Which app served this question?',
+            'answer': 'Both',
+            'category': 1,
+            'difficulty': 2
+        })
+        self.assertEqual(status, 200)
+        question = data['question']
+        self.assertEqual(question['category'], 1)
+        self.assertEqual(question['difficulty'], 2)
+
+        status, data = self.client.request('DELETE', '/questions/%d' % question['id'])
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {'id': question['id'], 'success': True})
+
+        status, data = self.client.request('DELETE', '/questions/%d' % question['id'])
+        self.assertEqual(status, 404)
+
+    def test_409_duplicate_question(self):
+        status, data = self.client.request('POST', '/questions', {
+            'question': 'Who discovered penicillin', 'answer': 'Fleming', 'category': 1, 'difficulty': 3
+        })
+
+        self.assertEqual(status, 409)
+        self.assertEqual(data['message'], 'Duplicate question.')
+        self.assertEqual(len(data['duplicates']), 1)
+
+    def test_422_invalid_difficulty(self):
+        status, data = self.client.request('POST', '/questions', {
+            'question': 'q', 'answer': 'a', 'category': 1, 'difficulty': 9
+        })
+
+        self.assertEqual(status, 422)
+        self.assertEqual(data['message'], 'Request could not be processed.')
+
+    def test_422_question_not_text(self):
+        status, data = self.client.request('POST', '/questions', {
+            'question': ['q'], 'answer': 'a', 'category': 1, 'difficulty': 2
+        })
+
+        self.assertEqual(status, 422)
+        self.assertEqual(data['message'], 'Request could not be processed.')
+
+    def test_search(self):
+        status, data = self.client.request('POST', '/search', {'searchTerm': 'title'})
+
+        self.assertEqual(status, 200)
+        self.assertTrue(data['totalQuestions'])
+        self.assertTrue(all('title' in question['question'].lower() for question in data['questions']))
+
+    def test_search_invalid_page(self):
+        status, data = self.client.request('POST', '/search', {'searchTerm': 'title', 'page': 0})
+
+        self.assertEqual(status, 422)
+        self.assertFalse(data['success'])
+
+    def test_play_quiz(self):
+        status, data = self.client.request('POST', '/quizzes', {'category': {'id': 1}, 'previous_questions': []})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['question']['category'], 1)
+        self.assertEqual(data['previous_questions'], [])
+
+    def test_play_quiz_invalid_previous_questions(self):
+        status, data = self.client.request('POST', '/quizzes', {'category': 0, 'previous_questions': ['5']})
+
+        self.assertEqual(status, 422)
+        self.assertFalse(data['success'])
+
+    def test_quiz_round(self):
+        status, data = self.client.request('POST', '/quizzes/rounds', {'category': 0, 'count': 3})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len({question['id'] for question in data['questions']}), 3)
+
+    def test_check_answers(self):
+        status, data = self.client.request('POST', '/quizzes/answers', {'answers': [
+            {'question_id': 9, 'answer': 'muhammed ali'},
+            {'question_id': 2, 'answer': 'Apollo 11'}
+        ]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['results'], [
+            {'question_id': 9, 'correct': True, 'correct_answer': 'Muhammad Ali'},
+            {'question_id': 2, 'correct': False, 'correct_answer': 'Apollo 13'}
+        ])
+        self.assertEqual(data['total_correct'], 1)
+
+        status, data = self.client.request('POST', '/quizzes/answers', {'question_id': 1000, 'answer': 'Ali'})
+        self.assertEqual(status, 404)
+
+    def test_quiz_session(self):
+        status, data = self.client.request('POST', '/quizzes/sessions', {'category': {'id': 1}})
+        self.assertEqual(status, 200)
+        session_id = data['session_id']
+
+        total_questions = data['total_questions']
+        asked = set()
+        for _ in range(total_questions):
+            status, data = self.client.request('POST', '/quizzes/sessions/%s/next' % session_id)
+            self.assertEqual(status, 200)
+            self.assertEqual(data['question']['category'], 1)
+            asked.add(data['question']['id'])
+        self.assertEqual(len(asked), total_questions)
+
+        status, data = self.client.request('POST', '/quizzes/sessions/%s/next' % session_id)
+        self.assertEqual(status, 404)
+
+        status, data = self.client.request('DELETE', '/quizzes/sessions/%s' % session_id)
+        self.assertEqual(status, 200)
+        status, data = self.client.request('DELETE', '/quizzes/sessions/%s' % session_id)
+        self.assertEqual(status, 404)
+
+
+    def test_429_over_the_search_rate_limit(self):
+        client = self.client_for({'RATE_LIMIT_STORE': 'memory', 'RATE_LIMITS': {'search': {'client': (0.01, 1)}}})
+        try:
+            status, data = client.request('POST', '/search', {'searchTerm': 'the'})
+            self.assertEqual(status, 200)
+            status, data = client.request('POST', '/search', {'searchTerm': 'the'})
+            self.assertEqual(status, 429)
+            self.assertEqual(data, {'success': False, 'error': 429, 'message': 'Too many requests.'})
+        finally:
+            client.close()
+
+
+class WSGIContractTestCase(ContractTests, unittest.TestCase):
+    """Runs the contract tests against the Flask app."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app({'DATABASE_URL': cls.database_path})
+
+    def setUp(self):
+        self.client = WSGITestClient(self.app)
+
+    def client_for(self, config):
+        return WSGITestClient(create_app(dict(config, DATABASE_URL=self.database_path)))
+
+
+class ASGIContractTestCase(ContractTests, unittest.TestCase):
+    """Runs the contract tests against the async app."""
+
+    def setUp(self):
+        self.app = create_asgi_app({'DATABASE_URL': self.database_path})
+        self.client = ASGITestClient(self.app)
+
+    def client_for(self, config):
+        return ASGITestClient(create_asgi_app(dict(config, DATABASE_URL=self.database_path)))
+
+    def test_same_responses_as_wsgi(self):
+        wsgi = WSGITestClient(create_app({'DATABASE_URL': self.database_path}))
+        for method, url, body in [
+            ('GET', '/categories', None),
+            ('GET', '/categories/stats', None),
+            ('GET', '/questions/2', None),
+            ('GET', '/v2/questions?after=5&limit=4&fields=id,answer&difficulty=2', None),
+            ('GET', '/v2/categories', None),
+            ('GET', '/categories/Science/questions', None),
+            ('POST', '/search', {'searchTerm': 'the', 'searchAnswers': True, 'page': 1}),
+            ('POST', '/quizzes/answers', {'question_id': 12, 'answer': 'George Washington Carver'})
+        ]:
+            self.assertEqual(self.client.request(method, url, body), wsgi.request(method, url, body), url)
+
+    def test_should_serve_requests_while_an_index_builds(self):
+        building, released = threading.Event(), threading.Event()
+        build = self.app.search_index.build
+
+        def slow_build(rows):
+            building.set()
+            released.wait(5)
+            return build(rows)
+
+        self.app.search_index.build = slow_build
+
+        async def requests():
+            search = asyncio.ensure_future(self.client.send('POST', '/search', {'searchTerm': 'title', 'page': 1}))
+            while not building.is_set():
+                await asyncio.sleep(0.01)
+            categories = await self.client.send('GET', '/categories')
+            searching = not search.done()
+            released.set()
+            return categories, searching, await search
+
+        categories, searching, (status, data) = self.client.loop.run_until_complete(requests())
+
+        self.assertEqual(categories[0], 200)
+        self.assertTrue(searching)
+        self.assertEqual(status, 200)
+        self.assertTrue(data['questions'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
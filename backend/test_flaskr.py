@@ -1,32 +1,117 @@
+import gzip
 import os
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from flask import Flask
+from sqlalchemy import create_engine, event, func, orm
 from flaskr import create_app, QUESTIONS_PER_PAGE
-from models import setup_db, Question, Category
+from models import db, Question, Category, Job, RoutingSession, read_fixtures
+from flaskr.quiz import IdBucket, QuizIndex, adaptive_levels
+from flaskr.search import FieldIndex, SearchIndex
+from flaskr.indexes import IndexRefresher, reload_due
+from flaskr.store import QuestionStore
+from flaskr.sessions import QuizSession, MemorySessionStore, SQLiteSessionStore
+from flaskr.cache import MemoryCacheBackend, SQLiteCacheBackend
+from flaskr.bulk import QuestionDeleter
+from flaskr.serializer import Serializer, Rows, BACKENDS
+from flaskr.limits import MemoryBucketStore, SQLiteBucketStore, AdmissionControl
+from flaskr.stats import CategoryStats
+from flaskr.dedup import DedupIndex, normalize
+from flaskr.answers import AnswerKey, AnswerCache, normalize_answer, within_distance
+
+
+# The tests run against TEST_DATABASE_URL when it is set, otherwise against a
+# SQLite file seeded from trivia.psql, so they need no database server.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+
+class RollbackSession(RoutingSession):
+    """Session bound to the connection of a test, whose commits and
+    rollbacks only release or roll back a savepoint."""
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.begin_nested()
+
+
+@event.listens_for(RollbackSession, 'after_transaction_end')
+def restart_savepoint(session, transaction):
+    if transaction.nested and not transaction._parent.nested and session.transaction is transaction._parent:
+        session.expire_all()
+        session.begin_nested()
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Build the app and the schema once, seeded from trivia.psql."""
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.database_path = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(cls.directory.name, 'trivia_test.db')
+        # Jobs run in the request, inside the transaction of the test, and so
+        # do the loads of the indexes.
+        cls.app = create_app({'DATABASE_URL': cls.database_path, 'INDEX_REFRESH_INTERVAL': None, 'DATABASE_FIXTURES': FIXTURES, 'JOB_WORKERS': 0, 'JOB_DIRECTORY': cls.directory.name})
+        cls.engine = db.get_engine(cls.app)
+        if cls.engine.dialect.name == 'sqlite':
+            # pysqlite doesn't emit BEGIN itself, which savepoints need.
+            @event.listens_for(cls.engine, 'connect')
+            def connect(dbapi_connection, connection_record):
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(cls.engine, 'begin')
+            def begin(connection):
+                connection.execute('BEGIN')
+            cls.engine.dispose()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls.directory.cleanup()
+
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Run the test in a transaction, rolled back by tearDown."""
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
-
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
+        self.context = self.app.app_context()
+        self.context.push()
+        self.connection = self.engine.connect()
+        self.transaction = self.connection.begin()
+        self.session = db.session
+        db.session = orm.scoped_session(
+            orm.sessionmaker(class_=RollbackSession, db=db, bind=self.connection, binds={}),
+            scopefunc=self.session.registry.scopefunc
+        )
+
     def tearDown(self):
         """Executed after reach test"""
-        pass
+        db.session.remove()
+        db.session = self.session
+        self.transaction.rollback()
+        self.connection.close()
+        self.app.extensions['reset_caches']()
+        self.context.pop()
+
+    def assertUsesIndex(self, query):
+        """Asserts that the database plans to read the query through an index."""
+        dialect = db.engine.dialect
+        sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        with db.engine.connect() as connection:
+            if dialect.name == 'postgresql':
+                transaction = connection.begin()
+                # The test tables are small enough that a scan would be cheaper,
+                # so only check that an index can serve the query.
+                connection.execute('SET LOCAL enable_seqscan = off')
+                plan = '\n'.join(row[0] for row in connection.execute('EXPLAIN ' + sql))
+                transaction.rollback()
+            else:
+                plan = '\n'.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql))
+        self.assertTrue('INDEX' in plan.upper() or 'PRIMARY KEY' in plan.upper(), plan)
 
     def test_im_learning_testing(self):
         self.assertTrue(True)
@@ -41,6 +126,28 @@ class TriviaTestCase(unittest.TestCase):
         categories = Category.query.all()
         self.assertEqual(len(data['categories']), len(categories))
 
+    def test_should_not_resend_unchanged_categories(self):
+        res = self.client().get('/categories')
+        etag = res.headers['ETag']
+
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        # Writing a category changes the ETag.
+        category = Category('Music')
+        db.session.add(category)
+        db.session.commit()
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(data['categories'][str(category.id)], 'Music')
+
+        db.session.delete(category)
+        db.session.commit()
+
     def test_get_categories_dont_accept_post_request(self):
         res = self.client().post('/categories')
         self.assertEqual(res.status_code, 405)
@@ -80,6 +187,94 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertFalse(data['success'])
 
+    def test_should_page_questions_by_cursor(self):
+        first_page = json.loads(self.client().get('/questions').data)
+        last_id = first_page['questions'][-1]['id']
+
+        res = self.client().get('/questions?after_id=' + str(last_id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['total_questions'], first_page['total_questions'])
+        # The cursor page starts right after the last question already seen.
+        for question in data['questions']:
+            self.assertGreater(question['id'], last_id)
+        self.assertIn('after_id=' + str(data['questions'][-1]['id']), data['next_url'])
+
+    def test_should_not_return_questions_after_last_cursor(self):
+        last_question = Question.query.order_by(Question.id.desc()).first()
+        res = self.client().get('/questions?after_id=' + str(last_question.id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+    def scroll(self, client, query):
+        questions, after = [], 0
+        while after is not None:
+            res = client.get('/v2/questions?after=%d&%s' % (after, query))
+            self.assertEqual(res.status_code, 200)
+            data = json.loads(res.data)
+            questions.extend(data['questions'])
+            after = data['next']
+        return questions
+
+    def test_should_scroll_every_question_with_selected_fields(self):
+        questions = self.scroll(self.client(), 'limit=7&fields=question,id')
+        expected = Question.query.order_by(Question.id).all()
+
+        self.assertEqual(questions, [{'question': question.question, 'id': question.id} for question in expected])
+        res = self.client().get('/v2/questions?limit=%d' % len(expected))
+        self.assertIsNone(json.loads(res.data)['next'])
+        self.assertNotIn('categories', json.loads(res.data))
+
+    def test_should_scroll_questions_of_category_and_difficulty(self):
+        questions = self.scroll(self.client(), 'limit=1&category=Entertainment&difficulty=3&fields=answer')
+        expected = Question.query.filter_by(category=5, difficulty=3).order_by(Question.id).all()
+
+        self.assertTrue(expected)
+        self.assertEqual(questions, [{'answer': question.answer} for question in expected])
+        store_client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'QUESTION_STORE': True}).test_client()
+        self.assertEqual(self.scroll(store_client, 'limit=1&category=5&difficulty=3&fields=answer'), questions)
+
+    def test_should_not_scroll_with_invalid_arguments(self):
+        self.assertEqual(self.client().get('/v2/questions?fields=id,secret').status_code, 422)
+        self.assertEqual(self.client().get('/v2/questions?limit=1000').status_code, 422)
+        self.assertEqual(self.client().get('/v2/questions?difficulty=9').status_code, 422)
+        self.assertEqual(self.client().get('/v2/questions?after=first').status_code, 422)
+        self.assertEqual(self.client().get('/v2/questions?category=Music').status_code, 400)
+
+    def test_should_let_clients_keep_the_categories(self):
+        res = self.client().get('/v2/categories')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Cache-Control'], 'public, max-age=300')
+        self.assertEqual(json.loads(res.data), json.loads(self.client().get('/categories').data))
+        res = self.client().get('/v2/categories', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['Cache-Control'], 'public, max-age=300')
+
+    def test_should_stream_every_question(self):
+        res = self.client().get('/questions?stream=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['total_questions'], Question.query.count())
+        self.assertEqual(len(data['questions']), data['total_questions'])
+        self.assertEqual(len(data['categories']), len(Category.query.all()))
+
+    def test_should_stream_category_questions_as_ndjson(self):
+        res = self.client().get('/categories/4/questions', headers={'Accept': 'application/x-ndjson'})
+        questions = [json.loads(line) for line in res.data.decode('utf-8').splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(questions), len(Question.query.filter_by(category=4).all()))
+        for question in questions:
+            self.assertEqual(question['category'], 4)
+
     def test_should_filter_questions_by_sports_category(self):
         res = self.client().get('/categories/6/questions')
         data = json.loads(res.data)
@@ -90,6 +285,37 @@ class TriviaTestCase(unittest.TestCase):
         sports_questions = Question.query.filter_by(category=6).all()
         self.assertEqual(data['total_questions'], len(sports_questions))
 
+    def test_should_filter_questions_by_category_type(self):
+        res = self.client().get('/categories/Sports/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], len(Question.query.filter_by(category=6).all()))
+
+    def test_should_not_filter_questions_by_unknown_category(self):
+        res = self.client().get('/categories/Knitting/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(data['success'])
+
+    def test_should_refresh_cached_category_listing_after_new_question(self):
+        first = json.loads(self.client().get('/categories/6/questions').data)
+        self.assertEqual(json.loads(self.client().get('/categories/6/questions').data), first)
+
+        new_question_data = {
+            'question': "Which sport uses a shuttlecock?",
+            'answer': "Badminton",
+            'category': 6,
+            'difficulty': 1
+        }
+        self.client().post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+
+        data = json.loads(self.client().get('/categories/6/questions').data)
+        self.assertEqual(data['total_questions'], first['total_questions'] + 1)
+        data = json.loads(self.client().get('/questions').data)
+        self.assertEqual(data['total_questions'], Question.query.count())
+
     def test_should_not_return_second_page_of_sports_questions(self):
         res = self.client().get('/categories/6/questions/2')
         data = json.loads(res.data)
@@ -107,6 +333,67 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['id'], question_id)
 
+    def add_questions(self, client, count, category=1, difficulty=5):
+        question_ids = []
+        for number in range(count):
+            new_question_data = {'question': 'Bulk question %d?' % number, 'answer': 'Bulk', 'category': category, 'difficulty': difficulty}
+            res = client.post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+            question_ids.append(json.loads(res.data)['question']['id'])
+        return question_ids
+
+    def test_should_delete_questions_in_bulk_by_id(self):
+        question_ids = self.add_questions(self.client(), 3)
+        res = self.client().post('/questions/delete', json={'ids': question_ids + [question_ids[-1] + 1000]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], 3)
+        self.assertEqual(Question.query.filter(Question.id.in_(question_ids)).count(), 0)
+
+        res = self.client().post('/questions/delete', json={'ids': question_ids})
+        self.assertEqual(res.status_code, 404)
+
+    def test_should_delete_questions_in_chunks(self):
+        question_ids = self.add_questions(self.client(), 5, category=2, difficulty=1)
+        deleter = QuestionDeleter(chunk_size=2).run(category=2, difficulty=1)
+        db.session.commit()
+
+        self.assertTrue(set(question_ids) <= set(deleter.deleted))
+        self.assertEqual(deleter.categories, {2})
+        self.assertEqual(Question.query.filter_by(category=2, difficulty=1).count(), 0)
+
+    def test_should_not_delete_questions_in_bulk_without_filter(self):
+        self.assertEqual(self.client().post('/questions/delete', json={}).status_code, 400)
+        self.assertEqual(self.client().post('/questions/delete', json={'ids': ['5']}).status_code, 422)
+        self.assertEqual(self.client().post('/questions/delete', json={'category': 1000}).status_code, 400)
+
+    def test_should_hide_and_restore_soft_deleted_questions(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'SOFT_DELETE': True}).test_client()
+        question_ids = self.add_questions(client, 2, category=3, difficulty=5)
+        total = json.loads(client.get('/categories/3/questions').data)['total_questions']
+
+        res = client.delete('/questions/%d' % question_ids[0])
+        self.assertEqual(res.status_code, 200)
+        res = client.post('/questions/delete', json={'ids': question_ids[1:]})
+        self.assertEqual(json.loads(res.data)['deleted'], 1)
+        self.assertEqual(client.delete('/questions/%d' % question_ids[0]).status_code, 404)
+
+        # The rows are kept, but no read path returns them.
+        self.assertEqual(Question.query.filter(Question.id.in_(question_ids), Question.deleted.is_(True)).count(), 2)
+        data = json.loads(client.get('/categories/3/questions').data)
+        self.assertEqual(data['total_questions'], total - 2)
+        res = client.post('/search', json={'searchTerm': 'Bulk question'})
+        self.assertEqual(res.status_code, 404)
+        res = client.post('/quizzes/rounds', json={'category': 3, 'difficulty': 5, 'count': 50})
+        self.assertFalse(set(question_ids) & {question['id'] for question in json.loads(res.data).get('questions', [])})
+
+        res = client.post('/questions/restore', json={'ids': question_ids})
+        self.assertEqual(json.loads(res.data)['restored'], 2)
+        data = json.loads(client.get('/categories/3/questions').data)
+        self.assertEqual(data['total_questions'], total)
+
+        client.post('/questions/delete', json={'ids': question_ids})
+
     def test_should_return_not_found_when_question_id_doesnt_exist(self):
         res = self.client().delete('/questions/1')
         data = json.loads(res.data)
@@ -150,6 +437,36 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 400)
         self.assertFalse(data['success'])
 
+    def test_should_not_allow_new_question_with_invalid_category(self):
+        for category in [None, [5], {'id': 5}, 5.0, True, '\u00bd']:
+            new_question_data = {
+                'question': "Does the test create a new question?",
+                'answer': "Question is created.",
+                'category': category,
+                'difficulty': 5
+            }
+
+            res = self.client().post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 400)
+            self.assertFalse(data['success'])
+
+    def test_should_not_allow_new_question_that_is_not_text(self):
+        for question, answer in [(['Is this a question?'], 'No.'), ({'text': 'Is this a question?'}, 'No.'), ('Is this an answer?', 42)]:
+            new_question_data = {
+                'question': question,
+                'answer': answer,
+                'category': 5,
+                'difficulty': 5
+            }
+
+            res = self.client().post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 422)
+            self.assertFalse(data['success'])
+
     def test_should_not_allow_new_question_with_invalid_difficulty(self):
         new_question_data = {
             'question': "Does the test create a new question?",
@@ -165,6 +482,167 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 422)
         self.assertFalse(data['success'])
 
+    def test_should_import_questions_and_report_invalid_rows(self):
+        rows = [
+            {'question': "Which planet is known as the Red Planet?", 'answer': "Mars", 'category': 'Science', 'difficulty': 1},
+            {'question': "Who painted the Mona Lisa?", 'answer': "Leonardo da Vinci", 'category': 2, 'difficulty': 2},
+            {'question': "Is this question missing an answer?", 'category': 2, 'difficulty': 2},
+            {'question': "Is this difficulty valid?", 'answer': "No.", 'category': 2, 'difficulty': 10},
+            {'question': ["Is this question text?"], 'answer': "No.", 'category': 2, 'difficulty': 2},
+            {'question': "Is this answer text?", 'answer': 42, 'category': 2, 'difficulty': 2}
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows)
+        total_before = Question.query.count()
+
+        res = self.client().post('/questions/import', data=body, headers={'Content-Type': 'application/x-ndjson'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [3, 4, 5, 6])
+        self.assertEqual([error['error'] for error in data['errors'][2:]], ['Invalid question.', 'Invalid answer.'])
+        self.assertEqual(Question.query.count(), total_before + 2)
+        self.assertEqual(Question.query.filter_by(answer="Mars").first().category, 1)
+
+    def test_should_reject_duplicate_question(self):
+        duplicate = {'question': "What was boxer Cassius Clay's original name?", 'answer': 'Muhammad Ali', 'category': 4, 'difficulty': 1}
+        res = self.client().post('/questions', json=dict(duplicate, question="What boxer's original name is Cassius Clay"))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(data['message'], 'Duplicate question.')
+        self.assertEqual(data['duplicates'], [9])
+
+        res = self.client().post('/questions', json=dict(duplicate, question="What boxer's original name is Cassius Clay?", allow_duplicate=True))
+        self.assertEqual(res.status_code, 200)
+        question_id = json.loads(res.data)['question']['id']
+        res = self.client().get('/questions/duplicates')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn([9, question_id], [[question['id'] for question in cluster] for cluster in data['clusters']])
+
+        self.client().delete('/questions/%d' % question_id)
+        res = self.client().post('/questions', json=duplicate)
+        self.assertEqual(res.status_code, 200)
+
+    def test_should_skip_duplicates_when_importing(self):
+        rows = [
+            {'question': "Who discovered penicillin?", 'answer': "Fleming", 'category': 1, 'difficulty': 3},
+            {'question': "Which river flows through the city of Paris?", 'answer': "Seine", 'category': 3, 'difficulty': 2},
+            {'question': "Which river flows through the city of Paris, France?", 'answer': "Seine", 'category': 3, 'difficulty': 2}
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows)
+
+        res = self.client().post('/questions/import', data=body, headers={'Content-Type': 'application/x-ndjson'})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['errors'][0], {'line': 1, 'error': 'Duplicate of question %d.' % Question.query.filter_by(answer='Alexander Fleming').first().id})
+        self.assertEqual(data['errors'][1], {'line': 3, 'error': 'Duplicate of line 2.'})
+
+    def test_should_accept_questions_differing_by_a_number(self):
+        olympics = {'question': "Which city hosted the Summer Olympic Games in the year 2000?", 'answer': 'Sydney', 'category': 3, 'difficulty': 2}
+        res = self.client().post('/questions', json=olympics)
+        self.assertEqual(res.status_code, 200)
+        res = self.client().post('/questions', json=dict(olympics, question="Which city hosted the Summer Olympic Games in the year 2004?", answer='Athens'))
+        self.assertEqual(res.status_code, 200)
+
+        rows = [
+            {'question': "Which element has the atomic number 6?", 'answer': "Carbon", 'category': 1, 'difficulty': 2},
+            {'question': "Which element has the atomic number 8?", 'answer': "Oxygen", 'category': 1, 'difficulty': 2}
+        ]
+        res = self.client().post('/questions/import', data='\n'.join(json.dumps(row) for row in rows), headers={'Content-Type': 'application/x-ndjson'})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['errors'], [])
+
+    def test_should_import_questions_from_csv(self):
+        body = 'question,answer,category,difficulty\n"Which is the tallest mountain, above sea level?",Everest,Geography,1\n'
+
+        res = self.client().post('/questions/import', data=body, headers={'Content-Type': 'text/csv'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(Question.query.filter_by(answer="Everest").first().category, 3)
+
+    def test_should_run_job(self):
+        res = self.client().post('/jobs', json={'kind': 'category-stats'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 202)
+        self.assertTrue(res.headers['Location'].endswith('/jobs/%d' % data['job']['id']))
+        self.assertEqual(data['job']['kind'], 'category-stats')
+
+        res = self.client().get('/jobs/%d' % data['job']['id'])
+        job = json.loads(res.data)['job']
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(sum(count for _, _, count in job['result']['counts']), Question.query.count())
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_should_import_questions_in_job(self):
+        body = '\n'.join(json.dumps(row) for row in [
+            {'question': "Which planet is known as the Red Planet?", 'answer': "Mars", 'category': 1, 'difficulty': 1},
+            {'question': "Who painted the Water Lilies?", 'answer': "Monet", 'category': 2, 'difficulty': 9}
+        ])
+
+        res = self.client().post('/jobs/import', data=body, headers={'Content-Type': 'application/x-ndjson'})
+        job = json.loads(res.data)['job']
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual((job['progress'], job['total']), (2, 2))
+        self.assertEqual(job['result'], {'imported': 1, 'errors': [{'line': 2, 'error': 'Invalid difficulty.'}], 'total_errors': 1})
+        self.assertFalse(os.path.exists(job['params']['path']))
+        self.assertIsNotNone(Question.query.filter_by(answer='Mars').first())
+
+    def test_should_group_duplicates_in_job(self):
+        self.client().post('/questions', json={'question': "What boxer's original name is Cassius Clay?", 'answer': "Muhammad Ali", 'category': 4, 'difficulty': 1, 'allow_duplicate': True})
+
+        res = self.client().post('/jobs', json={'kind': 'find-duplicates', 'params': {'threshold': 0.8}})
+        job = json.loads(res.data)['job']
+
+        self.assertEqual(job['params'], {'threshold': 0.8})
+        self.assertEqual(job['result']['total_clusters'], 1)
+        self.assertEqual(job['progress'], Question.query.count())
+
+    def test_400_unknown_job_kind(self):
+        res = self.client().post('/jobs', json={'kind': 'import', 'params': {'path': '/etc/passwd', 'format': 'csv'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(Job.query.count(), 0)
+
+    def test_422_invalid_job_params(self):
+        res = self.client().post('/jobs', json={'kind': 'find-duplicates', 'params': {'threshold': 2}})
+
+        self.assertEqual(res.status_code, 422)
+
+    def test_404_unknown_job(self):
+        res = self.client().get('/jobs/1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['message'], 'Item not found.')
+
+    def test_should_export_every_question(self):
+        res = self.client().get('/questions/export')
+        lines = res.data.decode('utf-8').splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(lines), Question.query.count())
+        self.assertEqual(json.loads(lines[0])['id'], Question.query.order_by(Question.id).first().id)
+
+        res = self.client().get('/questions/export?format=csv')
+        self.assertEqual(res.mimetype, 'text/csv')
+        self.assertEqual(res.data.decode('utf-8').splitlines()[0], 'id,question,answer,difficulty,category')
+
     def test_should_return_valid_search_results(self):
         search_term = 'royal'
         search_json = {
@@ -198,6 +676,72 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertFalse(data['success'])
         
+    def test_should_search_answers_when_asked(self):
+        search_json = {
+            'searchTerm': 'muhammad',
+            'searchAnswers': True
+        }
+
+        res = self.client().post('/search', data=json.dumps(search_json), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['totalQuestions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Muhammad Ali')
+
+        res = self.client().post('/search', data=json.dumps({'searchTerm': 'muhammad'}), headers={'Content-Type': 'application/json'})
+        self.assertEqual(res.status_code, 404)
+
+    def test_should_paginate_search_results(self):
+        search_json = {
+            'searchTerm': 'the',
+            'page': 1
+        }
+
+        res = self.client().post('/search', data=json.dumps(search_json), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(len(data['questions']), QUESTIONS_PER_PAGE)
+        self.assertGreater(data['totalQuestions'], QUESTIONS_PER_PAGE)
+
+    def test_should_not_accept_invalid_search_page(self):
+        for page in [0, -1, 'two', [1], {}]:
+            res = self.client().post('/search', data=json.dumps({'searchTerm': 'the', 'page': page}), headers={'Content-Type': 'application/json'})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 422)
+            self.assertFalse(data['success'])
+
+        res = self.client().post('/search', data=json.dumps({'searchTerm': 'the', 'page': '2'}), headers={'Content-Type': 'application/json'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_should_find_new_question_in_search(self):
+        new_question_data = {
+            'question': "Which quokka lives on Rottnest Island?",
+            'answer': "All of them.",
+            'category': 1,
+            'difficulty': 1
+        }
+        self.client().post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+
+        res = self.client().post('/search', data=json.dumps({'searchTerm': 'quok'}), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0]['question'], new_question_data['question'])
+
+    def test_should_stream_search_results(self):
+        res = self.client().post('/search?stream=1', data=json.dumps({'searchTerm': 'the'}), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(len(data['questions']), data['totalQuestions'])
+
+        res = self.client().post('/search?stream=1', data=json.dumps({'searchTerm': 'Alaskdfhsoiewl'}), headers={'Content-Type': 'application/json'})
+        self.assertEqual(res.status_code, 404)
+
     def test_should_get_random_question_from_art(self):
         quiz_category = 4
         quizzes_request_data = {
@@ -258,6 +802,1073 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['error'], 404)
         self.assertFalse(data['success'])
 
+    def test_should_get_random_question_from_all_categories(self):
+        quizzes_request_data = {
+            "category": 0,
+            "previous_questions": [5]
+        }
+        res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertNotEqual(data['question']['id'], 5)
+        self.assertTrue(Question.query.get(data['question']['id']))
+
+    def test_should_reject_invalid_previous_questions(self):
+        for previous_questions in [5, '5', None, ['5'], [1.5], [True], [{'id': 5}]]:
+            quizzes_request_data = {
+                "category": 0,
+                "previous_questions": previous_questions
+            }
+            res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 422)
+            self.assertFalse(data['success'])
+
+    def test_should_filter_quiz_questions_by_difficulty(self):
+        for difficulty in [2, [1, 2]]:
+            quizzes_request_data = {"category": 0, "difficulty": difficulty}
+            res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(data['question']['difficulty'], [1, 2])
+            if difficulty == 2:
+                self.assertEqual(data['question']['difficulty'], 2)
+
+    def test_should_not_accept_invalid_quiz_difficulty(self):
+        for difficulty in [6, [0, 2], 'hard']:
+            quizzes_request_data = {"category": 0, "difficulty": difficulty}
+            res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(res.status_code, 422)
+
+    def test_should_step_adaptive_quiz_difficulty(self):
+        quizzes_request_data = {"category": 0, "adaptive": True, "difficulty": 2, "correct": True}
+        res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        expected = [level for level in adaptive_levels(2, True) if Question.query.filter_by(difficulty=level).count()][0]
+        self.assertEqual(data['question']['difficulty'], expected)
+
+    def test_should_get_quiz_round_of_distinct_questions(self):
+        quizzes_request_data = {"category": 0, "previous_questions": [5], "count": 5}
+        res = self.client().post('/quizzes/rounds', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        question_ids = [question['id'] for question in data['questions']]
+        self.assertEqual(len(set(question_ids)), 5)
+        self.assertNotIn(5, question_ids)
+
+    def test_should_return_rest_of_category_in_last_quiz_round(self):
+        category_questions = [question.id for question in Question.query.filter_by(category=4).all()]
+        quizzes_request_data = {"category": 4, "previous_questions": category_questions[1:], "count": 5}
+        res = self.client().post('/quizzes/rounds', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([question['id'] for question in data['questions']], category_questions[:1])
+
+        quizzes_request_data['previous_questions'] = category_questions
+        res = self.client().post('/quizzes/rounds', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+        self.assertEqual(res.status_code, 404)
+
+    def test_should_not_accept_invalid_quiz_round_size(self):
+        for count in [0, 51, '5']:
+            quizzes_request_data = {"category": 0, "count": count}
+            res = self.client().post('/quizzes/rounds', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(res.status_code, 422)
+
+    def test_should_not_accept_invalid_quiz_round_previous_questions(self):
+        for previous_questions in [5, {'id': 5}, ['5'], [None], [False]]:
+            quizzes_request_data = {"category": 0, "previous_questions": previous_questions}
+            res = self.client().post('/quizzes/rounds', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+
+            self.assertEqual(res.status_code, 422)
+
+    def test_should_not_return_deleted_question_in_quiz(self):
+        new_question_data = {
+            'question': "Is this question only in the quiz until it is deleted?",
+            'answer': "Yes.",
+            'category': 6,
+            'difficulty': 1
+        }
+        res = self.client().post('/questions', data=json.dumps(new_question_data), headers={'Content-Type': 'application/json'})
+        new_question_id = json.loads(res.data)['question']['id']
+        self.client().delete('/questions/' + str(new_question_id))
+
+        previous_questions = [question.id for question in Question.query.filter_by(category=6).all()]
+        quizzes_request_data = {
+            "category": 6,
+            "previous_questions": previous_questions
+        }
+        res = self.client().post('/quizzes', data=json.dumps(quizzes_request_data), headers={'Content-Type': 'application/json'})
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_should_check_answer(self):
+        res = self.client().post('/quizzes/answers', json={'question_id': 9, 'answer': 'muhammed ali'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data, {'question_id': 9, 'correct': True, 'correct_answer': 'Muhammad Ali', 'success': True})
+
+        res = self.client().post('/quizzes/answers', json={'question_id': 9, 'answer': 'Joe Frazier'})
+
+        self.assertEqual(json.loads(res.data)['correct'], False)
+
+    def test_should_check_round_of_answers(self):
+        answers = [
+            {'question_id': 2, 'answer': 'apollo thirteen'},
+            {'question_id': 18, 'answer': '1'},
+            {'question_id': 12, 'answer': 'George Washington-Carver'},
+            {'question_id': 2, 'answer': 'Apollo 11'}
+        ]
+        res = self.client().post('/quizzes/answers', json={'answers': answers})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result['correct'] for result in data['results']], [True, True, True, False])
+        self.assertEqual(data['total_correct'], 3)
+
+    def test_404_check_answer_of_deleted_question(self):
+        self.client().post('/quizzes/answers', json={'question_id': 9, 'answer': 'Muhammad Ali'})
+        self.client().delete('/questions/9')
+
+        res = self.client().post('/quizzes/answers', json={'answers': [{'question_id': 2, 'answer': 'Apollo 13'}, {'question_id': 9, 'answer': 'Muhammad Ali'}]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_should_not_accept_invalid_answers(self):
+        for body, status in [
+            ({'question_id': 9}, 400),
+            ({'question_id': '9', 'answer': 'Ali'}, 422),
+            ({'question_id': 9, 'answer': None}, 422),
+            ({'answers': []}, 422),
+            ({'answers': [{'question_id': 9, 'answer': 'Ali'}] * 51}, 422)
+        ]:
+            res = self.client().post('/quizzes/answers', json=body)
+
+            self.assertEqual(res.status_code, status, body)
+
+    def test_should_hide_answers_from_quiz(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'QUIZ_HIDE_ANSWERS': True}).test_client()
+
+        res = client.post('/quizzes', json={'category': 0, 'previous_questions': []})
+        question = json.loads(res.data)['question']
+
+        self.assertNotIn('answer', question)
+        self.assertEqual(sorted(question), ['category', 'difficulty', 'id', 'question'])
+
+        res = client.post('/quizzes/rounds', json={'category': 0, 'count': 3})
+
+        self.assertTrue(all('answer' not in question for question in json.loads(res.data)['questions']))
+
+    def test_should_ask_every_question_once_in_quiz_session(self):
+        res = self.client().post('/quizzes/sessions', data=json.dumps({"category": 4}), headers={'Content-Type': 'application/json'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        art_questions = [question.id for question in Question.query.filter_by(category=4).all()]
+        self.assertEqual(data['total_questions'], len(art_questions))
+
+        asked = []
+        for _ in art_questions:
+            res = self.client().post('/quizzes/sessions/' + data['session_id'] + '/next')
+            self.assertEqual(res.status_code, 200)
+            asked.append(json.loads(res.data)['question']['id'])
+        self.assertEqual(sorted(asked), sorted(art_questions))
+
+        # No questions left in the session.
+        res = self.client().post('/quizzes/sessions/' + data['session_id'] + '/next')
+        self.assertEqual(res.status_code, 404)
+
+    def test_should_not_find_deleted_quiz_session(self):
+        res = self.client().post('/quizzes/sessions', data=json.dumps({"category": 0}), headers={'Content-Type': 'application/json'})
+        session_id = json.loads(res.data)['session_id']
+
+        res = self.client().delete('/quizzes/sessions/' + session_id)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client().post('/quizzes/sessions/' + session_id + '/next')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(data['success'])
+
+
+    def test_should_read_category_listing_through_index(self):
+        questions = Question.query.filter_by(category=6)
+        self.assertUsesIndex(questions.order_by(Question.id).limit(QUESTIONS_PER_PAGE))
+        self.assertUsesIndex(questions.with_entities(func.count(Question.id)))
+
+    def test_should_read_quiz_questions_through_index(self):
+        self.assertUsesIndex(Question.query.filter_by(id=5))
+        self.assertUsesIndex(db.session.query(Question.id).filter_by(category=4, difficulty=2))
+        self.assertUsesIndex(db.session.query(Question.id).filter_by(difficulty=2))
+
+    def test_should_report_request_metrics_when_enabled(self):
+        app = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'METRICS_ENABLED': True, 'METRICS_SERVER_TIMING': True})
+        client = app.test_client()
+
+        res = client.get('/questions')
+        self.assertIn('db;dur=', res.headers['Server-Timing'])
+
+        res = client.get('/metrics')
+        metrics = res.data.decode('utf-8')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('trivia_requests_total{route="/questions",method="GET"} 1', metrics)
+        self.assertIn('trivia_db_queries_total{route="/questions",method="GET"}', metrics)
+        serialize_seconds = metrics.split('trivia_serialize_seconds_total{route="/questions",method="GET"} ')[1].split('\n')[0]
+        self.assertGreater(float(serialize_seconds), 0)
+        self.assertIn('trivia_request_duration_seconds_count{route="/questions",method="GET"} 1', metrics)
+        self.assertIn('trivia_db_pool_checked_out{database="primary"} ', metrics)
+
+    def test_should_read_from_replicas_round_robin(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica_urls = []
+            for number in range(2):
+                replica_urls.append('sqlite:///' + os.path.join(directory, 'replica%d.db' % number))
+                engine = create_engine(replica_urls[-1])
+                db.Model.metadata.create_all(engine)
+                engine.execute(Category.__table__.insert(), {'id': 1, 'type': 'Replica %d' % number})
+                engine.execute(Question.__table__.insert(), {'question': 'q', 'answer': 'a', 'category': 1, 'difficulty': 1})
+                engine.dispose()
+
+            app = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'DATABASE_REPLICA_URLS': replica_urls, 'RESPONSE_CACHE': None})
+            db.session.remove()
+            try:
+                with app.app_context():
+                    replicas = []
+                    for _ in range(4):
+                        with db.read_only():
+                            replicas.append(Category.query.get(1).type)
+                    self.assertEqual(sorted(replicas), ['Replica 0', 'Replica 0', 'Replica 1', 'Replica 1'])
+                    self.assertNotEqual(replicas[0], replicas[1])
+                    self.assertGreater(Question.query.count(), 1)
+
+                res = app.test_client().get('/questions')
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['total_questions'], 1)
+            finally:
+                db.session.remove()
+                for pool in db.pools(app).values():
+                    pool.dispose()
+
+    def test_should_serve_the_same_reads_from_the_question_store(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RESPONSE_CACHE': None}).test_client()
+        store_client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RESPONSE_CACHE': None, 'QUESTION_STORE': True}).test_client()
+
+        for path in ['/questions', '/questions/2', '/questions?after_id=5', '/categories/4/questions']:
+            self.assertEqual(json.loads(store_client.get(path).data), json.loads(client.get(path).data), path)
+        search = {'searchTerm': 'title', 'searchAnswers': True}
+        self.assertEqual(json.loads(store_client.post('/search', json=search).data),
+                         json.loads(client.post('/search', json=search).data))
+
+    def test_should_keep_the_question_store_current(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RESPONSE_CACHE': None, 'QUESTION_STORE': True}).test_client()
+        total = json.loads(client.get('/categories/2/questions').data)['total_questions']
+
+        res = client.post('/questions', json={'question': 'Who painted the store?', 'answer': 'Nobody', 'category': 2, 'difficulty': 3})
+        question = json.loads(res.data)['question']
+        data = json.loads(client.get('/categories/2/questions').data)
+        self.assertEqual(data['total_questions'], total + 1)
+        self.assertIn(question, data['questions'])
+
+        client.delete('/questions/%d' % question['id'])
+        data = json.loads(client.get('/categories/2/questions').data)
+        self.assertEqual(data['total_questions'], total)
+        self.assertNotIn(question, data['questions'])
+
+    def test_should_compress_large_responses_when_accepted(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RESPONSE_COMPRESSION': True, 'RESPONSE_COMPRESSION_MIN_SIZE': 100}).test_client()
+        plain = client.get('/questions')
+        res = client.get('/questions', headers={'Accept-Encoding': 'br;q=0, gzip'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(res.data)), json.loads(plain.data))
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertNotIn('Content-Encoding', client.get('/questions/1000', headers={'Accept-Encoding': 'gzip'}).headers)
+
+    def test_should_get_category_stats(self):
+        res = self.client().get('/categories/stats')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], Question.query.filter_by(deleted=False).count())
+        for category in data['categories']:
+            counts = Question.query.filter_by(category=category['id'], deleted=False)
+            self.assertEqual(category['total_questions'], counts.count())
+            self.assertEqual(sum(category['difficulties'].values()), category['total_questions'])
+            self.assertEqual(category['difficulties']['2'], counts.filter_by(difficulty=2).count())
+
+    def test_should_keep_category_stats_current(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RESPONSE_CACHE': None}).test_client()
+        stats = {category['id']: category for category in json.loads(client.get('/categories/stats').data)['categories']}
+
+        res = client.post('/questions', json={'question': 'Which stat is this?', 'answer': 'Count', 'category': 4, 'difficulty': 4})
+        question_id = json.loads(res.data)['question']['id']
+        data = json.loads(client.get('/categories/stats').data)
+        category = next(category for category in data['categories'] if category['id'] == 4)
+        self.assertEqual(category['total_questions'], stats[4]['total_questions'] + 1)
+        self.assertEqual(category['difficulties']['4'], stats[4]['difficulties']['4'] + 1)
+        self.assertEqual(json.loads(client.get('/categories/4/questions').data)['total_questions'], category['total_questions'])
+
+        client.delete('/questions/%d' % question_id)
+        data = json.loads(client.get('/categories/stats').data)
+        category = next(category for category in data['categories'] if category['id'] == 4)
+        self.assertEqual(category, stats[4])
+
+    def test_should_rate_limit_search_per_client(self):
+        client = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'RATE_LIMIT_STORE': 'memory', 'RATE_LIMITS': {'search': {'client': (0.1, 2)}}}).test_client()
+        search = {'searchTerm': 'title'}
+        for _ in range(2):
+            self.assertEqual(client.post('/search', json=search).status_code, 200)
+        res = client.post('/search', json=search)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(data['error'], 429)
+        self.assertEqual(res.headers['Retry-After'], '10')
+        self.assertEqual(client.post('/search', json=search, environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code, 200)
+        # Quizzes have their own limits.
+        self.assertEqual(client.post('/quizzes', json={'category': 0, 'previous_questions': []}).status_code, 200)
+
+    def test_should_shed_quiz_requests_when_the_pool_is_saturated(self):
+        app = create_app({'DATABASE_URL': self.database_path, 'INDEX_REFRESH_INTERVAL': None, 'MAX_CONCURRENT_REQUESTS': 10, 'DATABASE_POOL_SIZE': 1, 'DATABASE_MAX_OVERFLOW': 0})
+        with app.app_context():
+            connection = db.engine.connect()
+            try:
+                res = app.test_client().post('/quizzes', json={'category': 0, 'previous_questions': []})
+            finally:
+                connection.close()
+                db.engine.dispose()
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(json.loads(res.data)['message'], 'Service unavailable.')
+        self.assertEqual(res.headers['Retry-After'], '1')
+
+    def test_should_not_expose_metrics_when_disabled(self):
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 404)
+        self.assertNotIn('Server-Timing', self.client().get('/questions').headers)
+
+
+class IdBucketTestCase(unittest.TestCase):
+    """This class represents the quiz index id bucket test case"""
+
+    def test_should_remove_ids_and_keep_the_rest(self):
+        bucket = IdBucket()
+        for question_id in range(1, 6):
+            bucket.add(question_id)
+        bucket.remove(2)
+        bucket.remove(5)
+        bucket.remove(42)
+
+        self.assertEqual(sorted(bucket.ids), [1, 3, 4])
+        self.assertNotIn(2, bucket)
+        for question_id in bucket.ids:
+            self.assertEqual(bucket.ids[bucket.positions[question_id]], question_id)
+
+
+class QuizIndexTestCase(unittest.TestCase):
+    """This class represents the quiz index selection test case"""
+
+    def setUp(self):
+        # Questions 1-50 are in category 1, 51-100 in category 2; the
+        # difficulty cycles through 1-5.
+        self.index = QuizIndex()
+        self.index.load_rows([(question_id, 1 + (question_id > 50), 1 + question_id % 5) for question_id in range(1, 101)])
+        self.rng = random.Random(0)
+
+    def test_should_pick_uniformly_within_difficulty_range(self):
+        previous_questions = [2, 3, 7]
+        picks = Counter(self.index.pick(1, previous_questions, self.rng, difficulty=[2, 3]) for _ in range(6000))
+
+        eligible = {question_id for question_id in range(1, 51) if 1 + question_id % 5 in (2, 3)} - set(previous_questions)
+        self.assertEqual(set(picks), eligible)
+        # 6000 picks over 17 ids: each is expected about 353 times.
+        for count in picks.values():
+            self.assertTrue(270 < count < 440, picks)
+
+    def test_should_exhaust_difficulty_bucket(self):
+        bucket = self.index.bucket(2, 4)
+        self.assertEqual(len(bucket), 10)
+        self.assertIsNone(self.index.pick(2, bucket.ids, self.rng, difficulty=4))
+        self.assertIsNone(self.index.pick(1, [], self.rng, difficulty=[]))
+
+    def test_should_step_adaptive_difficulty(self):
+        self.assertEqual(adaptive_levels(3, True)[0], 4)
+        self.assertEqual(adaptive_levels(3, False)[0], 2)
+        self.assertEqual(adaptive_levels(5, True)[0], 5)
+        self.assertEqual(adaptive_levels(1, None), [1, 2, 3, 4, 5])
+
+        question_id = self.index.pick_adaptive(1, [], 3, True, self.rng)
+        self.assertEqual(self.index.questions[question_id], (1, 4))
+
+        # Level 4 exhausted: the next harder level is asked.
+        level_4 = self.index.bucket(1, 4).ids
+        question_id = self.index.pick_adaptive(1, level_4, 3, True, self.rng)
+        self.assertEqual(self.index.questions[question_id], (1, 5))
+
+    def test_should_sample_distinct_questions_uniformly(self):
+        previous_questions = [1, 2, 3]
+        for count in [5, 45]:
+            picks = Counter()
+            for _ in range(2000):
+                sample = self.index.sample(1, count, previous_questions, self.rng)
+                self.assertEqual(len(set(sample)), len(sample))
+                picks.update(sample)
+            self.assertEqual(set(picks), set(range(4, 51)))
+            # Every eligible id is expected 2000 * count / 47 times.
+            expected = 2000 * count / 47
+            for picked in picks.values():
+                self.assertTrue(0.8 * expected < picked < 1.2 * expected, picks)
+
+    def test_should_sample_rest_of_difficulty_bucket(self):
+        bucket = self.index.bucket(1, 2).ids
+        sample = self.index.sample(1, 10, bucket[:8], self.rng, difficulty=2)
+        self.assertEqual(sorted(sample), sorted(bucket[8:]))
+        self.assertEqual(self.index.sample(1, 10, bucket, self.rng, difficulty=2), [])
+
+    def test_should_update_difficulty_buckets(self):
+        self.index.add(101, 1, 2)
+        self.assertIn(101, self.index.bucket(1, 2))
+        self.assertIn(101, self.index.bucket(0, 2))
+        self.index.remove(101)
+        self.assertNotIn(101, self.index.bucket(1, 2))
+        self.assertNotIn(101, self.index.bucket(0))
+
+    def test_should_keep_picking_while_reloading(self):
+        rows = [(question_id, 1, 1 + question_id % 5) for question_id in range(1, 20001)]
+        self.index.load_rows(rows)
+        stopped = threading.Event()
+
+        def reload():
+            while not stopped.is_set():
+                self.index.load_rows(rows)
+                self.index.add(20001, 1, 2)
+                self.index.remove(20001)
+
+        # Switch threads often, so picks run in the middle of the reloads.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(0.00001)
+        thread = threading.Thread(target=reload)
+        thread.start()
+        try:
+            picks = [self.index.pick(1, [], self.rng, difficulty=2) for _ in range(5000)]
+            samples = [self.index.sample(1, 5, [], self.rng, difficulty=[2, 3]) for _ in range(500)]
+        finally:
+            stopped.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+
+        self.assertNotIn(None, picks)
+        self.assertTrue(all(1 + question_id % 5 == 2 for question_id in picks))
+        self.assertTrue(all(len(sample) == 5 for sample in samples))
+
+
+class FieldIndexTestCase(unittest.TestCase):
+    """This class represents the search field index test case"""
+
+    def test_should_rank_rare_tokens_higher(self):
+        index = FieldIndex()
+        index.add(1, 'The Palace of Versailles')
+        index.add(2, 'The Tower of London')
+        index.add(3, 'The Palace and the Palace garden')
+
+        scores = index.scores('palace')
+        self.assertEqual(set(scores), {1, 3})
+        self.assertGreater(scores[3], scores[1])
+        self.assertGreater(index.scores('lond')[2], index.scores('the')[2])
+
+    def test_should_forget_removed_questions(self):
+        index = FieldIndex()
+        index.add(1, 'Versailles')
+        index.add(2, 'Versace')
+        index.remove(1)
+
+        self.assertEqual(list(index.prefixed('vers')), ['versace'])
+        self.assertEqual(index.scores('versailles'), {})
+
+    def test_should_replace_text_of_question_added_again(self):
+        index = FieldIndex()
+        index.add(1, 'Versailles')
+        index.add(1, 'Louvre')
+
+        self.assertEqual(index.vocabulary, ['louvre'])
+        self.assertEqual(index.scores('vers'), {})
+
+
+class SearchIndexTestCase(unittest.TestCase):
+    """This class represents the search index test case"""
+
+    def setUp(self):
+        self.index = SearchIndex(min_prefix=3)
+        self.index.load_rows([
+            (1, 'Who painted the Mona Lisa?', 'Da Vinci'),
+            (2, 'Which monarch built Versailles?', 'Louis XIV'),
+            (3, 'What is the capital of Monaco?', 'Monaco')
+        ])
+
+    def test_should_build_sorted_vocabulary(self):
+        self.assertEqual(self.index.questions.vocabulary, sorted(self.index.questions.postings))
+        self.index.add(4, 'Where is Angkor Wat?', 'Cambodia')
+        self.assertEqual(self.index.questions.vocabulary, sorted(self.index.questions.postings))
+
+    def test_should_match_short_words_whole(self):
+        self.assertEqual(self.index.search('mon')[0], [1, 2, 3])
+        self.assertEqual(self.index.search('mo')[0], [])
+        self.assertEqual(self.index.search('da', search_answers=True)[0], [1])
+        self.assertEqual(self.index.search('is the')[0], [3])
+
+    def test_should_keep_writes_made_during_reload(self):
+        rows = [(question_id, 'Question %s' % question_id, 'Answer') for question_id in range(1, 4)]
+
+        def reloaded_rows():
+            # A question added while the reload reads the rows.
+            self.index.add(10, 'Question ten', 'Answer')
+            yield from rows
+
+        self.index.load_rows(reloaded_rows())
+        self.assertEqual(self.index.search('question')[0], [1, 2, 3, 10])
+
+
+class IndexRefresherTestCase(unittest.TestCase):
+    """This class represents the background index reload test case"""
+
+    def test_should_reload_indexes_before_they_expire(self):
+        index = QuizIndex(max_age=300)
+        self.assertFalse(reload_due(index, 30))
+
+        index.load_rows([(1, 1, 1)])
+        self.assertFalse(reload_due(index, 30))
+        index.loaded_at -= 271
+        self.assertTrue(index.is_loaded())
+        self.assertTrue(reload_due(index, 30))
+
+        index.reset()
+        self.assertFalse(reload_due(index, 30))
+
+    def test_should_preload_indexes_in_background(self):
+        loaded = threading.Event()
+
+        class Index(QuizIndex):
+            def load(self):
+                self.load_rows([(1, 1, 1)])
+                loaded.set()
+
+        index = Index()
+        refresher = IndexRefresher(Flask('flaskr'), interval=60)
+        refresher.register(index, preload=True)
+        refresher.start()
+        try:
+            self.assertTrue(loaded.wait(5))
+        finally:
+            refresher.stop()
+        self.assertEqual(index.pick(1), 1)
+
+    def test_should_reload_requested_index_in_background(self):
+        reloaded = threading.Event()
+
+        class Index(QuizIndex):
+            def load(self):
+                self.load_rows([(2, 1, 1)])
+                reloaded.set()
+
+        index = Index()
+        index.load_rows([(1, 1, 1)])
+        refresher = IndexRefresher(Flask('flaskr'), interval=60)
+        refresher.register(index)
+        refresher.start()
+        try:
+            self.assertEqual(index.pick(1), 1)
+            refresher.request(index)
+            self.assertTrue(reloaded.wait(5))
+        finally:
+            refresher.stop()
+        self.assertEqual(index.pick(1), 2)
+
+class QuestionStoreTestCase(unittest.TestCase):
+    """This class represents the in-memory question store test case"""
+
+    def setUp(self):
+        self.store = QuestionStore()
+        self.store.load_rows([
+            (1, 'Q1', 'A1', 1, 1),
+            (2, 'Q2', 'A2', 2, 2),
+            (4, 'Q4', 'A4', 2, 1),
+            (5, 'Q5', 'A5', 3, 1)
+        ])
+
+    def test_should_filter_rows_by_category_and_difficulty(self):
+        self.assertEqual([row[0] for row in self.store.rows(category=1)], [1, 4, 5])
+        self.assertEqual([row[0] for row in self.store.rows(category=1, difficulty=[2, 3])], [4, 5])
+        self.assertEqual([row[0] for row in self.store.rows(category=1, offset=1)], [4, 5])
+        self.assertEqual([row[0] for row in self.store.rows(after_id=2)], [4, 5])
+        self.assertEqual(list(self.store.rows(category=9)), [])
+        self.assertEqual(self.store.count(category=1), 3)
+        self.assertEqual(self.store.count(difficulty=2), 2)
+
+    def test_should_add_and_remove_rows_in_id_order(self):
+        self.store.add(3, 'Q3', 'A3', 5, 2)
+        self.store.remove(4)
+
+        self.assertEqual([row[0] for row in self.store.rows()], [1, 2, 3, 5])
+        self.assertEqual(self.store.get(3), (3, 'Q3', 'A3', 5, 2))
+        self.assertIsNone(self.store.get(4))
+        self.assertEqual(self.store.count(category=1), 2)
+        self.assertEqual(self.store.count(category=2, difficulty=5), 1)
+
+    def test_should_bisect_filtered_rows(self):
+        self.store.add(3, 'Q3', 'A3', 2, 1)
+        self.store.add(6, 'Q6', 'A6', 3, 2)
+        self.store.remove(4)
+
+        self.assertEqual([row[0] for row in self.store.rows(category=1, difficulty=2)], [3])
+        self.assertEqual([row[0] for row in self.store.rows(difficulty=[2, 3])], [2, 3, 5, 6])
+        self.assertEqual([row[0] for row in self.store.rows(difficulty=[2, 3], after_id=2, offset=1)], [5, 6])
+        self.assertEqual([row[0] for row in self.store.rows(category=1, offset=2)], [5])
+        self.assertEqual(list(self.store.rows(category=1, offset=3)), [])
+        self.assertEqual(self.store.id_lists[1].tolist(), [1, 3, 5])
+
+    def test_should_keep_iterating_across_writes_and_reloads(self):
+        rows = self.store.rows(category=1)
+        self.assertEqual(next(rows)[0], 1)
+        self.store.load_rows([
+            (1, 'Q1', 'A1', 1, 1),
+            (3, 'Q3', 'A3', 1, 1),
+            (5, 'Q5', 'A5', 3, 1)
+        ])
+        self.store.add(7, 'Q7', 'A7', 1, 1)
+
+        self.assertEqual([row[0] for row in rows], [3, 5, 7])
+
+
+class QuizSessionStoreTestCase(unittest.TestCase):
+    """This class represents the quiz session store test case"""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.clock = lambda: self.now
+
+    def test_should_expire_sessions_after_ttl(self):
+        store = MemorySessionStore(ttl=60, clock=self.clock)
+        session = QuizSession(1, [3, 1, 2])
+        store.save(session)
+
+        self.now += 59
+        self.assertIs(store.get(session.id), session)
+        self.now += 61
+        self.assertIsNone(store.get(session.id))
+
+    def test_should_evict_least_recently_used_session(self):
+        store = MemorySessionStore(max_sessions=2, clock=self.clock)
+        first, second, third = QuizSession(1, [1]), QuizSession(1, [2]), QuizSession(1, [3])
+        store.save(first)
+        store.save(second)
+        store.get(first.id)
+        store.save(third)
+
+        self.assertIsNotNone(store.get(first.id))
+        self.assertIsNone(store.get(second.id))
+        self.assertIsNotNone(store.get(third.id))
+
+    def test_should_keep_session_cursor_in_sqlite_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteSessionStore(directory + '/sessions.db', ttl=60, clock=self.clock)
+            session = QuizSession(2, [7, 8, 9])
+            session.next_question_id()
+            store.save(session)
+
+            saved = store.get(session.id)
+            self.assertEqual(list(saved.question_ids), [7, 8, 9])
+            self.assertEqual(saved.next_question_id(), 8)
+
+            self.now += 61
+            self.assertIsNone(store.get(session.id))
+
+
+class DedupIndexTestCase(unittest.TestCase):
+    """This class represents the duplicate questions index test case"""
+
+    def setUp(self):
+        self.index = DedupIndex(threshold=0.7, max_age=None)
+        self.index.load_rows([
+            (1, 'Which country won the first ever soccer World Cup in 1930?'),
+            (2, 'Who discovered penicillin?'),
+            (3, 'What is the largest lake in Africa?')
+        ])
+
+    def test_should_match_questions_equal_once_normalized(self):
+        self.assertEqual(normalize("What's the largest LAKE in Africa?!"), ['what', 'largest', 'lake', 'africa'])
+        self.assertEqual(self.index.matches("What's the largest lake in Africa"), [(3, 1.0)])
+        self.assertEqual(self.index.matches('Who was it that discovered Penicillin?'), [(2, 1.0)])
+
+    def test_should_match_near_duplicates_only(self):
+        matches = self.index.matches('Which country won the first soccer World Cup, in 1930?')
+        self.assertEqual([question_id for question_id, _ in matches], [1])
+        self.assertGreaterEqual(matches[0][1], 0.7)
+        self.assertEqual(self.index.matches('Who discovered insulin?'), [])
+        self.assertEqual(self.index.matches('Which country won the 2014 World Cup?'), [])
+
+    def test_should_not_match_questions_with_other_numbers(self):
+        for question, other in [
+            ('Which city hosted the Summer Olympic Games in the year 2000?', 'Which city hosted the Summer Olympic Games in the year 2004?'),
+            ('Which element has the atomic number 6?', 'Which element has the atomic number 8?'),
+            ('Which element has the atomic number six?', 'Which element has the atomic number 8?')
+        ]:
+            index = DedupIndex(threshold=0.7, max_age=None)
+            index.load_rows([(1, question)])
+            self.assertEqual(index.matches(other), [], other)
+            index.add(2, other)
+            self.assertEqual(index.clusters(), [], other)
+        self.assertEqual(self.index.matches('Which country won the first ever soccer World Cup in nineteen thirty?'), [(1, 1.0)])
+
+    def test_should_not_match_questions_asking_something_else(self):
+        for question, other in [
+            ('Who is Batman?', 'What is Batman?'),
+            ('How many players are on a soccer team?', 'Which players are on a soccer team?'),
+            ('Who was the first president of the United States?', 'When was the first president of the United States born?')
+        ]:
+            index = DedupIndex(threshold=0.7, max_age=None)
+            index.load_rows([(1, question)])
+            self.assertEqual(index.matches(other), [], other)
+
+    def test_should_keep_matching_while_reloading(self):
+        rows = [(question_id, 'Which river flows through city number %d?' % question_id) for question_id in range(4, 3004)]
+        rows.append((2, 'Who discovered penicillin?'))
+        stopped = threading.Event()
+
+        def reload():
+            while not stopped.is_set():
+                self.index.load_rows(rows)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(0.00001)
+        thread = threading.Thread(target=reload)
+        thread.start()
+        try:
+            matches = [self.index.matches('Who discovered penicillin?') for _ in range(300)]
+        finally:
+            stopped.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+
+        self.assertTrue(all(match == [(2, 1.0)] for match in matches))
+
+    def test_should_cluster_duplicates_and_forget_removed_questions(self):
+        self.index.add(4, 'What is the largest lake of Africa?')
+        self.index.add(5, 'Who discovered penicillin ?')
+        self.index.add(6, "What's the largest lake in Africa")
+        self.assertEqual(self.index.clusters(), [[3, 4, 6], [2, 5]])
+
+        self.index.remove(5)
+        self.assertEqual(self.index.clusters(), [[3, 4, 6]])
+        self.assertEqual(self.index.matches('Who discovered penicillin?'), [(2, 1.0)])
+
+
+class ResponseCacheBackendTestCase(unittest.TestCase):
+    """This class represents the response cache backends test case"""
+
+    def test_should_evict_least_recently_used_response(self):
+        backend = MemoryCacheBackend(max_entries=2)
+        backend.set('a', b'a', 'application/json', None, 60)
+        backend.set('b', b'b', 'application/json', None, 60)
+        backend.get('a')
+        backend.set('c', b'c', 'application/json', None, 60)
+
+        self.assertEqual(backend.get('a'), (b'a', 'application/json', None))
+        self.assertIsNone(backend.get('b'))
+
+    def test_should_share_generations_through_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = SQLiteCacheBackend(directory + '/cache.db')
+            second = SQLiteCacheBackend(directory + '/cache.db')
+            first.set('key', b'body', 'application/json', 'etag', 60)
+            first.bump('category:1')
+
+            self.assertEqual(second.get('key'), (b'body', 'application/json', 'etag'))
+            self.assertEqual(second.generation('category:1'), 1)
+            self.assertEqual(second.generation('category:2'), 0)
+
+
+class SerializerTestCase(unittest.TestCase):
+    """This class represents the JSON serializer test case"""
+
+    fields = ['id', 'question', 'answer', 'difficulty', 'category']
+    rows = [
+        (1, 'What is "π" to 2 places?', '3.14', 2, 1),
+        (2, 'Slashes / backslashes \\ and 100%?', 'Tab\tnewline\n', None, None),
+        (3, 'Ünïcode ✓', '', 5, 6)
+    ]
+
+    def test_should_serialize_rows_like_dicts_with_every_backend(self):
+        payload = {'questions': Rows(self.rows, self.fields), 'categories': {1: 'Science'}, 'total_questions': 3, 'success': True}
+        expected = {
+            'questions': [dict(zip(self.fields, row)) for row in self.rows],
+            'categories': {'1': 'Science'},
+            'total_questions': 3,
+            'success': True
+        }
+        for backend, (module, *_) in BACKENDS.items():
+            if module is None:
+                continue
+            serializer = Serializer(backend)
+            self.assertEqual(json.loads(serializer.dumps(payload)), expected, backend)
+            self.assertEqual(json.loads(serializer.dumps(Rows([], self.fields))), [], backend)
+            lines = serializer.join_rows(self.rows, self.fields, '\n').decode('utf-8').split('\n')
+            self.assertEqual([json.loads(line) for line in lines], expected['questions'], backend)
+
+    def test_should_reject_unknown_backends(self):
+        with self.assertRaises(ValueError):
+            Serializer('pickle')
+
+    def test_should_time_each_payload_once(self):
+        timings = []
+        serializer = Serializer()
+        serializer.timer = timings.append
+        serializer.dumps({'questions': Rows(self.rows, self.fields), 'success': True})
+
+        self.assertEqual(len(timings), 1)
+        self.assertGreater(timings[0], 0)
+
+
+class AnswerCheckTestCase(unittest.TestCase):
+    """This class represents the answer checking test case"""
+
+    def test_should_normalize_answers(self):
+        self.assertEqual(normalize_answer("The Palace of Versailles!"), ['palace', 'of', 'versailles'])
+        self.assertEqual(normalize_answer("Édith Piaf"), ['edith', 'piaf'])
+        self.assertEqual(normalize_answer("one hundred and twenty-five"), ['125'])
+        self.assertEqual(normalize_answer("nineteen ninety-nine"), ['1999'])
+        self.assertEqual(normalize_answer("1,000 ships"), ['1000', 'ships'])
+        self.assertEqual(normalize_answer("The"), ['the'])
+
+    def test_should_start_a_new_number_after_a_unit_or_teen(self):
+        self.assertEqual(normalize_answer("Seven Eleven"), ['7', '11'])
+        self.assertEqual(normalize_answer("nine eleven"), ['9', '11'])
+        self.assertEqual(normalize_answer("nineteen eighty four"), ['1984'])
+        self.assertEqual(normalize_answer("twenty one"), ['21'])
+        self.assertEqual(normalize_answer("two thousand and twenty"), ['2020'])
+        self.assertTrue(AnswerKey('7-Eleven').check('Seven Eleven'))
+        self.assertFalse(AnswerKey('7-Eleven').check('Eighteen'))
+
+    def test_should_forgive_small_typos(self):
+        self.assertTrue(AnswerKey('Escher').check('eshcer'))
+        self.assertTrue(AnswerKey('Alexander Fleming').check('alexandr flemming'))
+        self.assertTrue(AnswerKey('Jackson Pollock').check('jacksonpollock'))
+        self.assertFalse(AnswerKey('One').check('two'))
+        self.assertFalse(AnswerKey('Agra').check('delhi'))
+        self.assertFalse(AnswerKey('Apollo 13').check('Apollo 18'))
+        self.assertFalse(AnswerKey('Blood').check(''))
+
+    def test_should_match_edit_distance(self):
+        def distance(first, second):
+            row = list(range(len(second) + 1))
+            for position, char in enumerate(first, start=1):
+                previous, row = row, [position] + [0] * len(second)
+                for column in range(1, len(second) + 1):
+                    row[column] = min(previous[column] + 1, row[column - 1] + 1, previous[column - 1] + (char != second[column - 1]))
+            return row[-1]
+
+        rng = random.Random(0)
+        for _ in range(2000):
+            first = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+            second = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+            for limit in range(3):
+                if distance(first, second) <= limit:
+                    self.assertTrue(within_distance(first, second, limit), (first, second, limit))
+                elif distance(first, second) > limit + 1:
+                    self.assertFalse(within_distance(first, second, limit), (first, second, limit))
+        self.assertTrue(within_distance('mars', 'mras', 1))
+
+    def test_should_keep_recently_checked_answers(self):
+        cache = AnswerCache(max_size=2)
+        cache.load_rows([(1, 'One'), (2, 'Two')])
+        cache.find([1])
+        cache.load_rows([(3, 'Three')])
+
+        self.assertEqual(sorted(cache.find([1, 2, 3])), [1, 3])
+        cache.remove(1)
+        self.assertEqual(sorted(cache.find([1, 2, 3])), [3])
+
+
+class CategoryStatsTestCase(unittest.TestCase):
+    """This class represents the category stats test case"""
+
+    def test_should_count_questions_per_category_and_difficulty(self):
+        stats = CategoryStats()
+        stats.add(1, 2)
+        self.assertFalse(stats.is_loaded())
+
+        stats.load_rows([(1, 2, 3), (1, 5, 1), (2, 2, 4), (None, 1, 2)])
+        stats.add(1, 2)
+        stats.remove(2, 2, 4)
+
+        self.assertEqual(stats.total(), 7)
+        self.assertEqual(stats.total(1), 5)
+        self.assertEqual(stats.total(2), 0)
+        self.assertEqual(stats.histogram(1), {1: 0, 2: 4, 3: 0, 4: 0, 5: 1})
+        self.assertEqual(stats.format({1: 'Science'}), [
+            {'id': 1, 'type': 'Science', 'total_questions': 5, 'difficulties': {1: 0, 2: 4, 3: 0, 4: 0, 5: 1}}
+        ])
+
+    def test_should_keep_counts_while_reloading(self):
+        stats = CategoryStats()
+        rows = [(category, difficulty, 1) for category in range(1, 2001) for difficulty in range(1, 6)]
+        stats.load_rows(rows)
+        stopped = threading.Event()
+
+        def reload():
+            while not stopped.is_set():
+                stats.load_rows(rows)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(0.00001)
+        thread = threading.Thread(target=reload)
+        thread.start()
+        try:
+            totals = {stats.total() for _ in range(200)}
+        finally:
+            stopped.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(totals, {10000})
+
+    def test_should_add_writes_made_while_reloading(self):
+        stats = CategoryStats()
+        stats.load_rows([(1, 2, 3)])
+
+        def rows():
+            yield (1, 2, 3)
+            stats.add(1, 2)
+            yield (2, 2, 1)
+
+        stats.load_rows(rows())
+        self.assertEqual(stats.total(1), 4)
+        self.assertEqual(stats.total(), 5)
+
+    def test_should_only_load_counts_when_nothing_was_written_since(self):
+        stats = CategoryStats()
+        stats.load_rows([(1, 2, 3)])
+        generation = stats.generation
+        stats.add(1, 2)
+
+        self.assertFalse(stats.load_counts([(1, 2, 3)], generation))
+        self.assertEqual(stats.total(), 4)
+        self.assertTrue(stats.load_counts([(1, 2, 5)], stats.generation))
+        self.assertEqual(stats.total(), 5)
+
+
+class RateLimitTestCase(unittest.TestCase):
+    """This class represents the rate limit and admission control test case"""
+
+    def setUp(self):
+        self.now = 1000.0
+
+    def clock(self):
+        return self.now
+
+    def test_should_refill_tokens_at_the_rate(self):
+        store = MemoryBucketStore(clock=self.clock)
+        self.assertEqual(store.take('client', 2, 2), 0)
+        self.assertEqual(store.take('client', 2, 2), 0)
+        self.assertEqual(store.take('client', 2, 2), 0.5)
+
+        self.now += 0.25
+        self.assertEqual(store.take('client', 2, 2), 0.25)
+        self.now += 0.25
+        self.assertEqual(store.take('client', 2, 2), 0)
+        self.assertEqual(store.take('other', 2, 2), 0)
+
+    def test_should_share_buckets_through_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = SQLiteBucketStore(directory + '/limits.db', clock=self.clock)
+            second = SQLiteBucketStore(directory + '/limits.db', clock=self.clock)
+            self.assertEqual(first.take('client', 1, 1), 0)
+            self.assertEqual(second.take('client', 1, 1), 1)
+            self.now += 1
+            self.assertEqual(second.take('client', 1, 1), 0)
+
+    def test_should_cap_requests_in_flight(self):
+        admission = AdmissionControl(max_in_flight=1)
+        self.assertTrue(admission.enter())
+        self.assertFalse(admission.enter())
+        admission.leave()
+        self.assertTrue(admission.enter())
+
+
+class FixturesTestCase(unittest.TestCase):
+    """This class represents the database fixtures test case"""
+
+    def test_should_read_copy_blocks_of_a_dump(self):
+        tables = read_fixtures(FIXTURES)
+        columns, rows = tables['questions']
+
+        self.assertEqual(columns, ['id', 'question', 'answer', 'difficulty', 'category'])
+        self.assertEqual(len(rows), 19)
+        self.assertEqual(tables['categories'][1][0], ['1', 'Science'])
+
+    def test_should_unescape_copy_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dump.psql')
+            with open(path, 'w', encoding='utf-8') as dump:
+                dump.write('COPY public.categories (id, type) FROM stdin;\n1\tTab\\there\n2\t\\N\n\\.\n')
+            self.assertEqual(read_fixtures(path), {'categories': (['id', 'type'], [['1', 'Tab\there'], ['2', None]])})
+
+
+class JobRunnerTestCase(unittest.TestCase):
+    """This class represents the background job runner test case"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        database_path = 'sqlite:///' + os.path.join(self.directory.name, 'trivia_jobs.db')
+        self.app = create_app({'DATABASE_URL': database_path, 'DATABASE_FIXTURES': FIXTURES, 'JOB_WORKERS': 1, 'JOB_DIRECTORY': self.directory.name})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app.extensions['jobs'].shutdown()
+        db.get_engine(self.app).dispose()
+        self.directory.cleanup()
+
+    def wait_for(self, job_id, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = json.loads(self.client.get('/jobs/%d' % job_id).data)['job']
+            if job['status'] in ['succeeded', 'failed']:
+                return job
+            time.sleep(0.1)
+        self.fail('Job %d did not finish.' % job_id)
+
+    def test_should_run_jobs_in_worker_process(self):
+        body = 'question,answer,category,difficulty\nWhich planet is known as the Red Planet?,Mars,Science,1\n'
+
+        res = self.client.post('/jobs/import', data=body, headers={'Content-Type': 'text/csv'})
+        self.assertEqual(res.status_code, 202)
+        job = self.wait_for(json.loads(res.data)['job']['id'])
+
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result']['imported'], 1)
+        self.assertEqual((job['progress'], job['total']), (1, 1))
+
+        job = self.wait_for(json.loads(self.client.post('/jobs', json={'kind': 'category-stats'}).data)['job']['id'])
+
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(sum(count for _, _, count in job['result']['counts']), 20)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":